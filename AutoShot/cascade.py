@@ -0,0 +1,150 @@
+"""
+Cascade pre-filter: skip the inference windows that can't contain a transition.
+
+Before a window goes to the model, the color histograms of its frames (the 512-bin features of the model's
+own ColorHistograms layer) are compared with those 1 and `lag` frames earlier. The change score of the window
+is the largest `1 - cosine similarity` around its kept frames, widened by `margin` frames since the model
+marks the frame before a cut; the lag catches dissolves and fades, whose frame-to-frame changes are small.
+Windows scoring below `AutoShot(cascade_threshold=...)` are not run through the model and predict 0 for
+every kept frame.
+
+Windows are independent, so the cascade only changes the predictions of the skipped windows. The report
+below runs the full model once per video and replays every threshold on its predictions: the skip rate,
+the boundary recall/F1 against the full model, and the highest full-model prediction that a skipped window
+held (below the scene threshold, the cascade changed no scene):
+    python -m AutoShot.cascade --weights ./AutoShot/model_weight/ckpt_0_200_0.pth --videos ./input_sample \\
+        --thresholds 0.01 0.02 0.05 0.1 0.2 --report ./cascade_report.json
+"""
+import argparse
+import json
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from .utils import compute_color_histograms, get_batches
+
+CASCADE_LAG = 8
+CASCADE_MARGIN = 8
+
+
+def histogram_change_scores(histograms: np.ndarray, lags: Sequence[int] = (1, CASCADE_LAG)) -> np.ndarray:
+    """Per-frame change scores: the largest `1 - cosine similarity` of a frame's L2-normalized histogram with
+    the frames `lags` earlier (clipped to the first frame)
+
+    Args:
+        histograms (np.ndarray): L2-normalized color histograms, (frames, 512)
+
+    Returns:
+        np.ndarray: Change scores in [0, 1], (frames,)
+    """
+    scores = np.zeros(len(histograms), dtype=np.float32)
+    for lag in lags:
+        previous = histograms[np.maximum(np.arange(len(histograms)) - lag, 0)]
+        scores = np.maximum(scores, 1.0 - np.einsum("ij,ij->i", histograms, previous))
+    return scores
+
+
+def window_change_score(
+    window: np.ndarray,
+    histograms: Optional[np.ndarray] = None,
+    margin: int = CASCADE_MARGIN
+) -> float:
+    """Change score of an inference window, the largest frame change score around its kept frames
+
+    Args:
+        window (np.ndarray): Window of frames, (window_size, height, width, 3)
+        histograms (Optional[np.ndarray], optional): Precomputed color histograms of the window. Defaults to None.
+        margin (int, optional): Frames around the kept ones that are scored as well. Defaults to 8.
+    """
+    if histograms is None:
+        histograms = compute_color_histograms(window)
+    scores = histogram_change_scores(histograms)
+    return float(scores[max(0, 25 - margin):len(window) - 25 + margin].max())
+
+
+def window_change_scores(frames: np.ndarray, window_size: int = 100) -> np.ndarray:
+    """Change scores of every inference window of a video, in the order of `get_batches`"""
+    histograms = compute_color_histograms(frames)
+    return np.array([window_change_score(window, histogram_window) for window, histogram_window in
+                     zip(get_batches(frames, window_size), get_batches(histograms, window_size))])
+
+
+def skip_windows(predictions: np.ndarray, skipped: np.ndarray, window_stride: int) -> np.ndarray:
+    """Predictions of a cascade run, from the full-model predictions of a video and the skipped windows"""
+    predictions = predictions.copy()
+    for i in np.flatnonzero(skipped):
+        predictions[i * window_stride:(i + 1) * window_stride] = 0.0
+    return predictions
+
+
+def main(argv: Optional[List[str]] = None):
+    from .model import AutoShot
+    from .quantization import _video_paths, boundaries_f1
+    from .utils import get_frames
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default="./AutoShot/model_weight/ckpt_0_200_0.pth")
+    parser.add_argument("--videos", nargs="+", required=True, help="Videos or directories of videos")
+    parser.add_argument("--thresholds", nargs="+", type=float, default=[0.005, 0.01, 0.02, 0.05, 0.1, 0.2])
+    parser.add_argument("--threshold", type=float, default=0.5, help="Scene threshold on the predictions")
+    parser.add_argument("--tolerance", type=int, default=2, help="Frames a boundary may be off by and still match")
+    parser.add_argument("--window-size", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--report", default=None, help="Write the JSON report to this path")
+    args = parser.parse_args(argv)
+
+    # the report compares the cascade with the full model at the same window size, not with 100-frame windows
+    shot_detector = AutoShot(args.weights, device="cpu", batch_size=args.batch_size, window_size=args.window_size,
+                             unsafe_window_size=True)
+    stride = shot_detector.window_stride
+    videos = []
+    for path in _video_paths(args.videos):
+        frames = get_frames(path)
+        if len(frames) == 0:
+            print(f"No frames extracted from video: {path}, skipping it")
+            continue
+        predictions = shot_detector.detect_shots(frames=frames)
+        videos.append((path, predictions, window_change_scores(frames, args.window_size)))
+
+    rows = []
+    for cascade_threshold in sorted(args.thresholds):
+        windows, skipped_windows, max_skipped, per_video = 0, 0, 0.0, []
+        for path, predictions, scores in videos:
+            skipped = scores < cascade_threshold
+            padded = np.concatenate([predictions, np.zeros((len(scores) * stride - len(predictions), 1), np.float32)])
+            cascade = skip_windows(padded, skipped, stride)[:len(predictions)]
+            lost = padded.reshape(len(scores), stride)[skipped]
+            max_skipped = max(max_skipped, float(lost.max()) if lost.size else 0.0)
+            windows += len(scores)
+            skipped_windows += int(skipped.sum())
+            per_video.append({"video": path, "skip_rate": float(skipped.mean()),
+                              **boundaries_f1(AutoShot.predictions_to_scenes(predictions, args.threshold),
+                                              AutoShot.predictions_to_scenes(cascade, args.threshold),
+                                              args.tolerance)})
+        rows.append({
+            "cascade_threshold": cascade_threshold,
+            "skip_rate": skipped_windows / windows if windows else 0.0,
+            "mean_recall": float(np.mean([video["recall"] for video in per_video])),
+            "min_recall": float(np.min([video["recall"] for video in per_video])),
+            "mean_f1": float(np.mean([video["f1"] for video in per_video])),
+            "max_skipped_prediction": max_skipped,
+            "videos": per_video,
+        })
+
+    print(f"{'cascade_threshold':>17} {'skip_rate':>9} {'mean_recall':>11} {'min_recall':>10} {'mean_f1':>8} "
+          f"{'max_skipped_pred':>16}")
+    for row in rows:
+        print(f"{row['cascade_threshold']:>17.4f} {row['skip_rate']:>9.3f} {row['mean_recall']:>11.4f} "
+              f"{row['min_recall']:>10.4f} {row['mean_f1']:>8.4f} {row['max_skipped_prediction']:>16.4f}")
+    lossless = [row["cascade_threshold"] for row in rows if row["max_skipped_prediction"] < args.threshold]
+    if lossless:
+        print(f"Highest threshold that changes no scene on these videos: {max(lossless)}")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"threshold": args.threshold, "tolerance": args.tolerance, "window_size": args.window_size,
+                       "thresholds": rows}, f, indent=2)
+        print(f"Report saved to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Corpus discovery: parallel directory scan, cached metadata probing and longest-first scheduling.
+
+Directories are scanned by a thread pool, each sub-directory as its own task. Every video is then probed in
+the pool, with ffprobe (frame count, fps, duration, codec, size), or with OpenCV when ffprobe is missing or
+fails. Probes are cached in a JSON metadata index keyed by path and checked against the file's size and
+mtime, so a corpus is only probed once. The frame counts order the videos longest first, so a huge video
+found last does not leave the run waiting on one straggler, and they give frame-based progress and ETA.
+"""
+import json
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import cv2
+import ffmpeg
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+
+@dataclass(frozen=True)
+class VideoMetadata:
+    """
+    Probed metadata of a video file. frame_count is 0 when unknown.
+    """
+    path: str
+    size: int
+    mtime_ns: int
+    frame_count: int = 0
+    fps: float = 0.0
+    duration: float = 0.0
+    codec: Optional[str] = None
+    width: int = 0
+    height: int = 0
+    prober: Optional[str] = None
+
+
+def _scan_dir(directory: str) -> Tuple[List[str], List[str]]:
+    subdirs, videos = [], []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                subdirs.append(entry.path)
+            elif entry.is_file() and entry.name.lower().endswith(VIDEO_EXTENSIONS):
+                videos.append(entry.path)
+    return subdirs, videos
+
+
+def scan_videos(input_dir: str, workers: int = 8) -> List[str]:
+    """Every video file under input_dir, scanning the directories in parallel
+
+    Returns:
+        List[str]: Sorted video paths
+    """
+    videos: List[str] = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan") as executor:
+        pending = {executor.submit(_scan_dir, input_dir)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                subdirs, found = future.result()
+                videos.extend(found)
+                pending |= {executor.submit(_scan_dir, subdir) for subdir in subdirs}
+    return sorted(videos)
+
+
+def _parse_rate(rate: Optional[str]) -> float:
+    try:
+        numerator, _, denominator = (rate or "0").partition("/")
+        return float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def _probe_ffprobe(path: str, size: int, mtime_ns: int) -> VideoMetadata:
+    info = ffmpeg.probe(path, select_streams="v:0")
+    stream = info["streams"][0]
+    fps = _parse_rate(stream.get("avg_frame_rate")) or _parse_rate(stream.get("r_frame_rate"))
+    duration = float(stream.get("duration") or info.get("format", {}).get("duration") or 0.0)
+    # nb_frames is missing from some containers (mkv, some webm): estimate it from the duration
+    frame_count = int(stream.get("nb_frames") or 0) or int(round(duration * fps))
+    return VideoMetadata(path, size, mtime_ns, frame_count=frame_count, fps=fps, duration=duration,
+                         codec=stream.get("codec_name"), width=int(stream.get("width") or 0),
+                         height=int(stream.get("height") or 0), prober="ffprobe")
+
+
+def _probe_opencv(path: str, size: int, mtime_ns: int) -> VideoMetadata:
+    cap = cv2.VideoCapture(path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_count = max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+        codec = "".join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00 ") or None
+        return VideoMetadata(path, size, mtime_ns, frame_count=frame_count, fps=fps,
+                             duration=frame_count / fps if fps > 0 else 0.0, codec=codec,
+                             width=int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                             height=int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), prober="opencv")
+    finally:
+        cap.release()
+
+
+_ffprobe_missing = False
+
+
+def probe_video(path: str) -> VideoMetadata:
+    """Probe a video with ffprobe, falling back to OpenCV when ffprobe is not installed or fails"""
+    global _ffprobe_missing
+    stat = os.stat(path)
+    if not _ffprobe_missing:
+        try:
+            return _probe_ffprobe(path, stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            # the ffprobe binary itself is missing, don't try it again for every video
+            _ffprobe_missing = True
+        except (ffmpeg.Error, KeyError, IndexError, ValueError):
+            pass
+    return _probe_opencv(path, stat.st_size, stat.st_mtime_ns)
+
+
+class MetadataIndex:
+    """
+        JSON cache of the probed metadata of videos, keyed by path and valid while their size and mtime match
+    """
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self._entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                print(f"Can't read the metadata index {index_path}, probing every video again")
+
+    def get(self, path: str, size: int, mtime_ns: int) -> Optional[VideoMetadata]:
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry is None or entry.get("size") != size or entry.get("mtime_ns") != mtime_ns:
+            return None
+        try:
+            return VideoMetadata(**entry)
+        except TypeError:
+            return None
+
+    def put(self, metadata: VideoMetadata) -> None:
+        with self._lock:
+            self._entries[metadata.path] = asdict(metadata)
+            self._dirty = True
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            index_dir = os.path.dirname(self.index_path)
+            if index_dir:
+                os.makedirs(index_dir, exist_ok=True)
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.index_path)
+            self._dirty = False
+
+
+def probe_videos(
+    video_paths: Iterable[str],
+    index: Optional[MetadataIndex] = None,
+    workers: int = 8
+) -> List[VideoMetadata]:
+    """Metadata of every video, from the index when it is up to date, probed in a thread pool otherwise
+
+    Args:
+        video_paths (Iterable[str]): Videos to probe
+        index (Optional[MetadataIndex], optional): Metadata cache, saved once every video is probed. Defaults to None.
+        workers (int, optional): Probing threads. Defaults to 8.
+
+    Returns:
+        List[VideoMetadata]: Metadata in the order of video_paths, with frame_count 0 for unreadable videos
+    """
+    def probe(path: str) -> VideoMetadata:
+        stat = os.stat(path)
+        cached = index.get(path, stat.st_size, stat.st_mtime_ns) if index is not None else None
+        if cached is not None:
+            return cached
+        try:
+            metadata = probe_video(path)
+        except Exception as e:
+            print(f"Failed to probe video {path}: {e}")
+            return VideoMetadata(path, stat.st_size, stat.st_mtime_ns)
+        if index is not None:
+            index.put(metadata)
+        return metadata
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="probe") as executor:
+        metadata = list(executor.map(probe, video_paths))
+    if index is not None:
+        index.save()
+    return metadata
+
+
+def longest_first(metadata: Iterable[VideoMetadata]) -> List[VideoMetadata]:
+    """Order videos by decreasing frame count, ties by path. Videos of unknown length go last"""
+    return sorted(metadata, key=lambda video: (-video.frame_count, video.path))
+
+
+def discover_videos(
+    input_dir: str,
+    index_path: Optional[str] = None,
+    workers: int = 8
+) -> List[VideoMetadata]:
+    """Scan input_dir, probe its videos and order them longest first
+
+    Args:
+        input_dir (str): Directory scanned for videos
+        index_path (Optional[str], optional): JSON metadata index, None probes every video. Defaults to None.
+        workers (int, optional): Scanning and probing threads. Defaults to 8.
+    """
+    index = MetadataIndex(index_path) if index_path else None
+    return longest_first(probe_videos(scan_videos(input_dir, workers), index, workers))
@@ -0,0 +1,248 @@
+"""
+Export of a trained TransNetV2Supernet to a lean inference graph for CPU-only nodes.
+
+The exported network computes exactly the one-hot logits of the eager model in eval mode, with:
+    - every BatchNorm3d folded into the temporal convolution of the blocks feeding it,
+    - the dead branches stripped (the empty Attention1D layer, fc1, the many-hot head, dropout),
+    - the banded similarity kernel and a scatter-based color histogram, so the graph has no data-dependent
+      Python control flow and accepts any batch size and window length.
+
+It takes the raw uint8 windows, (windows, frames, height, width, 3), and is saved as TorchScript, or as
+ONNX when the `onnx` package is installed. Load the artifact with `AutoShot(path, backend="torchscript")`
+or `AutoShot(path, backend="onnx")` (the latter needs `onnxruntime`).
+
+Run from the repository root, the parity check compares the artifact with the eager model on sample windows:
+    python -m AutoShot.export --weights ./AutoShot/model_weight/ckpt_0_200_0.pth \\
+        --output ./AutoShot/model_weight/autoshot_cpu.pt --onnx ./AutoShot/model_weight/autoshot_cpu.onnx
+"""
+import argparse
+import copy
+from typing import List, Optional
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from .supernet import DilatedDCNNV2ABC, TransNetV2Supernet, band_similarities
+from .weights import build_model
+
+
+def fold_batch_norm(layer: nn.Module) -> nn.ModuleList:
+    """Fold the BatchNorm3d of a DilatedDCNNV2/DilatedDCNNV2ABC into its conv blocks
+
+    The batch norm runs on the concatenation of the block outputs, so each block owns a slice of its
+    channels, and the last (temporal) convolution of the block can absorb the scale and shift of that slice.
+
+    Args:
+        layer (nn.Module): DilatedDCNNV2 or DilatedDCNNV2ABC with st_type "A", in eval mode
+
+    Returns:
+        nn.ModuleList: One nn.Sequential per conv block, computing its slice of the normalized output
+    """
+    if isinstance(layer, DilatedDCNNV2ABC) and layer.st_type != "A":
+        raise ValueError(f"Can't fold the batch norm of a DilatedDCNNV2ABC of type {layer.st_type}")
+
+    blocks = nn.ModuleList()
+    bn = layer.batch_norm
+    if bn is not None:
+        scale = bn.weight / torch.sqrt(bn.running_var + bn.eps)
+        shift = bn.bias - bn.running_mean * scale
+    offset = 0
+    for block in layer.conv_blocks:
+        convs = [copy.deepcopy(conv) for conv in block.layers]
+        if bn is not None:
+            conv = convs[-1]
+            channels = slice(offset, offset + conv.out_channels)
+            folded = nn.Conv3d(conv.in_channels, conv.out_channels, kernel_size=conv.kernel_size,
+                               padding=conv.padding, dilation=conv.dilation, bias=True)
+            folded.weight.data = conv.weight.data * scale[channels].reshape(-1, 1, 1, 1, 1)
+            bias = conv.bias.data * scale[channels] if conv.bias is not None else 0.
+            folded.bias.data = bias + shift[channels]
+            convs[-1] = folded
+            offset += conv.out_channels
+        blocks.append(nn.Sequential(*convs))
+    return blocks
+
+
+class _FoldedDilatedBlock(nn.Module):
+    def __init__(self, layer: nn.Module):
+        super().__init__()
+        self.share = copy.deepcopy(layer.share) if isinstance(layer, DilatedDCNNV2ABC) else nn.Identity()
+        self.conv_blocks = fold_batch_norm(layer)
+        self.relu = layer.activation is not None
+
+    def forward(self, x):
+        x = self.share(x)
+        x = torch.cat([block(x) for block in self.conv_blocks], dim=1)
+        return F.relu(x) if self.relu else x
+
+
+class _FrameSimilarityHead(nn.Module):
+    def __init__(self, layer: nn.Module):
+        super().__init__()
+        self.projection = copy.deepcopy(layer.projection.linear)
+        self.fc = copy.deepcopy(layer.fc.linear)
+        self.lookup_window = layer.lookup_window
+
+    def forward(self, block_features: List[torch.Tensor]):
+        x = torch.cat([torch.mean(x, dim=[3, 4]) for x in block_features], dim=1).permute(0, 2, 1)
+        x = F.normalize(self.projection(x), p=2, dim=2)
+        return F.relu(self.fc(band_similarities(x, self.lookup_window, kernel="banded")))
+
+
+class _ColorHistogramHead(nn.Module):
+    def __init__(self, layer: nn.Module):
+        super().__init__()
+        self.fc = copy.deepcopy(layer.fc.linear)
+        self.lookup_window = layer.lookup_window
+
+    def forward(self, frames):
+        # frames: [BS, N, H, W, 3] uint8, 512 bins of the 3 most significant bits of R, G and B
+        bins = frames.to(torch.int64) >> 5
+        bins = ((bins[..., 0] << 6) + (bins[..., 1] << 3) + bins[..., 2]).flatten(start_dim=2)
+        histograms = torch.zeros(bins.shape[0], bins.shape[1], 512, dtype=torch.float32, device=frames.device)
+        histograms = histograms.scatter_add(2, bins, torch.ones_like(bins, dtype=torch.float32))
+        histograms = histograms / torch.norm(histograms, dim=2, keepdim=True)
+        return F.relu(self.fc(band_similarities(histograms, self.lookup_window, kernel="banded")))
+
+
+class TransNetV2Inference(nn.Module):
+    """
+        Inference-only copy of a TransNetV2Supernet, built from the eager model and computing its one-hot logits
+    """
+
+    def __init__(self, model: TransNetV2Supernet):
+        super().__init__()
+        if model.training:
+            raise ValueError("Put the model in eval mode before exporting it, batch norm folding uses running statistics")
+        if model.Layer_6_0.n_layer != 0 or model.use_mean_pooling or model.frame_similarity_on_last_layer \
+                or model.frame_sim_layer is None or model.color_hist_layer is None:
+            raise ValueError("Only the AutoShot configuration of TransNetV2Supernet can be exported")
+
+        with torch.no_grad():
+            self.blocks = nn.ModuleList([
+                _FoldedDilatedBlock(layer) for layer in (model.Layer_0_3, model.Layer_1_8, model.Layer_2_8,
+                                                         model.Layer_3_8, model.Layer_4_13, model.Layer_5_12)
+            ])
+            self.frame_similarity = _FrameSimilarityHead(model.frame_sim_layer)
+            self.color_histograms = _ColorHistogramHead(model.color_hist_layer)
+            self.fc = copy.deepcopy(model.fc1_0.linear)
+            self.cls = copy.deepcopy(model.cls_layer1.linear)
+        self.pool = nn.AvgPool3d(kernel_size=(1, 2, 2))
+
+    def forward(self, frames):
+        """frames: [BS, N, H, W, 3] uint8 windows, returns the [BS, N, 1] one-hot logits"""
+        x = frames.permute(0, 4, 1, 2, 3).to(torch.float32) / 255.
+
+        block_features = []
+        for i in range(0, len(self.blocks), 2):
+            shortcut = self.blocks[i](x)
+            x = self.pool(shortcut + self.blocks[i + 1](shortcut))
+            block_features.append(x)
+
+        x = x.permute(0, 2, 3, 4, 1).flatten(start_dim=2)  # [BS, N, H * W * C]
+        x = torch.cat([self.color_histograms(frames), self.frame_similarity(block_features), x], dim=2)
+        x = F.relu(self.fc(x))
+        return self.cls(x)
+
+
+def load_eager_model(pretrained_path: str) -> TransNetV2Supernet:
+    """Build the eager model on CPU and load the checkpoint weights, as `AutoShot` does"""
+    return build_model(pretrained_path, device="cpu")
+
+
+def sample_windows(num_windows: int = 2, window_size: int = 100, seed: int = 0) -> np.ndarray:
+    """Random-scene uint8 windows, (num_windows, window_size, 27, 48, 3), with a few cuts so the parity
+    check also covers confident transitions"""
+    rng = np.random.default_rng(seed)
+    windows = np.empty((num_windows, window_size, 27, 48, 3), dtype=np.uint8)
+    for i in range(num_windows):
+        cuts = np.sort(rng.choice(np.arange(1, window_size), size=3, replace=False))
+        for start, end in zip(np.concatenate([[0], cuts]), np.concatenate([cuts, [window_size]])):
+            base = rng.integers(0, 256, size=(1, 27, 48, 3))
+            noise = rng.integers(-8, 9, size=(end - start, 27, 48, 3))
+            windows[i, start:end] = np.clip(base + noise, 0, 255)
+    return windows
+
+
+def export_torchscript(module: TransNetV2Inference, output_path: str, example: torch.Tensor) -> torch.jit.ScriptModule:
+    with torch.no_grad():
+        traced = torch.jit.trace(module, example, check_trace=False)
+    traced = torch.jit.freeze(traced)
+    torch.jit.save(traced, output_path)
+    return traced
+
+
+def export_onnx(module: TransNetV2Inference, output_path: str, example: torch.Tensor) -> None:
+    try:
+        import onnx  # noqa: F401
+    except ImportError:
+        raise ImportError("ONNX export needs the onnx package: pip install onnx onnxruntime")
+    with torch.no_grad():
+        torch.onnx.export(
+            module, (example,), output_path,
+            input_names=["frames"], output_names=["logits"],
+            dynamic_axes={"frames": {0: "windows", 1: "frames"}, "logits": {0: "windows", 1: "frames"}},
+            opset_version=17
+        )
+
+
+def check_parity(eager_model: TransNetV2Supernet, exported, windows: np.ndarray) -> float:
+    """Largest absolute difference of the sigmoid predictions of the eager and exported models on the windows
+
+    Args:
+        eager_model (TransNetV2Supernet): Eager model in eval mode
+        exported: TransNetV2Inference, its TorchScript trace, or an onnxruntime InferenceSession
+        windows (np.ndarray): uint8 windows, (N, frames, height, width, 3)
+    """
+    with torch.no_grad():
+        reference = eager_model(torch.from_numpy(windows.transpose((0, 4, 1, 2, 3))) * 1.0)
+        reference = torch.sigmoid(reference[0] if isinstance(reference, tuple) else reference).numpy()
+        if hasattr(exported, "run"):
+            logits = torch.from_numpy(exported.run(None, {"frames": windows})[0])
+        else:
+            logits = exported(torch.from_numpy(windows))
+        predictions = torch.sigmoid(logits).numpy()
+    return float(np.abs(reference - predictions).max())
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default="./AutoShot/model_weight/ckpt_0_200_0.pth")
+    parser.add_argument("--output", required=True, help="TorchScript artifact path")
+    parser.add_argument("--onnx", default=None, help="Also export an ONNX artifact to this path")
+    parser.add_argument("--num-windows", type=int, default=2, help="Sample windows of the parity check")
+    parser.add_argument("--window-size", type=int, default=100)
+    parser.add_argument("--tolerance", type=float, default=1e-4)
+    args = parser.parse_args(argv)
+
+    eager_model = load_eager_model(args.weights)
+    module = TransNetV2Inference(eager_model).eval()
+    windows = sample_windows(args.num_windows, args.window_size)
+    example = torch.from_numpy(windows)
+
+    artifacts = [("torchscript", export_torchscript(module, args.output, example))]
+    print(f"Saved TorchScript model to {args.output}")
+    if args.onnx:
+        export_onnx(module, args.onnx, example)
+        print(f"Saved ONNX model to {args.onnx}")
+        try:
+            import onnxruntime
+            artifacts.append(("onnx", onnxruntime.InferenceSession(args.onnx, providers=["CPUExecutionProvider"])))
+        except ImportError:
+            print("onnxruntime is not installed, skipping the ONNX parity check")
+
+    # a different window count and length than the trace example, to catch shapes baked into the graph
+    check_windows = sample_windows(args.num_windows + 1, args.window_size + 50, seed=1)
+    failed = False
+    for name, artifact in artifacts:
+        diff = check_parity(eager_model, artifact, check_windows)
+        print(f"{name}: max abs diff of the predictions vs eager = {diff:.2e}")
+        failed |= diff > args.tolerance
+    if failed:
+        raise SystemExit(f"Exported model differs from the eager model by more than {args.tolerance}")
+
+
+if __name__ == "__main__":
+    main()
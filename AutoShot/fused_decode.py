@@ -0,0 +1,208 @@
+import os
+import cv2
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Set, Tuple
+from .model import AutoShot
+from .keyframe_extractor import KeyFrameExtractor
+from .utils import FrameStream, stream_frames
+
+
+class _SceneTracker:
+    """
+        Incremental version of `AutoShot.predictions_to_scenes`: fed with consecutive chunks of binarized
+        predictions, it returns every scene as soon as it is closed by the start of a transition
+    """
+
+    def __init__(self):
+        self.t_prev = 0
+        self.start = 0
+        self.position = 0
+        self.num_scenes = 0
+
+    def update(self, binary: np.ndarray) -> List[List[int]]:
+        closed = []
+        for t in binary:
+            i = self.position
+            if self.t_prev == 1 and t == 0:
+                self.start = i
+            if self.t_prev == 0 and t == 1 and i != 0:
+                closed.append([self.start, i])
+            self.t_prev = t
+            self.position += 1
+        self.num_scenes += len(closed)
+        return closed
+
+    def finish(self) -> List[List[int]]:
+        last = self.position - 1
+        if self.position > 0 and self.t_prev == 0:
+            return [[self.start, last]]
+        if self.num_scenes == 0:
+            # just fix if all predictions are 1
+            return [[0, last]]
+        return []
+
+    def lowest_needed_frame(self) -> int:
+        """Every keyframe still to be sampled is at or after this index, except the start of the open scene:
+        the open scene ends at or after the last predicted frame, so its middle frame is at or after the
+        middle of [start, position - 1]"""
+        if self.t_prev == 0:
+            return self.start + max(0, self.position - 1 - self.start) // 2
+        return self.position
+
+
+class _FusedFrameStream(FrameStream):
+    """
+        FrameStream fed by a single native-resolution decode: every chunk is kept in the shared ring buffer
+        at full resolution, and downscaled in-process for the shot detector
+    """
+
+    def __init__(self, video_file_path: str, native_size: Tuple[int, int], ring_buffer: "OrderedDict[int, np.ndarray]",
+                 capacity: int, chunk_size: int, window_size: int = 100, width: int = 48, height: int = 27):
+        super().__init__(video_file_path, width=width, height=height, chunk_size=chunk_size, window_size=window_size)
+        self.native_size = native_size
+        self.ring_buffer = ring_buffer
+        self.capacity = capacity
+        self.evicted = 0
+
+    def _chunks(self) -> Iterator[np.ndarray]:
+        native_width, native_height = self.native_size
+        position = 0
+        for chunk in stream_frames(self.video_file_path, native_width, native_height, self.chunk_size, pix_fmt='bgr24'):
+            small = np.empty((len(chunk), self.height, self.width, 3), dtype=np.uint8)
+            for j, frame in enumerate(chunk):
+                self.ring_buffer[position + j] = frame
+                small[j] = cv2.resize(frame, (self.width, self.height), interpolation=cv2.INTER_AREA)[..., ::-1]
+            position += len(chunk)
+            while len(self.ring_buffer) > self.capacity:
+                self.ring_buffer.popitem(last=False)
+                self.evicted += 1
+            yield small
+
+
+class FusedDecoder:
+    """
+        Shot detection and keyframe extraction from a single decode of the video.
+
+        The video is decoded once at native resolution. Each frame is downscaled in-process (cv2 INTER_AREA, so
+        predictions are close to but not bit-identical with the ffmpeg-scaled `get_frames` path) for AutoShot,
+        and kept at full resolution in a bounded ring buffer. As predictions come in, scenes are closed
+        incrementally, their keyframes are taken from the buffer, and frames that no remaining keyframe can
+        need are dropped. Keyframes that fell out of the buffer (scenes longer than the buffer) are
+        extracted afterwards with a single sequential pass over the file.
+    """
+
+    def __init__(
+        self,
+        shot_detector: AutoShot,
+        keyframe_extractor: KeyFrameExtractor,
+        buffer_mb: int = 512,
+        chunk_size: int = 50,
+        threshold: float = 0.5
+    ):
+        """Initialize the fused decoder
+
+        Args:
+            shot_detector (AutoShot): Loaded shot detector
+            keyframe_extractor (KeyFrameExtractor): Extractor the keyframes are saved through
+            buffer_mb (int, optional): Memory budget of the full-resolution ring buffer. Defaults to 512.
+            chunk_size (int, optional): Number of frames read from the ffmpeg pipe at a time. Defaults to 50.
+            threshold (float, optional): Shot boundary threshold, as in `predictions_to_scenes`. Defaults to 0.5.
+        """
+        self.shot_detector = shot_detector
+        self.keyframe_extractor = keyframe_extractor
+        self.buffer_mb = buffer_mb
+        self.chunk_size = chunk_size
+        self.threshold = threshold
+
+    @staticmethod
+    def _native_size(video_path: str) -> Tuple[int, int]:
+        cap = cv2.VideoCapture(video_path)
+        width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
+        if width <= 0 or height <= 0:
+            raise ValueError(f"Can't read the frame size of video: {video_path}")
+        return width, height
+
+    def process_video(self, video_path: str, output_prefix: str, return_predictions: bool = False):
+        """Detect the scenes of a video and save their keyframes
+
+        Args:
+            video_path (str): Path to the video file
+            output_prefix (str): Sub-directory of the keyframe directory the keyframes are saved in
+            return_predictions (bool, optional): Also return the per-frame predictions. Defaults to False.
+
+        Raises:
+            RuntimeError: Decoding, inference or keyframe extraction failed
+
+        Returns:
+            List[List[int]]: Scene start and end frame indices, as returned by `AutoShot.process_video`,
+            followed by the (num_frames, 1) predictions when return_predictions is set
+        """
+        try:
+            if not os.path.exists(video_path):
+                raise FileNotFoundError(f"File not found: {video_path}")
+
+            native_size = self._native_size(video_path)
+            capacity = max(1, self.buffer_mb * 1024 * 1024 // (native_size[0] * native_size[1] * 3))
+            ring_buffer: "OrderedDict[int, np.ndarray]" = OrderedDict()
+            stream = _FusedFrameStream(video_path, native_size, ring_buffer, capacity, self.chunk_size,
+                                       window_size=self.shot_detector.window_size)
+
+            tracker = _SceneTracker()
+            scene_starts: Dict[int, np.ndarray] = {}
+            missing: Set[int] = set()
+            scenes: List[List[int]] = []
+            kept_predictions: List[np.ndarray] = []
+            predicted = 0
+
+            def save(closed: List[List[int]]) -> None:
+                for start, end in closed:
+                    scenes.append([start, end])
+                    for frame_idx in self.keyframe_extractor.sample_frames_from_shot(start, end):
+                        frame = scene_starts.get(frame_idx)
+                        if frame is None:
+                            frame = ring_buffer.get(frame_idx)
+                        if frame is None:
+                            missing.add(frame_idx)
+                        else:
+                            self.keyframe_extractor.save_keyframe(frame, frame_idx, output_prefix)
+
+            def consume(predictions: np.ndarray) -> None:
+                nonlocal predicted
+                # the padded tail windows predict frames past the end of the video
+                predictions = predictions[:max(0, stream.num_frames - predicted)]
+                predicted += len(predictions)
+                if return_predictions:
+                    kept_predictions.append(predictions)
+                save(tracker.update((predictions > self.threshold).astype(np.uint8).reshape(-1)))
+
+                if tracker.t_prev == 0 and tracker.start not in scene_starts:
+                    scene_starts.clear()
+                    if tracker.start in ring_buffer:
+                        scene_starts[tracker.start] = ring_buffer[tracker.start].copy()
+                lowest = tracker.lowest_needed_frame()
+                while ring_buffer and next(iter(ring_buffer)) < lowest:
+                    ring_buffer.popitem(last=False)
+
+            profiler = self.shot_detector.profiler
+            # batched like detect_shots, with the detector's cascade pre-filter
+            for predictions in self.shot_detector.iter_predictions(profiler.iterate("decode", stream)):
+                consume(predictions)
+
+            if stream.num_frames == 0:
+                raise ValueError(f"No frames extracted from video: {video_path}")
+            profiler.count("frames", stream.num_frames)
+            save(tracker.finish())
+            ring_buffer.clear()
+            scene_starts.clear()
+            self.keyframe_extractor.flush(output_prefix)
+
+            if missing:
+                print(f"{len(missing)} keyframes of {output_prefix} left the {self.buffer_mb}MB buffer, re-reading them")
+                self.keyframe_extractor.extract_frames_sequential(video_path, sorted(missing), output_prefix)
+            if return_predictions:
+                return scenes, np.concatenate(kept_predictions, axis=0)
+            return scenes
+        except Exception as e:
+            raise RuntimeError(f"Failed to process video: {video_path}. Error: {e}")
@@ -1,22 +1,125 @@
 import os
 import cv2
 import numpy as np
-from typing import List 
+from typing import Iterable, List, Optional
+from .keyframe_store import KeyframeSink, keyframe_key
+from .keyframe_writer import KeyframeWriter
+from .profiling import NULL_PROFILER, NullProfiler
 
 
 
 class KeyFrameExtractor:
-    def __init__(self, keyframe_dir: str):
+    def __init__(
+        self,
+        keyframe_dir: str,
+        sequential: bool = False,
+        image_format: str = 'jpg',
+        quality: int = 95,
+        writer_workers: int = 0,
+        max_pending_writes: int = 64,
+        profiler: Optional[NullProfiler] = None,
+        sink: Optional[KeyframeSink] = None
+    ):
+        """
+        Args:
+            keyframe_dir (str): Directory to save the keyframes
+            sequential (bool, optional): Decode each video once from start to end and keep only the requested
+            frames, instead of seeking before every keyframe. Much faster on long-GOP H.264. Defaults to False.
+            image_format (str, optional): Keyframe format, 'jpg', 'webp' or 'png'. Defaults to 'jpg'.
+            quality (int, optional): JPEG/WebP quality. Defaults to 95.
+            writer_workers (int, optional): Threads encoding and writing keyframes in the background,
+            0 writes them on the calling thread. Image files only, a sink writes on the calling thread. Defaults to 0.
+            max_pending_writes (int, optional): Keyframes in flight before extraction blocks. Defaults to 64.
+            profiler (Optional[NullProfiler], optional): Profiler timing the seeks, decodes and writes. Defaults to None.
+            sink (Optional[KeyframeSink], optional): Store packing the keyframes into shards (`TarShardSink`,
+            `ArrayStoreSink`) instead of one image file each under keyframe_dir. The caller closes it. Defaults to None.
+
+        Raises:
+            ValueError: writer_workers is set along with a sink
+        """
+        if sink is not None and writer_workers > 0:
+            raise ValueError("writer_workers only applies to image files, a keyframe sink writes on the calling thread")
         self.keyframe_dir = keyframe_dir
+        self.sequential = sequential
+        self.profiler = profiler or NULL_PROFILER
+        self.sink = sink
+        self.writer = KeyframeWriter(
+            image_format=image_format,
+            quality=quality,
+            num_workers=writer_workers,
+            max_pending=max_pending_writes,
+            profiler=self.profiler
+        )
         os.makedirs(self.keyframe_dir, exist_ok=True)
 
     def sample_frames_from_shot(self, start: int, end: int, num_samples: int = 3) -> List[int]:
         return [start + i * (end - start) // (num_samples - 1) for i in range(num_samples)]
 
-    def save_frame(self, frame: np.ndarray, filename: str) -> bool:
-        return cv2.imwrite(filename, frame)
-    
+    def save_frame(self, frame: np.ndarray, filename: str, output_prefix: Optional[str] = None) -> bool:
+        with self.profiler.stage("keyframes.write"):
+            return self.writer.write(frame, filename, group=output_prefix)
+
+    def keyframe_path(self, frame_idx: int, output_prefix: str) -> str:
+        """File a keyframe is saved to, or its key in the sink"""
+        if self.sink is not None:
+            return keyframe_key(output_prefix, frame_idx)
+        return os.path.join(self.keyframe_dir, output_prefix, f"{frame_idx:06d}.{self.writer.extension}")
+
+    def scene_keyframe_paths(self, scenes: List[List[int]], output_prefix: str) -> List[List[str]]:
+        """Paths the keyframes of every scene are saved to"""
+        return [[self.keyframe_path(frame_idx, output_prefix) for frame_idx in self.sample_frames_from_shot(start, end)]
+                for start, end in scenes]
+
+    def save_keyframe(self, frame: np.ndarray, frame_idx: int, output_prefix: str) -> bool:
+        """Save an already decoded BGR frame under keyframe_dir/output_prefix, named after its index"""
+        if self.sink is not None:
+            with self.profiler.stage("keyframes.write"):
+                written = self.sink.write(output_prefix, frame_idx, frame)
+            if not written:
+                print(f"Failed to save frame {frame_idx} for video {output_prefix}")
+                return False
+            self.profiler.count("bytes_written", written)
+            return True
+        self.writer.prepare_dir(os.path.join(self.keyframe_dir, output_prefix))
+        keyframe_path = self.keyframe_path(frame_idx, output_prefix)
+        if not self.save_frame(frame=frame, filename=keyframe_path, output_prefix=output_prefix):
+            print(f"Failed to save frame {frame_idx} for video {output_prefix}")
+            return False
+        return True
+
+    def flush(self, output_prefix: str) -> int:
+        """Wait for the pending keyframe writes of a video, not of the videos other threads are writing, and
+        report the failed ones
+
+        Returns:
+            int: Number of keyframes that could not be written
+        """
+        with self.profiler.stage("keyframes.flush"):
+            failures = self.writer.flush(output_prefix)
+            if self.sink is not None:
+                self.sink.flush()
+        for filename in failures:
+            print(f"Failed to save {filename} for video {output_prefix}")
+        return len(failures)
+
+    def close(self) -> int:
+        """Wait for every pending keyframe write and stop the writer threads, report the failed writes. The sink
+        is left to its owner
+
+        Returns:
+            int: Number of keyframes that could not be written
+        """
+        failures = self.writer.close()
+        for filename in failures:
+            print(f"Failed to save {filename}")
+        return len(failures)
+
     def extract_keyframes(self, video_path: str, scenes: List[List[int]], output_prefix: str) -> None:
+        if self.sequential:
+            frame_indices = [idx for start, end in scenes for idx in self.sample_frames_from_shot(start, end)]
+            self.extract_frames_sequential(video_path, frame_indices, output_prefix)
+            return
+
         try:
             if not os.path.exists(video_path):
                 raise FileNotFoundError(f"Video file not found: {video_path}")
@@ -27,22 +130,49 @@ class KeyFrameExtractor:
             for _, (start, end) in enumerate(scenes):
                 sample_frames = self.sample_frames_from_shot(start, end)
                 for _, frame_idx in enumerate(sample_frames):
-                    cap.set(cv2.CAP_PROP_POS_FRAMES, float(frame_idx))
-                    ret, frame = cap.read()
+                    with self.profiler.stage("keyframes.seek"):
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, float(frame_idx))
+                        ret, frame = cap.read()
                     if ret:
-                        video_keyframe_dir = os.path.join(self.keyframe_dir, output_prefix)
-                        os.makedirs(video_keyframe_dir, exist_ok=True)
-                        
-                        keyframe_filename = f"{frame_idx:06d}.jpg"
-                        keyframe_path = os.path.join(video_keyframe_dir, keyframe_filename)
-                        
-                        if not self.save_frame(frame=frame, filename=keyframe_path):
-                             print(f"Failed to save frame {frame_idx} for video {output_prefix}")
+                        self.save_keyframe(frame=frame, frame_idx=frame_idx, output_prefix=output_prefix)
                     else:
                         print(f"Failed to read frame {frame_idx} for video {output_prefix}")
-            
+
+            cap.release()
+            self.flush(output_prefix)
+        except Exception as e:
+            raise RuntimeError(f"Failed to extract keyframes from video {video_path}. Error: {str(e)}")
+
+    def extract_frames_sequential(self, video_path: str, frame_indices: Iterable[int], output_prefix: str) -> None:
+        """Save the given frames by decoding the video once, in order: wanted frames are read, the others
+        are only grabbed, so no seek ever re-decodes from the previous keyframe
+
+        Args:
+            video_path (str): Path to the video file
+            frame_indices (Iterable[int]): Frame indices to save, in any order, duplicates allowed
+            output_prefix (str): Sub-directory of keyframe_dir the frames are saved in
+        """
+        try:
+            if not os.path.exists(video_path):
+                raise FileNotFoundError(f"Video file not found: {video_path}")
+
+            wanted = sorted(set(int(idx) for idx in frame_indices))
+            if not wanted:
+                return
+
+            cap = cv2.VideoCapture(video_path)
+            position = 0
+            for frame_idx in wanted:
+                with self.profiler.stage("keyframes.decode"):
+                    while position < frame_idx and cap.grab():
+                        position += 1
+                    ret, frame = cap.read() if position == frame_idx else (False, None)
+                if not ret:
+                    print(f"Failed to read frame {frame_idx} for video {output_prefix}")
+                    continue
+                position += 1
+                self.save_keyframe(frame=frame, frame_idx=frame_idx, output_prefix=output_prefix)
             cap.release()
+            self.flush(output_prefix)
         except Exception as e:
             raise RuntimeError(f"Failed to extract keyframes from video {video_path}. Error: {str(e)}")
-                    
-        
\ No newline at end of file
@@ -0,0 +1,341 @@
+"""
+Keyframe sinks that pack the keyframes of many videos into a few large files, instead of one image file per
+keyframe, and readers with random access by (video, frame_idx).
+
+    - `TarShardSink`: WebDataset-style tar shards of encoded images, `<video>/<frame_idx:06d>.<ext>` members,
+      a new shard every `shard_max_count` keyframes or `shard_max_bytes` bytes.
+    - `ArrayStoreSink`: keyframes resized to a fixed size, rows of `.npy` shards of shape
+      (frames, height, width, 3) uint8 BGR, read back memory-mapped.
+
+Both write sequentially through large buffers, and append the location of every keyframe to a JSONL offset
+index on `flush` (called after every video), so the stored keyframes stay readable if a run is interrupted.
+Every sink instance writes its own shards and index file, tagged with a session id, so several processes
+can write to the same directory. `open_keyframe_store` opens either store for reading.
+"""
+import io
+import json
+import os
+import struct
+import tarfile
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from glob import glob
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .keyframe_writer import KeyframeWriter
+
+_BUFFER_BYTES = 8 << 20
+# .npy header size reserved up front, so the frame count can be written once the shard is filled
+_NPY_HEADER_BYTES = 128
+
+
+def keyframe_key(video: str, frame_idx: int) -> str:
+    """Key of a keyframe in the stores, `<video>/<frame_idx:06d>`"""
+    return f"{video}/{int(frame_idx):06d}"
+
+
+class KeyframeSink(ABC):
+    """
+        Base of the keyframe sinks: thread-safe sequential writer of one shard at a time, plus its offset index
+    """
+
+    def __init__(self, output_dir: str, shard_max_count: int):
+        self.output_dir = output_dir
+        self.shard_max_count = shard_max_count
+        self.session = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.index_path = os.path.join(output_dir, f"index-{self.session}.jsonl")
+        self.keyframes_written = 0
+        self._shard = -1
+        self._shard_count = 0
+        self._pending_index: List[Dict] = []
+        self._lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+
+    @abstractmethod
+    def shard_path(self, shard: int) -> str:
+        """Path of a shard of this session"""
+
+    @abstractmethod
+    def write(self, video: str, frame_idx: int, frame: np.ndarray) -> int:
+        """Store a BGR keyframe of a video
+
+        Returns:
+            int: Bytes written, 0 when the keyframe could not be encoded
+        """
+
+    def _flush_shard(self) -> None:
+        pass
+
+    def _close_shard(self) -> None:
+        pass
+
+    def flush(self) -> None:
+        """Flush the current shard and append the locations of the new keyframes to the index"""
+        with self._lock:
+            self._flush_shard()
+            if self._pending_index:
+                with open(self.index_path, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(entry) + "\n" for entry in self._pending_index))
+                self._pending_index = []
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._close_shard()
+
+    def __enter__(self) -> "KeyframeSink":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class TarShardSink(KeyframeSink):
+    """
+        Encoded keyframes in WebDataset-style tar shards, `keyframes-<session>-<shard:06d>.tar`
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        image_format: str = 'jpg',
+        quality: int = 95,
+        shard_max_count: int = 10000,
+        shard_max_bytes: int = 1 << 30
+    ):
+        """Initialize the sink
+
+        Args:
+            output_dir (str): Directory of the shards and of the index
+            image_format (str, optional): 'jpg', 'webp' or 'png'. Defaults to 'jpg'.
+            quality (int, optional): JPEG/WebP quality. Defaults to 95.
+            shard_max_count (int, optional): Keyframes per shard. Defaults to 10000.
+            shard_max_bytes (int, optional): Size a shard is closed at. Defaults to 1GB.
+        """
+        super().__init__(output_dir, shard_max_count)
+        # same encoder settings as the one-file-per-keyframe output
+        encoder = KeyframeWriter(image_format=image_format, quality=quality)
+        self.extension = encoder.extension
+        self.params = encoder.params
+        self.shard_max_bytes = shard_max_bytes
+        self._file = None
+        self._tar: Optional[tarfile.TarFile] = None
+
+    def shard_path(self, shard: int) -> str:
+        return os.path.join(self.output_dir, f"keyframes-{self.session}-{shard:06d}.tar")
+
+    def _open_shard(self) -> None:
+        self._close_shard()
+        self._shard += 1
+        self._shard_count = 0
+        self._file = open(self.shard_path(self._shard), "wb", buffering=_BUFFER_BYTES)
+        self._tar = tarfile.open(fileobj=self._file, mode="w", format=tarfile.PAX_FORMAT)
+
+    def write(self, video: str, frame_idx: int, frame: np.ndarray) -> int:
+        try:
+            ok, encoded = cv2.imencode(f".{self.extension}", frame, self.params)
+        except cv2.error:
+            return 0
+        if not ok:
+            return 0
+        data = encoded.tobytes()
+        info = tarfile.TarInfo(f"{keyframe_key(video, frame_idx)}.{self.extension}")
+        info.size = len(data)
+        info.mtime = int(time.time())
+        with self._lock:
+            if self._tar is None or self._shard_count >= self.shard_max_count \
+                    or self._tar.offset >= self.shard_max_bytes:
+                self._open_shard()
+            self._tar.addfile(info, io.BytesIO(data))
+            # the member data ends the archive so far, padded to the 512-byte tar blocks
+            offset = self._tar.offset - -(-len(data) // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+            self._pending_index.append({"key": keyframe_key(video, frame_idx), "shard": os.path.basename(
+                self.shard_path(self._shard)), "offset": offset, "size": len(data)})
+            self._shard_count += 1
+            self.keyframes_written += 1
+        return len(data)
+
+    def _flush_shard(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+
+    def _close_shard(self) -> None:
+        if self._tar is not None:
+            self._tar.close()
+            self._file.close()
+            self._tar, self._file = None, None
+
+
+def _npy_header(count: int, height: int, width: int) -> bytes:
+    header = repr({"descr": "|u1", "fortran_order": False, "shape": (count, height, width, 3)})
+    header = header.ljust(_NPY_HEADER_BYTES - 10 - 1) + "\n"
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1")
+
+
+class ArrayStoreSink(KeyframeSink):
+    """
+        Keyframes resized to a fixed size, rows of `frames-<session>-<shard:06d>.npy` arrays, (frames, height, width, 3)
+        uint8 BGR. The frame count in the .npy header is updated on every flush.
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        size: Tuple[int, int] = (224, 224),
+        shard_max_count: int = 10000,
+        interpolation: int = cv2.INTER_AREA
+    ):
+        """Initialize the sink
+
+        Args:
+            output_dir (str): Directory of the shards and of the index
+            size (Tuple[int, int], optional): (width, height) the keyframes are resized to. Defaults to (224, 224).
+            shard_max_count (int, optional): Keyframes per shard. Defaults to 10000.
+            interpolation (int, optional): OpenCV interpolation of the resize. Defaults to cv2.INTER_AREA.
+        """
+        super().__init__(output_dir, shard_max_count)
+        self.size = size
+        self.interpolation = interpolation
+        self._file = None
+
+    def shard_path(self, shard: int) -> str:
+        return os.path.join(self.output_dir, f"frames-{self.session}-{shard:06d}.npy")
+
+    def _open_shard(self) -> None:
+        self._close_shard()
+        self._shard += 1
+        self._shard_count = 0
+        self._file = open(self.shard_path(self._shard), "wb", buffering=_BUFFER_BYTES)
+        self._file.write(_npy_header(0, self.size[1], self.size[0]))
+
+    def write(self, video: str, frame_idx: int, frame: np.ndarray) -> int:
+        if frame is None or frame.ndim != 3 or frame.shape[2] != 3:
+            return 0
+        width, height = self.size
+        if frame.shape[1] != width or frame.shape[0] != height:
+            frame = cv2.resize(frame, (width, height), interpolation=self.interpolation)
+        with self._lock:
+            if self._file is None or self._shard_count >= self.shard_max_count:
+                self._open_shard()
+            data = np.ascontiguousarray(frame, dtype=np.uint8).tobytes()
+            self._file.write(data)
+            self._pending_index.append({"key": keyframe_key(video, frame_idx), "shard": os.path.basename(
+                self.shard_path(self._shard)), "row": self._shard_count})
+            self._shard_count += 1
+            self.keyframes_written += 1
+        return len(data)
+
+    def _flush_shard(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+            end = self._file.tell()
+            self._file.seek(0)
+            self._file.write(_npy_header(self._shard_count, self.size[1], self.size[0]))
+            self._file.seek(end)
+            self._file.flush()
+
+    def _close_shard(self) -> None:
+        if self._file is not None:
+            self._flush_shard()
+            self._file.close()
+            self._file = None
+
+
+class KeyframeStoreReader(ABC):
+    """
+        Random access to the keyframes of a store directory, by (video, frame_idx) or key
+    """
+
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        self._index: Dict[str, Dict] = {}
+        for index_path in sorted(glob(os.path.join(store_dir, "index-*.jsonl"))):
+            with open(index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        entry = json.loads(line)
+                        self._index[entry["key"]] = entry
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key) -> bool:
+        return self._key(key) in self._index
+
+    def keys(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def videos(self) -> List[str]:
+        return sorted({key.rsplit("/", 1)[0] for key in self._index})
+
+    @staticmethod
+    def _key(key) -> str:
+        return keyframe_key(*key) if isinstance(key, tuple) else key
+
+    def _entry(self, key) -> Dict:
+        try:
+            return self._index[self._key(key)]
+        except KeyError:
+            raise KeyError(f"No keyframe {self._key(key)} in {self.store_dir}")
+
+    def get(self, video: str, frame_idx: int) -> np.ndarray:
+        """The BGR keyframe of a video"""
+        return self[(video, frame_idx)]
+
+    @abstractmethod
+    def __getitem__(self, key) -> np.ndarray:
+        """The BGR keyframe of a key, or of a (video, frame_idx) tuple"""
+
+
+class TarShardReader(KeyframeStoreReader):
+    """
+        Reader of `TarShardSink` shards: every keyframe is read with a single seek into its shard
+    """
+
+    def read_bytes(self, video: str, frame_idx: int) -> bytes:
+        """The encoded image of a keyframe"""
+        return self._read(self._entry((video, frame_idx)))
+
+    def _read(self, entry: Dict) -> bytes:
+        with open(os.path.join(self.store_dir, entry["shard"]), "rb") as f:
+            f.seek(entry["offset"])
+            return f.read(entry["size"])
+
+    def __getitem__(self, key) -> np.ndarray:
+        data = np.frombuffer(self._read(self._entry(key)), dtype=np.uint8)
+        return cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+
+class ArrayStoreReader(KeyframeStoreReader):
+    """
+        Reader of `ArrayStoreSink` shards, memory-mapped: `get` returns a read-only view into the shard
+    """
+
+    def __init__(self, store_dir: str):
+        super().__init__(store_dir)
+        self._shards: Dict[str, np.ndarray] = {}
+
+    def shard(self, name: str) -> np.ndarray:
+        array = self._shards.get(name)
+        if array is None:
+            array = self._shards[name] = np.load(os.path.join(self.store_dir, name), mmap_mode="r")
+        return array
+
+    def __getitem__(self, key) -> np.ndarray:
+        entry = self._entry(key)
+        return self.shard(entry["shard"])[entry["row"]]
+
+
+def open_keyframe_store(store_dir: str) -> KeyframeStoreReader:
+    """Open a directory written by `TarShardSink` or `ArrayStoreSink`"""
+    if glob(os.path.join(store_dir, "keyframes-*.tar")):
+        return TarShardReader(store_dir)
+    if glob(os.path.join(store_dir, "frames-*.npy")):
+        return ArrayStoreReader(store_dir)
+    raise ValueError(f"No keyframe store in {store_dir}")
@@ -0,0 +1,154 @@
+import os
+import threading
+import cv2
+import numpy as np
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Set
+from .profiling import NULL_PROFILER, NullProfiler
+
+
+class KeyframeWriter:
+    """
+        Encodes and writes keyframes, either on the calling thread (num_workers=0) or on a thread pool fed
+        through a bounded number of in-flight frames, so encoding and disk writes overlap with decoding
+    """
+
+    FORMATS = {
+        'jpg': cv2.IMWRITE_JPEG_QUALITY,
+        'webp': cv2.IMWRITE_WEBP_QUALITY,
+        'png': cv2.IMWRITE_PNG_COMPRESSION,
+    }
+
+    def __init__(
+        self,
+        image_format: str = 'jpg',
+        quality: int = 95,
+        png_compression: int = 3,
+        num_workers: int = 0,
+        max_pending: int = 64,
+        profiler: Optional[NullProfiler] = None
+    ):
+        """Initialize the writer
+
+        Args:
+            image_format (str, optional): 'jpg', 'webp' or 'png'. Defaults to 'jpg'.
+            quality (int, optional): JPEG/WebP quality, 0-100. Defaults to 95.
+            png_compression (int, optional): PNG compression level, 0-9. Defaults to 3.
+            num_workers (int, optional): Encoder threads, 0 writes synchronously. Defaults to 0.
+            max_pending (int, optional): Frames queued or being written before `write` blocks. Defaults to 64.
+            profiler (Optional[NullProfiler], optional): Profiler counting the bytes written per video. Defaults to None.
+        """
+        image_format = image_format.lower().lstrip('.')
+        if image_format == 'jpeg':
+            image_format = 'jpg'
+        if image_format not in self.FORMATS:
+            raise ValueError(f"Unsupported keyframe format: {image_format}, expected one of {list(self.FORMATS)}")
+
+        self.extension = image_format
+        level = png_compression if image_format == 'png' else quality
+        self.params = [self.FORMATS[image_format], int(level)]
+        self._created_dirs: Set[str] = set()
+        # pending writes and failures per group, e.g. per video, so every video flushes only its own writes
+        self._failures: Dict[Optional[str], List[str]] = {}
+        self._lock = threading.Lock()
+        self._futures: Dict[Optional[str], List[Future]] = {}
+        self.num_workers = num_workers
+        # started on the first asynchronous write, and again after `close`
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(max_pending) if num_workers > 0 else None
+        self.profiler = profiler or NULL_PROFILER
+
+    def prepare_dir(self, directory: str) -> None:
+        """Create an output directory, once"""
+        if directory not in self._created_dirs:
+            os.makedirs(directory, exist_ok=True)
+            self._created_dirs.add(directory)
+
+    def _write(self, frame: np.ndarray, filename: str, video: Optional[str] = None) -> bool:
+        try:
+            ok = cv2.imwrite(filename, frame, self.params)
+        except cv2.error:
+            return False
+        if ok and self.profiler.enabled:
+            self.profiler.count("bytes_written", os.path.getsize(filename), video=video)
+        return ok
+
+    def _write_and_release(self, frame: np.ndarray, filename: str, video: Optional[str] = None,
+                           group: Optional[str] = None) -> bool:
+        try:
+            ok = self._write(frame, filename, video)
+            if not ok:
+                with self._lock:
+                    self._failures.setdefault(group, []).append(filename)
+            return ok
+        finally:
+            self._slots.release()
+
+    def write(self, frame: np.ndarray, filename: str, group: Optional[str] = None) -> bool:
+        """Write a BGR frame. In asynchronous mode this only blocks while `max_pending` frames are in flight,
+        and returns True: failures are reported by `flush`
+
+        Args:
+            frame (np.ndarray): BGR frame
+            filename (str): Image file to write
+            group (Optional[str], optional): Group of the write, e.g. its video, flushed by `flush(group)`.
+            Defaults to None.
+        """
+        if self.num_workers == 0:
+            return self._write(frame, filename)
+        self._slots.acquire()
+        try:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.num_workers,
+                                                        thread_name_prefix="keyframe-writer")
+                executor = self._executor
+            # the bytes are counted for the video of the calling thread, not of the writer thread
+            future = executor.submit(self._write_and_release, frame, filename, self.profiler.current_video(),
+                                           group)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            futures = [f for f in self._futures.get(group, []) if not f.done()]
+            futures.append(future)
+            self._futures[group] = futures
+        return True
+
+    def flush(self, group: Optional[str] = None) -> List[str]:
+        """Wait for the pending writes of a group, or for every pending write
+
+        Args:
+            group (Optional[str], optional): Group to flush, None flushes all the groups. Defaults to None.
+
+        Returns:
+            List[str]: Files written asynchronously that failed since the previous flush of the group
+        """
+        with self._lock:
+            groups = list(self._futures) if group is None else [group]
+            futures = [future for g in groups for future in self._futures.pop(g, [])]
+        for future in futures:
+            future.result()
+        with self._lock:
+            groups = list(self._failures) if group is None else [group]
+            return [filename for g in groups for filename in self._failures.pop(g, [])]
+
+    def close(self) -> List[str]:
+        """Wait for every pending write and stop the writer threads. The writer can still be used afterwards,
+        it starts new threads on the next write
+
+        Returns:
+            List[str]: Files written asynchronously that failed since the previous flush
+        """
+        failures = self.flush()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        return failures
+
+    def __enter__(self) -> "KeyframeWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -1,9 +1,16 @@
-from .supernet import TransNetV2Supernet
 import os
 import torch
 import numpy as np
-from typing import List, Optional
-from .utils import get_batches, get_frames
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from .cascade import window_change_score
+from .prediction_cache import PredictionCache
+from .profiling import NULL_PROFILER, NullProfiler
+from .quantization import PRECISIONS, precision_context, quantize_model
+from .weights import build_model
+from .utils import (DecodeOptions, FrameStream, compute_color_histograms, get_batches, get_frames,
+                    get_segment_batches, video_frame_info)
 from tqdm import tqdm
 
 
@@ -12,10 +19,30 @@ class AutoShot:
         A class for automatic shot detection in video using TransNetV2Supernet model
     """
 
+    BACKENDS = ("eager", "torchscript", "onnx")
+    # largest per-frame difference from the 100-frame window predictions accepted by `check_window_size`
+    WINDOW_DRIFT_TOLERANCE = 0.01
+
     def __init__(
         self,
         pretrained_path: str,
-        device: Optional[str] = None
+        device: Optional[str] = None,
+        streaming: bool = False,
+        chunk_size: int = 500,
+        batch_size: int = 1,
+        window_size: int = 100,
+        precompute_histograms: bool = False,
+        cache_dir: Optional[str] = None,
+        cache_max_bytes: Optional[int] = 1 << 30,
+        similarity_kernel: str = "gather",
+        backend: str = "eager",
+        precision: str = "fp32",
+        decode_options: Optional[DecodeOptions] = None,
+        chunk_workers: int = 1,
+        profiler: Optional[NullProfiler] = None,
+        cascade_threshold: Optional[float] = None,
+        window_check_video: Optional[str] = None,
+        unsafe_window_size: bool = False
     ):
         """Initialize the Autoshot class
 
@@ -23,9 +50,90 @@ class AutoShot:
             pretrained_path (str): Path to the pretrained model
             keyframe_output_dir (str): Directory to save the keyframes
             device (Optional[str], optional): Device to run the model 'cpu' or 'cuda'. Defaults to None.
+            streaming (bool, optional): Decode the video through a persistent ffmpeg pipe and run inference on
+            windows as they are decoded, so memory stays bounded on long videos. Defaults to False.
+            chunk_size (int, optional): Number of frames read from the ffmpeg pipe at a time in streaming mode. Defaults to 500.
+            batch_size (int, optional): Number of windows stacked into a single forward pass. Defaults to 1.
+            window_size (int, optional): Frames per inference window, a multiple of 50. Consecutive windows
+            overlap by 50 frames and keep their central `window_size - 50` predictions. Only 100 reproduces the
+            predictions of the windows the model was trained on, any other size needs `window_check_video` or
+            `unsafe_window_size`, see benchmarks/bench_window_size.py. Defaults to 100.
+            precompute_histograms (bool, optional): Compute the 512-bin color histograms of every frame once with
+            NumPy and feed them to the model, instead of recomputing them on device for every overlapping window.
+            Whole videos, pooled batches and streamed or fused decoding all do. Defaults to False.
+            cache_dir (Optional[str], optional): Directory of the on-disk cache of per-frame predictions,
+            None disables caching. Defaults to None.
+            cache_max_bytes (Optional[int], optional): Size budget of the prediction cache. Defaults to 1GB.
+            similarity_kernel (str, optional): How the frame similarity and color histogram layers compute
+            their 101-frame similarity band: 'gather' from the full similarity matrix, or 'banded' from an
+            unfold view of the padded features, which scales linearly with the window size. Both give the
+            same predictions up to float rounding. Defaults to "gather".
+            backend (str, optional): 'eager' loads a training checkpoint into TransNetV2Supernet. 'torchscript'
+            and 'onnx' load an artifact exported with `python -m AutoShot.export` (batch norm folded, dead heads
+            stripped), the latter through onnxruntime. Defaults to "eager".
+            precision (str, optional): 'fp32', 'int8' (dynamic int8 Linear layers, CPU only), 'bf16' (bfloat16
+            autocast, worth it on CPUs with native bf16) or 'int8_bf16'. Pick the threshold and check the accuracy
+            against fp32 with `python -m AutoShot.quantization`. Eager backend only. Defaults to "fp32".
+            decode_options (Optional[DecodeOptions], optional): ffmpeg threads, hardware decoding, scaler and
+            time range of the 48x27 decode, see benchmarks/bench_decode.py. Defaults to None.
+            chunk_workers (int, optional): Split each video into this many frame ranges, decoded and run through
+            the model in parallel threads, see `detect_shots_chunked`. 1 processes videos serially. Defaults to 1.
+            profiler (Optional[NullProfiler], optional): `AutoShot.profiling.Profiler` timing the decoding, the
+            inference and, with its layer_hooks, every layer of the eager model. Defaults to None.
+            cascade_threshold (Optional[float], optional): Skip the windows whose color histogram change score,
+            see `AutoShot.cascade`, stays below this threshold: they predict 0 without running the model. Pick it
+            with `python -m AutoShot.cascade`. None runs every window. Defaults to None.
+            window_check_video (Optional[str], optional): Sample video a window_size other than 100 is checked
+            on with `check_window_size` before the detector is used. Defaults to None.
+            unsafe_window_size (bool, optional): Accept a window_size other than 100 without checking it.
+            Defaults to False.
+
+        Raises:
+            ValueError: An invalid option, or a window_size other than 100 that is unchecked or fails its check
         """
         self.device = device or ('cuda' if torch.cuda.is_available() else 'cpu')
-        self.model = self._load_model(pretrained_path=pretrained_path)
+        self.streaming = streaming
+        self.chunk_size = chunk_size
+        self.batch_size = max(1, batch_size)
+        if window_size < 100 or window_size % 50 != 0:
+            raise ValueError(f"window_size must be a multiple of 50 and at least 100, got {window_size}")
+        if window_size != 100 and window_check_video is None and not unsafe_window_size:
+            raise ValueError(f"window_size={window_size} changes the predictions of the 100-frame windows, check it "
+                             f"on a sample video with window_check_video, or pass unsafe_window_size=True")
+        self.window_size = window_size
+        self.window_stride = window_size - 50
+        self.precompute_histograms = precompute_histograms
+        if similarity_kernel not in ("gather", "banded"):
+            raise ValueError(f"similarity_kernel must be 'gather' or 'banded', got {similarity_kernel}")
+        self.similarity_kernel = similarity_kernel
+        if backend not in self.BACKENDS:
+            raise ValueError(f"backend must be one of {self.BACKENDS}, got {backend}")
+        if backend != "eager" and precompute_histograms:
+            raise ValueError("Exported models compute their own color histograms, precompute_histograms needs the eager backend")
+        self.backend = backend
+        if precision not in PRECISIONS:
+            raise ValueError(f"precision must be one of {PRECISIONS}, got {precision}")
+        if precision != "fp32" and backend != "eager":
+            raise ValueError("Reduced precisions need the eager backend")
+        if precision.startswith("int8") and self.device != "cpu":
+            raise ValueError("Dynamic int8 quantization only runs on CPU")
+        self.precision = precision
+        self.decode_options = decode_options or DecodeOptions()
+        self.chunk_workers = max(1, chunk_workers)
+        self.cascade_threshold = cascade_threshold
+        self.pretrained_path = pretrained_path
+        self.model = quantize_model(self._load_model(pretrained_path=pretrained_path), precision) \
+            if backend == "eager" else self._load_exported_model(pretrained_path=pretrained_path)
+        self.prediction_cache = PredictionCache(cache_dir, max_bytes=cache_max_bytes) if cache_dir else None
+        self._weights_checksum = None
+        self.profiler = profiler or NULL_PROFILER
+        if self.profiler.layer_hooks:
+            if backend == "eager":
+                self.profiler.attach_model_hooks(self.model)
+            else:
+                print(f"Per-layer profiling needs the eager backend, timing the {backend} model as a whole")
+        if window_size != 100 and not unsafe_window_size:
+            self.check_window_size(self.decode_frames(window_check_video))
     
     def _load_model(self, pretrained_path: str) -> torch.nn.Module:
         """Loading the pretrained model
@@ -41,18 +149,41 @@ class AutoShot:
             torch.nn.Module : loaded and configured model
         """
         try:
-            model =  TransNetV2Supernet().eval()
             if not os.path.exists(pretrained_path):
                 raise FileNotFoundError(f"Can't find the pretrained model path at {pretrained_path}")
-            
+
             print(f"Loading the pretrained model from {pretrained_path}")
-            model_dict = model.state_dict()
-            pretrained_dict = torch.load(pretrained_path, map_location=self.device, weights_only=True)
-            pretrained_dict = {k: v for k, v in pretrained_dict['net'].items() if k in model_dict}
-            print(f"Current model has {len(model_dict)} params, Updating {len(pretrained_dict)} params")
-            model_dict.update(pretrained_dict)
-            model.load_state_dict(model_dict)
-            return model.to(self.device)
+            return build_model(pretrained_path, device=self.device, similarity_kernel=self.similarity_kernel)
+        except Exception as e:
+            raise RuntimeError(f"Failed to load the model. Did you piss off the AI gods? Error: {str(e)}")
+
+    def _load_exported_model(self, pretrained_path: str):
+        """Loading a TorchScript or ONNX model exported by `AutoShot.export`
+
+        Args:
+            pretrained_path (str): Path to the exported model
+
+        Raises:
+            RuntimeError: If loading model process is not successful
+
+        Returns:
+            torch.jit.ScriptModule or onnxruntime.InferenceSession: loaded model
+        """
+        try:
+            if not os.path.exists(pretrained_path):
+                raise FileNotFoundError(f"Can't find the exported model at {pretrained_path}")
+
+            print(f"Loading the {self.backend} model from {pretrained_path}")
+            if self.backend == "torchscript":
+                return torch.jit.load(pretrained_path, map_location=self.device).eval()
+
+            try:
+                import onnxruntime
+            except ImportError:
+                raise ImportError("The onnx backend needs the onnxruntime package: pip install onnxruntime")
+            providers = ["CUDAExecutionProvider", "CPUExecutionProvider"] if self.device == "cuda" \
+                else ["CPUExecutionProvider"]
+            return onnxruntime.InferenceSession(pretrained_path, providers=providers)
         except Exception as e:
             raise RuntimeError(f"Failed to load the model. Did you piss off the AI gods? Error: {str(e)}")
         
@@ -60,24 +191,165 @@ class AutoShot:
     
             
     def predict(self, batch: np.ndarray) -> np.ndarray:
-        """Make predictions on the batch of frames
+        """Make predictions on a single window of frames
+
+        Args:
+            batch (np.ndarray): Window of video frames, in the shape of (frames, height, width, color_channel)
+            typically: (frames = 100, 27, 48, channels=3)
+
+        Returns:
+            np.ndarray: Predictions of the window, (frames, 1)
+        """
+        return self.predict_batch(batches=batch[np.newaxis, ...])[0]
+
+    def predict_batch(self, batches: np.ndarray, histograms: Optional[np.ndarray] = None) -> np.ndarray:
+        """Make predictions on several windows of frames in a single forward pass
 
         Args:
-            batch (np.ndarray): Batch of video frames, in the shape of (height, width, color_channel, frames)
-            typically: (27, 48, channels=3, frames = 100)
+            batches (np.ndarray): Stacked windows of video frames, in the shape of (windows, frames, height, width, color_channel)
+            typically: (N, frames = 100, 27, 48, channels=3)
+            histograms (Optional[np.ndarray], optional): Precomputed color histograms of the windows, (N, frames, 512).
+            Computed by the model when None. Defaults to None.
 
         Returns:
-            np.ndarray: Predictions of the batch
+            np.ndarray: Predictions of every window, (N, frames, 1)
         """
+        with self.profiler.stage("inference"):
+            return self._predict_batch(batches, histograms)
+
+    def _predict_batch(self, batches: np.ndarray, histograms: Optional[np.ndarray] = None) -> np.ndarray:
+        if self.backend == "onnx":
+            one_hot = self.model.run(None, {"frames": np.ascontiguousarray(batches)})[0]
+            return torch.sigmoid(torch.from_numpy(one_hot)).numpy()
+
         with torch.no_grad():
-            batch = torch.from_numpy(batch.transpose((3, 0, 1, 2))[np.newaxis, ...]) * 1.0
-            batch = batch.to(self.device)
-            one_hot = self.model(batch)
+            if self.backend == "torchscript":
+                # exported models take the raw uint8 windows
+                one_hot = self.model(torch.from_numpy(np.ascontiguousarray(batches)).to(self.device))
+                return torch.sigmoid(one_hot).cpu().numpy()
+
+            # the uint8 frames go to the model as they are, its first layer divides them by 255
+            batch = torch.from_numpy(batches).to(self.device).permute(0, 4, 1, 2, 3).contiguous()
+            color_histograms = torch.from_numpy(histograms).to(self.device) if histograms is not None else None
+            with precision_context(self.precision, self.device):
+                one_hot = self.model(batch, color_histograms=color_histograms)
 
             if isinstance(one_hot, tuple):
                 one_hot = one_hot[0]
-            return torch.sigmoid(one_hot[0]).cpu().numpy()
+            return torch.sigmoid(one_hot.float()).cpu().numpy()
     
+    def predict_kept(self, windows: List[np.ndarray], histograms: Optional[List[np.ndarray]] = None) -> np.ndarray:
+        """Predict a batch of consecutive overlapping windows and keep the central predictions of each
+
+        Args:
+            windows (List[np.ndarray]): Windows as yielded by `get_batches` or `FrameStream`
+            histograms (Optional[List[np.ndarray]], optional): Precomputed color histograms of the windows. Defaults to None.
+
+        Returns:
+            np.ndarray: Kept predictions of the windows, one after the other, (len(windows) * window_stride, 1)
+        """
+        predictions = self.predict_batch(
+            batches=np.stack(windows),
+            histograms=np.stack(histograms) if histograms is not None else None
+        )[:, 25:self.window_size - 25]
+        return predictions.reshape(-1, predictions.shape[-1])
+
+    def skips_window(self, window: np.ndarray, histogram_window: Optional[np.ndarray] = None) -> bool:
+        """Whether the cascade pre-filter skips a window: its kept predictions are 0, without running the model
+
+        Args:
+            window (np.ndarray): Window of frames, (window_size, height, width, 3)
+            histogram_window (Optional[np.ndarray], optional): Precomputed color histograms of the window. Defaults to None.
+        """
+        if self.cascade_threshold is None:
+            return False
+        self.profiler.count("cascade.windows")
+        with self.profiler.stage("cascade"):
+            score = window_change_score(window, histogram_window)
+        if score < self.cascade_threshold:
+            self.profiler.count("cascade.skipped_windows")
+            return True
+        return False
+
+    def iter_predictions(
+        self,
+        windows: Iterable[np.ndarray],
+        histogram_windows: Optional[Iterable[np.ndarray]] = None
+    ) -> Iterator[np.ndarray]:
+        """Run the model over overlapping windows, `batch_size` at a time, skipping the windows the cascade
+        pre-filter rules out, and yield the kept predictions in window order as soon as they are known
+
+        Args:
+            windows (Iterable[np.ndarray]): Windows as yielded by `get_batches` or `FrameStream`
+            histogram_windows (Optional[Iterable[np.ndarray]], optional): Matching windows of precomputed
+            color histograms. With precompute_histograms, computed from the windows when None. Defaults to None.
+
+        Yields:
+            np.ndarray: Kept predictions of one or more consecutive windows, still including the end padding
+        """
+        # one entry per window not yielded yet, None until its batch has run
+        predictions: List[Optional[np.ndarray]] = []
+        pending, pending_histograms, pending_slots = [], [], []
+        histogram_windows = iter(histogram_windows) if histogram_windows is not None else None
+
+        def run_pending() -> None:
+            kept = self.predict_kept(pending, pending_histograms or None)
+            for i, slot in enumerate(pending_slots):
+                predictions[slot] = kept[i * self.window_stride:(i + 1) * self.window_stride]
+            pending.clear()
+            pending_histograms.clear()
+            pending_slots.clear()
+
+        def ready() -> Optional[np.ndarray]:
+            # the windows before the first one still waiting for its batch
+            count = next((i for i, prediction in enumerate(predictions) if prediction is None), len(predictions))
+            if count == 0:
+                return None
+            done = np.concatenate(predictions[:count], axis=0)
+            del predictions[:count]
+            return done
+
+        histogram_window = None
+        for window in tqdm(windows, desc="Dectecting shots", unit="batch"):
+            if histogram_windows is not None:
+                histogram_window = next(histogram_windows)
+            elif self.precompute_histograms:
+                # streamed windows: consecutive windows share 50 frames, only the new frames are histogrammed
+                with self.profiler.stage("histograms"):
+                    histogram_window = compute_color_histograms(window) if histogram_window is None else \
+                        np.concatenate([histogram_window[-50:], compute_color_histograms(window[50:])])
+            if self.skips_window(window, histogram_window):
+                predictions.append(np.zeros((self.window_stride, 1), dtype=np.float32))
+            else:
+                pending_slots.append(len(predictions))
+                predictions.append(None)
+                pending.append(window)
+                if histogram_window is not None:
+                    pending_histograms.append(histogram_window)
+                if len(pending) == self.batch_size:
+                    run_pending()
+            if not pending and (done := ready()) is not None:
+                yield done
+        if pending:
+            run_pending()
+        if (done := ready()) is not None:
+            yield done
+
+    def _predict_windows(
+        self,
+        windows: Iterable[np.ndarray],
+        histogram_windows: Optional[Iterable[np.ndarray]] = None
+    ) -> np.ndarray:
+        """Run the model over overlapping windows and keep the central predictions of each, see `iter_predictions`
+
+        Returns:
+            np.ndarray: concatenated predictions, still including the end padding
+        """
+        predictions = list(self.iter_predictions(windows, histogram_windows))
+        if not predictions:
+            return np.empty((0, 1), dtype=np.float32)
+        return np.concatenate(predictions, axis=0)
+
     def detect_shots(self, frames: np.ndarray) -> np.ndarray:
         """Detects shot in a video
 
@@ -87,14 +359,126 @@ class AutoShot:
         Returns:
             np.ndarray: shot detection predictions for each frame
         """
-        predictions= []
-        for batch in tqdm(get_batches(frames=frames), desc="Dectecting shots", unit="batch"):
-            prediction = self.predict(batch=batch)
-            predictions.append(prediction[25:75])
-        
-        return np.concatenate(predictions, axis=0)[:len(frames)]
+        histogram_windows = None
+        if self.precompute_histograms:
+            with self.profiler.stage("histograms"):
+                histograms = compute_color_histograms(frames)
+            histogram_windows = get_batches(frames=histograms, window_size=self.window_size)
+        windows = get_batches(frames=frames, window_size=self.window_size)
+        return self._predict_windows(windows, histogram_windows)[:len(frames)]
+
+    def detect_shots_streaming(self, video_path: str) -> np.ndarray:
+        """Detects shot in a video while it is being decoded, holding only about one window of frames in memory
+
+        Args:
+            video_path (str): Path to the video file
+
+        Raises:
+            ValueError: No frames could be decoded from the video
+
+        Returns:
+            np.ndarray: shot detection predictions for each frame
+        """
+        stream = FrameStream(video_file_path=video_path, chunk_size=self.chunk_size, window_size=self.window_size,
+                             decode_options=self.decode_options)
+        predictions = self._predict_windows(self.profiler.iterate("decode", stream))
+        if stream.num_frames == 0:
+            raise ValueError(f"No frames extracted from video: {video_path}")
+        return predictions[:stream.num_frames]
     
-    @staticmethod 
+    def detect_shots_chunked(self, video_path: str, num_chunks: Optional[int] = None) -> np.ndarray:
+        """Detects shot in a video split into frame ranges, each decoded and run through the model in its own thread
+
+        The ranges are cut at multiples of the window stride, and each one is decoded with the 25 frames of
+        context its windows overlap by, seeking with `-ss`. The stitched predictions are the predictions of
+        `detect_shots` on the whole video, as long as seeking is frame-accurate (constant frame rate videos).
+
+        Args:
+            video_path (str): Path to the video file
+            num_chunks (Optional[int], optional): Number of frame ranges, also the number of threads.
+            Defaults to chunk_workers.
+
+        Raises:
+            ValueError: No frames could be decoded from the video
+
+        Returns:
+            np.ndarray: shot detection predictions for each frame
+        """
+        num_chunks = num_chunks or self.chunk_workers
+        if self.decode_options.start_time is not None or self.decode_options.duration is not None \
+                or self.decode_options.max_frames is not None:
+            raise ValueError("Chunked detection can't be combined with a decoding time range")
+
+        fps, frame_count = video_frame_info(video_path)
+        stride = self.window_stride
+        windows_per_chunk = -(-frame_count // (stride * num_chunks))
+        if fps <= 0 or windows_per_chunk == 0 or num_chunks == 1:
+            with self.profiler.stage("decode"):
+                frames = get_frames(video_file_path=video_path, decode_options=self.decode_options)
+            if len(frames) == 0:
+                raise ValueError(f"No frames extracted from video: {video_path}")
+            return self.detect_shots(frames)
+
+        video = self.profiler.current_video() or video_path
+
+        def detect_range(chunk: int) -> np.ndarray:
+            kept_start = chunk * windows_per_chunk * stride
+            kept_end = kept_start + windows_per_chunk * stride
+            last = chunk == num_chunks - 1
+            # the windows of the range read 25 frames of context on each side
+            first_frame = max(0, kept_start - 25)
+            options = replace(
+                self.decode_options,
+                # half a frame early, so rounding of the timestamps never skips the first wanted frame
+                start_time=(first_frame - 0.5) / fps if first_frame > 0 else None,
+                max_frames=None if last else kept_end + 25 - first_frame
+            )
+            with self.profiler.stage("decode"):
+                frames = get_frames(video_file_path=video_path, decode_options=options)
+            context = kept_start - first_frame
+            if len(frames) <= context:
+                return np.empty((0, 1), dtype=np.float32)
+
+            at_end = last or len(frames) < kept_end + 25 - first_frame
+
+            def batches(features: np.ndarray) -> Iterable[np.ndarray]:
+                return get_segment_batches(features, self.window_size, pad_start=first_frame == 0, pad_end=at_end)
+
+            histogram_windows = None
+            if self.precompute_histograms:
+                with self.profiler.stage("histograms"):
+                    histogram_windows = batches(compute_color_histograms(frames))
+            predictions = self._predict_windows(batches(frames), histogram_windows)
+            kept = len(frames) - context
+            return predictions[:kept if last else min(kept, kept_end - kept_start)]
+
+        def profiled_range(chunk: int) -> np.ndarray:
+            # the chunk threads time their stages for the video of the calling thread
+            with self.profiler.video(video):
+                return detect_range(chunk)
+
+        with ThreadPoolExecutor(max_workers=num_chunks, thread_name_prefix="autoshot-chunk") as executor:
+            predictions = list(executor.map(profiled_range, range(num_chunks)))
+        predictions = np.concatenate(predictions, axis=0)
+        if len(predictions) == 0:
+            raise ValueError(f"No frames extracted from video: {video_path}")
+        return predictions
+
+    @staticmethod
+    def _edges_to_scenes(num_frames: int, rises: np.ndarray, falls: np.ndarray, ends_in_scene: bool) -> np.ndarray:
+        """Build the scenes of a binarized prediction array from its 0->1 (rises) and 1->0 (falls) edge indices"""
+        # a scene starts at the last fall before it, or at frame 0
+        starts = np.concatenate([[0], falls])[np.searchsorted(falls, rises)]
+        scenes = np.stack([starts, rises], axis=1)
+        if ends_in_scene:
+            scenes = np.concatenate([scenes, [[falls[-1] if len(falls) else 0, num_frames - 1]]], axis=0)
+
+        # just fix if all predictions are 1
+        if len(scenes) == 0:
+            return np.array([[0, num_frames - 1]], dtype=np.int32)
+        return scenes.astype(np.int32)
+
+    @staticmethod
     def predictions_to_scenes(predictions: np.ndarray, threshold: float = 0.5) -> np.ndarray:
         """
         Convert frame-wise predictions to scene boundaries.
@@ -106,37 +490,184 @@ class AutoShot:
         Returns:
             np.ndarray: List of scene start and end frame indices
         """
-        predictions = (predictions > threshold).astype(np.uint8)
+        binary = (np.asarray(predictions).reshape(-1) > threshold).astype(np.int8)
+        edges = np.diff(binary)
+        return AutoShot._edges_to_scenes(
+            num_frames=len(binary),
+            rises=np.flatnonzero(edges == 1) + 1,
+            falls=np.flatnonzero(edges == -1) + 1,
+            ends_in_scene=len(binary) > 0 and binary[-1] == 0
+        )
+
+    @staticmethod
+    def predictions_to_scenes_sweep(predictions: np.ndarray, thresholds: np.ndarray) -> List[np.ndarray]:
+        """
+        Convert frame-wise predictions to scene boundaries for several thresholds at once,
+        with a single vectorized pass over the predictions.
+
+        Args:
+            predictions (np.ndarray): Array of frame-wise predictions
+            thresholds (np.ndarray): Thresholds to evaluate
+
+        Returns:
+            List[np.ndarray]: Scenes for every threshold, each equal to `predictions_to_scenes(predictions, threshold)`
+        """
+        predictions = np.asarray(predictions).reshape(-1)
+        thresholds = np.asarray(thresholds, dtype=np.float64).reshape(-1)
+        if len(thresholds) == 0:
+            return []
+
+        # there is an edge between frames i-1 and i exactly for the thresholds in [min, max) of the two
+        # predictions: a rise if the prediction goes up, a fall otherwise
+        previous, current = predictions[:-1], predictions[1:]
+        low, high = np.minimum(previous, current), np.maximum(previous, current)
+        candidates = np.flatnonzero((high > thresholds.min()) & (low <= thresholds.max()))
+        low, high = low[candidates], high[candidates]
+        rising = current[candidates] > previous[candidates]
+        has_edge = (low[np.newaxis, :] <= thresholds[:, np.newaxis]) & (thresholds[:, np.newaxis] < high[np.newaxis, :])
+
         scenes = []
-        t, t_prev, start = -1, 0, 0
-        for i, t in enumerate(predictions):
-            if t_prev == 1 and t == 0:
-                start = i
-            if t_prev == 0 and t == 1 and i != 0:
-                scenes.append([start, i])
-            t_prev = t
-        if t == 0:
-            scenes.append([start, i])
+        for k, threshold in enumerate(thresholds):
+            edges = has_edge[k]
+            scenes.append(AutoShot._edges_to_scenes(
+                num_frames=len(predictions),
+                rises=candidates[edges & rising] + 1,
+                falls=candidates[edges & ~rising] + 1,
+                ends_in_scene=len(predictions) > 0 and predictions[-1] <= threshold
+            ))
+        return scenes
 
-        # just fix if all predictions are 1
-        if len(scenes) == 0:
-            return np.array([[0, len(predictions) - 1]], dtype=np.int32)
-        return np.array(scenes, dtype=np.int32)
+    def check_window_size(
+        self,
+        frames: np.ndarray,
+        tolerance: float = WINDOW_DRIFT_TOLERANCE,
+        threshold: float = 0.5
+    ) -> float:
+        """Check that the configured window size predicts the frames like the 100-frame windows. Switches the
+        detector to 100-frame windows while computing the reference, don't run it concurrently with detection
+
+        Args:
+            frames (np.ndarray): Frames of a sample video, (num_frames, 27, 48, 3)
+            tolerance (float, optional): Largest per-frame difference accepted. Defaults to WINDOW_DRIFT_TOLERANCE.
+            threshold (float, optional): Scene threshold the scenes are compared at. Defaults to 0.5.
+
+        Raises:
+            ValueError: The predictions drift beyond the tolerance, or the scenes differ
+
+        Returns:
+            float: Largest per-frame difference from the 100-frame window predictions
+        """
+        predictions = self.detect_shots(frames=frames)
+        window_size = self.window_size
+        try:
+            self.window_size, self.window_stride = 100, 50
+            reference = self.detect_shots(frames=frames)
+        finally:
+            self.window_size, self.window_stride = window_size, window_size - 50
+        drift = float(np.abs(predictions - reference).max()) if len(frames) else 0.0
+        scenes = self.predictions_to_scenes(predictions, threshold)
+        reference_scenes = self.predictions_to_scenes(reference, threshold)
+        if drift > tolerance:
+            raise ValueError(f"window_size={window_size} drifts by {drift:.4f} from the 100-frame windows, "
+                             f"above the tolerance of {tolerance}")
+        if scenes.shape != reference_scenes.shape or not (scenes == reference_scenes).all():
+            raise ValueError(f"window_size={window_size} changes the scenes of the 100-frame windows")
+        return drift
+
+    def _decode_params(self) -> Dict[str, Any]:
+        """Every setting that changes the predictions for a given video and model, part of the cache key"""
+        return {"width": 48, "height": 27, "pix_fmt": "rgb24", "window_size": self.window_size,
+                "precompute_histograms": self.precompute_histograms, "similarity_kernel": self.similarity_kernel,
+                "precision": self.precision, "cascade_threshold": self.cascade_threshold,
+                # the thread count is the only decode option that can't change the decoded frames
+                "decode_options": {k: v for k, v in self.decode_options.as_dict().items() if k != "threads"}}
+
+    def video_predictions(self, video_path: str) -> np.ndarray:
+        """Per-frame shot boundary predictions of a video, served from the prediction cache when enabled
+
+        Args:
+            video_path (str): Path to the video file
+
+        Raises:
+            ValueError: No frames could be decoded from the video
+
+        Returns:
+            np.ndarray: shot detection predictions for each frame
+        """
+        with self.profiler.video(self.profiler.current_video() or video_path):
+            predictions = self._video_predictions(video_path)
+            self.profiler.count("frames", len(predictions))
+        return predictions
+
+    def decode_frames(self, video_path: str) -> np.ndarray:
+        """Decode the 48x27 RGB frames of a whole video with the detector's decode options
+
+        Raises:
+            ValueError: No frames could be decoded from the video
+        """
+        with self.profiler.stage("decode"):
+            frames = get_frames(video_file_path=video_path, decode_options=self.decode_options)
+        if frames is None or len(frames) == 0:
+            raise ValueError(f"No frames extracted from video: {video_path}")
+        return frames
+
+    @property
+    def decodes_whole_videos(self) -> bool:
+        """Whether the predictions come from `decode_frames` + `detect_shots`, rather than streamed or chunked decoding"""
+        return not self.streaming and self.chunk_workers == 1
 
-    def process_video(self, video_path: str) -> List[List[int]]:
+    def _cache_key(self, video_path: str) -> Optional[str]:
+        if self.prediction_cache is None:
+            return None
+        with self.profiler.stage("cache"):
+            if self._weights_checksum is None:
+                self._weights_checksum = PredictionCache.file_checksum(self.pretrained_path)
+            return self.prediction_cache.key(video_path, self._weights_checksum, self._decode_params())
+
+    def cached_predictions(self, video_path: str) -> Optional[np.ndarray]:
+        """Predictions of a video from the prediction cache, None when not cached or caching is disabled"""
+        key = self._cache_key(video_path)
+        if key is None:
+            return None
+        with self.profiler.stage("cache"):
+            return self.prediction_cache.get(key)
+
+    def cache_predictions(self, video_path: str, predictions: np.ndarray) -> None:
+        """Store the predictions of a video computed outside of `video_predictions`, e.g. in pooled batches"""
+        key = self._cache_key(video_path)
+        if key is not None:
+            self.prediction_cache.put(key, predictions)
+
+    def _video_predictions(self, video_path: str) -> np.ndarray:
+        key = self._cache_key(video_path)
+        if key is not None:
+            with self.profiler.stage("cache"):
+                cached = self.prediction_cache.get(key)
+            if cached is not None:
+                return cached
+
+        if self.streaming:
+            predictions = self.detect_shots_streaming(video_path=video_path)
+        elif self.chunk_workers > 1:
+            predictions = self.detect_shots_chunked(video_path=video_path)
+        else:
+            predictions = self.detect_shots(frames=self.decode_frames(video_path))
+
+        if key is not None:
+            self.prediction_cache.put(key, predictions)
+        return predictions
+
+    def process_video(self, video_path: str, threshold: float = 0.5, return_predictions: bool = False):
         try:
             if not os.path.exists(video_path):
                 raise FileNotFoundError(f"File not found: {video_path}")
 
-            frames = get_frames(video_file_path=video_path)
-            if frames is None or len(frames) == 0:
-                raise ValueError(f"No frames extracted from video: {video_path}")
-            
-            predictions = self.detect_shots(frames = frames)
-            scenes = self.predictions_to_scenes(predictions=predictions)
+            predictions = self.video_predictions(video_path=video_path)
+            scenes = self.predictions_to_scenes(predictions=predictions, threshold=threshold)
 
+            if return_predictions:
+                return scenes.tolist(), predictions
             return scenes.tolist()
 
         except Exception as e:
             raise RuntimeError(F"Failed to process video: {video_path}. Error: {e}")
-        
\ No newline at end of file
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import numpy as np
+from typing import Any, Dict, Optional
+
+
+class PredictionCache:
+    """
+        On-disk cache of the raw per-frame predictions of `AutoShot.detect_shots`, one `.npy` file per entry.
+
+        Entries are keyed by a fingerprint of the video file (size, mtime and a hash of its first and last
+        bytes), a checksum of the model weights and the decode parameters, so changing the threshold or the
+        keyframe sampling never requires running the model again. Hits are loaded memory-mapped and the
+        least recently used entries are evicted once the cache grows past `max_bytes`.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: Optional[int] = 1 << 30, partial_hash_bytes: int = 1 << 20):
+        """Initialize the cache
+
+        Args:
+            cache_dir (str): Directory the entries are stored in
+            max_bytes (Optional[int], optional): Size budget of the cache, None for unbounded. Defaults to 1GB.
+            partial_hash_bytes (int, optional): Bytes hashed at the start and at the end of each video. Defaults to 1MB.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.partial_hash_bytes = partial_hash_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def video_fingerprint(self, video_path: str) -> str:
+        stat = os.stat(video_path)
+        digest = hashlib.sha1()
+        digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+        with open(video_path, "rb") as f:
+            digest.update(f.read(self.partial_hash_bytes))
+            if stat.st_size > 2 * self.partial_hash_bytes:
+                f.seek(-self.partial_hash_bytes, os.SEEK_END)
+                digest.update(f.read(self.partial_hash_bytes))
+        return digest.hexdigest()
+
+    @staticmethod
+    def file_checksum(path: str, block_size: int = 1 << 20) -> str:
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def key(self, video_path: str, model_checksum: str, decode_params: Dict[str, Any]) -> str:
+        payload = {
+            "video": self.video_fingerprint(video_path),
+            "model": model_checksum,
+            "decode": decode_params,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        path = self._path(key)
+        try:
+            predictions = np.load(path, mmap_mode="r")
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        # the modification time doubles as last access time for the LRU eviction
+        os.utime(path, None)
+        return predictions
+
+    def put(self, key: str, predictions: np.ndarray) -> None:
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(predictions))
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self) -> None:
+        """Delete the least recently used entries until the cache fits in max_bytes"""
+        if self.max_bytes is None:
+            return
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(".npy"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,310 @@
+"""
+Stage timers for finding where the time of a run goes.
+
+A `Profiler` is passed to `AutoShot`, `KeyFrameExtractor` and `VideoProcessor`, which time their stages with
+it and attribute them to the video being processed by the calling thread:
+
+    decode             ffmpeg decoding of the 48x27 frames (`get_frames`, or the streamed chunks)
+    histograms         precomputed color histograms
+    inference          forward passes, including the host/device copies
+    model.<layer>      each child module of TransNetV2Supernet (Layer_0_3 ... Layer_5_12, frame_sim_layer,
+                       color_hist_layer, fc1_0, cls_layer1, ...), when `layer_hooks` is set; nested in inference
+    cache              prediction cache lookups
+    keyframes.seek     seeking to and decoding a keyframe, keyframes.decode when decoding sequentially
+    keyframes.write    encoding and writing a keyframe (queuing it, with background writers)
+    keyframes.flush    waiting for the background keyframe writers
+    scene_index        appending the records of a video to the scene index
+
+Every finished video gets a report (wall time, frames, frames/sec, keyframe bytes written, seconds and calls
+per stage), written as JSON or CSV under `report_dir/videos`, and `write_summary` aggregates them into p50/p95
+seconds per stage. Without a profiler, the components use `NULL_PROFILER`, whose timers are shared no-op
+context managers, so the instrumentation costs a method call per stage.
+"""
+import contextlib
+import csv
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+_NULL_CONTEXT = contextlib.nullcontext()
+_UNATTRIBUTED = "_unattributed"
+
+
+class NullProfiler:
+    """
+        Profiler that records nothing, the default of every instrumented component
+    """
+
+    enabled = False
+    layer_hooks = False
+
+    def video(self, video_path: str):
+        return _NULL_CONTEXT
+
+    def stage(self, name: str):
+        return _NULL_CONTEXT
+
+    def count(self, name: str, value: float = 1, video: Optional[str] = None) -> None:
+        pass
+
+    def iterate(self, name: str, iterable: Iterable) -> Iterable:
+        return iterable
+
+    def current_video(self) -> Optional[str]:
+        return None
+
+    def attach_model_hooks(self, model) -> List[Any]:
+        return []
+
+    def finish_video(self, video_path: str, name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        return None
+
+    def write_summary(self) -> Optional[Dict[str, Any]]:
+        return None
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class _VideoRecord:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.counters: Dict[str, float] = {}
+
+
+class _StageTimer:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+
+
+class Profiler(NullProfiler):
+    """
+        Thread-safe registry of per-video stage timings and counters
+    """
+
+    enabled = True
+    FORMATS = ("json", "csv")
+
+    def __init__(
+        self,
+        report_dir: Optional[str] = None,
+        report_format: str = "json",
+        layer_hooks: bool = False,
+        synchronize_cuda: bool = True
+    ):
+        """Initialize the profiler
+
+        Args:
+            report_dir (Optional[str], optional): Directory of the per-video reports and the summary, None keeps
+            them in memory only. Defaults to None.
+            report_format (str, optional): 'json' or 'csv'. CSV reports are (metric, value) rows. Defaults to "json".
+            layer_hooks (bool, optional): Time every child module of the model with forward hooks. Defaults to False.
+            synchronize_cuda (bool, optional): Synchronize CUDA around the timed modules, so their time is not
+            charged to whatever runs next. Defaults to True.
+        """
+        if report_format not in self.FORMATS:
+            raise ValueError(f"Unsupported report format: {report_format}, expected one of {list(self.FORMATS)}")
+        self.report_dir = report_dir
+        self.report_format = report_format
+        self.layer_hooks = layer_hooks
+        self.synchronize_cuda = synchronize_cuda
+        self.reports: List[Dict[str, Any]] = []
+        self._videos: Dict[str, _VideoRecord] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def current_video(self) -> Optional[str]:
+        return getattr(self._local, "video", None)
+
+    @contextlib.contextmanager
+    def video(self, video_path: str) -> Iterator[None]:
+        """Attribute the stages timed by the calling thread to a video"""
+        previous = self.current_video()
+        self._local.video = video_path
+        with self._lock:
+            self._videos.setdefault(video_path, _VideoRecord())
+        try:
+            yield
+        finally:
+            self._local.video = previous
+
+    def _record(self, video: Optional[str]) -> _VideoRecord:
+        video = video or self.current_video() or _UNATTRIBUTED
+        record = self._videos.get(video)
+        if record is None:
+            record = self._videos[video] = _VideoRecord()
+        return record
+
+    def add(self, name: str, seconds: float, video: Optional[str] = None) -> None:
+        with self._lock:
+            record = self._record(video)
+            record.seconds[name] = record.seconds.get(name, 0.0) + seconds
+            record.calls[name] = record.calls.get(name, 0) + 1
+
+    def stage(self, name: str) -> _StageTimer:
+        return _StageTimer(self, name)
+
+    def count(self, name: str, value: float = 1, video: Optional[str] = None) -> None:
+        with self._lock:
+            record = self._record(video)
+            record.counters[name] = record.counters.get(name, 0) + value
+
+    def iterate(self, name: str, iterable: Iterable) -> Iterator:
+        """Yield the items of an iterable, timing every `next` as one call of the stage"""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(name, time.perf_counter() - start)
+                return
+            self.add(name, time.perf_counter() - start)
+            yield item
+
+    def attach_model_hooks(self, model) -> List[Any]:
+        """Time every child module of a model as a `model.<name>` stage
+
+        Returns:
+            List[Any]: Hook handles, `handle.remove()` detaches them
+        """
+        import torch
+
+        handles = []
+        for name, module in model.named_children():
+            stage = f"model.{name}"
+            starts = threading.local()
+
+            def synchronize(inputs) -> None:
+                if self.synchronize_cuda and inputs and isinstance(inputs[0], torch.Tensor) and inputs[0].is_cuda:
+                    torch.cuda.synchronize(inputs[0].device)
+
+            def pre_hook(module, inputs, starts=starts):
+                synchronize(inputs)
+                starts.__dict__.setdefault("stack", []).append(time.perf_counter())
+
+            def post_hook(module, inputs, output, starts=starts, stage=stage):
+                synchronize(inputs)
+                self.add(stage, time.perf_counter() - starts.stack.pop())
+
+            handles.append(module.register_forward_pre_hook(pre_hook))
+            handles.append(module.register_forward_hook(post_hook))
+        return handles
+
+    @staticmethod
+    def _report_name(name: str) -> str:
+        return name.replace(os.sep, "__").replace("/", "__")
+
+    def finish_video(self, video_path: str, name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Close the record of a video and write its report
+
+        Args:
+            video_path (str): Video the stages were attributed to
+            name (Optional[str], optional): Name of the report, e.g. the path relative to the input directory.
+            Defaults to video_path.
+
+        Returns:
+            Optional[Dict[str, Any]]: The report, None when nothing was recorded for the video
+        """
+        with self._lock:
+            record = self._videos.pop(video_path, None)
+        if record is None:
+            return None
+        wall_seconds = time.perf_counter() - record.started
+        frames = int(record.counters.get("frames", 0))
+        report = {
+            "video": name or video_path,
+            "wall_seconds": wall_seconds,
+            "frames": frames,
+            "frames_per_second": frames / wall_seconds if wall_seconds > 0 else 0.0,
+            "bytes_written": int(record.counters.get("bytes_written", 0)),
+            "stages": {stage: {"seconds": seconds, "calls": record.calls[stage]}
+                       for stage, seconds in sorted(record.seconds.items())},
+            "counters": dict(record.counters),
+        }
+        with self._lock:
+            self.reports.append(report)
+        if self.report_dir:
+            self._write(os.path.join(self.report_dir, "videos", self._report_name(report["video"])), report)
+        return report
+
+    def summary(self) -> Dict[str, Any]:
+        """Aggregate of the finished videos: totals, and per stage the p50/p95 of the seconds spent per video"""
+        with self._lock:
+            reports = list(self.reports)
+        videos = [report for report in reports if report["video"] != _UNATTRIBUTED]
+        wall_seconds = sum(report["wall_seconds"] for report in videos)
+        frames = sum(report["frames"] for report in videos)
+        per_video: Dict[str, List[float]] = {}
+        calls: Dict[str, int] = {}
+        for report in reports:
+            for stage, timing in report["stages"].items():
+                per_video.setdefault(stage, []).append(timing["seconds"])
+                calls[stage] = calls.get(stage, 0) + timing["calls"]
+        stages = {}
+        for stage, seconds in sorted(per_video.items()):
+            p50, p95 = np.percentile(seconds, [50, 95])
+            stages[stage] = {"videos": len(seconds), "calls": calls[stage], "total_seconds": float(np.sum(seconds)),
+                             "p50_seconds": float(p50), "p95_seconds": float(p95)}
+        return {
+            "videos": len(videos),
+            "wall_seconds": wall_seconds,
+            "frames": frames,
+            "frames_per_second": frames / wall_seconds if wall_seconds > 0 else 0.0,
+            "bytes_written": sum(report["bytes_written"] for report in reports),
+            "stages": stages,
+        }
+
+    def write_summary(self) -> Dict[str, Any]:
+        # stages timed outside of any video, e.g. the last pooled batches of several videos
+        self.finish_video(_UNATTRIBUTED)
+        summary = self.summary()
+        if self.report_dir:
+            self._write(os.path.join(self.report_dir, "summary"), summary)
+        return summary
+
+    @staticmethod
+    def _flatten(report: Dict[str, Any]) -> List[List[Any]]:
+        rows = []
+        for key, value in report.items():
+            if isinstance(value, dict):
+                rows += [[f"{key}.{metric}", v] for metric, v in Profiler._flatten(value)]
+            else:
+                rows.append([key, value])
+        return rows
+
+    def _write(self, path_without_extension: str, report: Dict[str, Any]) -> None:
+        path = f"{path_without_extension}.{self.report_format}"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            if self.report_format == "json":
+                json.dump(report, f, indent=2)
+            else:
+                writer = csv.writer(f)
+                writer.writerow(["metric", "value"])
+                writer.writerows(self._flatten(report))
+
+    @staticmethod
+    def format_summary(summary: Dict[str, Any]) -> str:
+        lines = [f"{summary['videos']} videos, {summary['frames']} frames in {summary['wall_seconds']:.1f}s "
+                 f"({summary['frames_per_second']:.1f} frames/sec), {summary['bytes_written'] / 2 ** 20:.1f}MB written"]
+        for stage, timing in summary["stages"].items():
+            lines.append(f"{stage:<28} calls={timing['calls']:<8} total={timing['total_seconds']:.2f}s "
+                         f"p50={timing['p50_seconds']:.3f}s p95={timing['p95_seconds']:.3f}s")
+        return "\n".join(lines)
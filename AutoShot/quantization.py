@@ -0,0 +1,198 @@
+"""
+Reduced-precision CPU inference for AutoShot, and the calibration / accuracy report that goes with it.
+
+Precisions:
+    - "int8": dynamic int8 quantization of every nn.Linear (the 4864 -> 1024 classifier head and the similarity
+      projections): weights are stored in int8, activations are quantized on the fly.
+    - "bf16": the model runs under bfloat16 autocast, which covers the Conv3d stacks. Only pays off on CPUs with
+      native bf16 support (AVX512-BF16 / AMX), and is emulated, so slower, elsewhere.
+    - "int8_bf16": both.
+
+Lower precision shifts the predictions slightly, so the threshold that best reproduces the fp32 scenes can
+differ from 0.5. The command below picks it on calibration videos, then reports the speedup and the boundary
+F1 against fp32 on held-out videos:
+    python -m AutoShot.quantization --weights ./AutoShot/model_weight/ckpt_0_200_0.pth --precision int8 \\
+        --calibration-videos ./calibration --videos ./held_out --report ./int8_report.json
+The calibrated threshold then goes with the precision: `VideoProcessor(..., precision="int8", threshold=...)`,
+`run_corpus.py --precision int8 --threshold ...` or `AutoShot.process_video(..., threshold=...)`.
+"""
+import argparse
+import contextlib
+import json
+import os
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import torch
+
+PRECISIONS = ("fp32", "int8", "bf16", "int8_bf16")
+
+
+def quantize_model(model: torch.nn.Module, precision: str) -> torch.nn.Module:
+    """Apply the weight quantization of a precision to an eval-mode model
+
+    Args:
+        model (torch.nn.Module): Loaded model, on CPU
+        precision (str): One of PRECISIONS
+
+    Returns:
+        torch.nn.Module: The quantized model, or the model itself when the precision does not quantize weights
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"precision must be one of {PRECISIONS}, got {precision}")
+    if precision.startswith("int8"):
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        if precision.endswith("bf16"):
+            _cast_quantized_inputs(model)
+    return model
+
+
+class _Float32Input(torch.nn.Module):
+    """Dynamic quantized layers only take fp32 activations, which autocast turns into bf16"""
+
+    def __init__(self, module: torch.nn.Module):
+        super().__init__()
+        self.module = module
+
+    def forward(self, x):
+        return self.module(x.float())
+
+
+def _cast_quantized_inputs(model: torch.nn.Module) -> None:
+    for name, child in model.named_children():
+        if isinstance(child, torch.ao.nn.quantized.dynamic.Linear):
+            setattr(model, name, _Float32Input(child))
+        else:
+            _cast_quantized_inputs(child)
+
+
+def precision_context(precision: str, device: str = "cpu"):
+    """Context the forward pass runs in: bfloat16 autocast for the bf16 precisions"""
+    if precision.endswith("bf16"):
+        return torch.autocast(device_type=device, dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
+def boundaries_f1(reference_scenes: np.ndarray, scenes: np.ndarray, tolerance: int = 2) -> Dict[str, float]:
+    """Precision, recall and F1 of the shot boundaries (scene ends) of `scenes` against `reference_scenes`,
+    a boundary matching at most one reference boundary within `tolerance` frames"""
+    reference, predicted = np.asarray(reference_scenes)[:, 1], np.asarray(scenes)[:, 1]
+    # the last frame of the video ends a scene without being a boundary
+    last_frame = max(reference.max(), predicted.max())
+    reference, predicted = reference[reference < last_frame], predicted[predicted < last_frame]
+    matched, j = 0, 0
+    for boundary in predicted:
+        while j < len(reference) and reference[j] < boundary - tolerance:
+            j += 1
+        if j < len(reference) and reference[j] <= boundary + tolerance:
+            matched += 1
+            j += 1
+    precision = matched / len(predicted) if len(predicted) else 1.0
+    recall = matched / len(reference) if len(reference) else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": precision, "recall": recall, "f1": f1}
+
+
+def calibrate_threshold(
+    reference_predictions: Sequence[np.ndarray],
+    predictions: Sequence[np.ndarray],
+    reference_threshold: float = 0.5,
+    thresholds: Optional[np.ndarray] = None,
+    tolerance: int = 2
+) -> float:
+    """Threshold on `predictions` whose scenes best match, in mean boundary F1, the scenes of
+    `reference_predictions` at `reference_threshold`"""
+    from .model import AutoShot
+
+    thresholds = np.round(np.arange(0.05, 0.96, 0.01), 2) if thresholds is None else np.asarray(thresholds)
+    scores = np.zeros(len(thresholds))
+    for reference, candidate in zip(reference_predictions, predictions):
+        reference_scenes = AutoShot.predictions_to_scenes(reference, reference_threshold)
+        for k, scenes in enumerate(AutoShot.predictions_to_scenes_sweep(candidate, thresholds)):
+            scores[k] += boundaries_f1(reference_scenes, scenes, tolerance)["f1"]
+    # ties go to the threshold closest to the reference one
+    best = np.flatnonzero(scores == scores.max())
+    return float(thresholds[best[np.argmin(np.abs(thresholds[best] - reference_threshold))]])
+
+
+def _video_paths(paths: List[str]) -> List[str]:
+    video_extensions = ('.mp4', '.avi', '.mov', '.mkv')
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                videos.extend(os.path.join(root, name) for name in files if name.lower().endswith(video_extensions))
+        else:
+            videos.append(path)
+    return sorted(videos)
+
+
+def _predict(shot_detector, frames: List[np.ndarray]):
+    start = time.perf_counter()
+    predictions = [shot_detector.detect_shots(frames=video_frames) for video_frames in frames]
+    return predictions, time.perf_counter() - start
+
+
+def main(argv: Optional[List[str]] = None):
+    from .model import AutoShot
+    from .utils import get_frames
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default="./AutoShot/model_weight/ckpt_0_200_0.pth")
+    parser.add_argument("--precision", choices=PRECISIONS[1:], default="int8")
+    parser.add_argument("--videos", nargs="+", required=True, help="Held-out videos or directories of videos")
+    parser.add_argument("--calibration-videos", nargs="+", default=None,
+                        help="Videos the threshold is calibrated on, the reference threshold is kept if omitted")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Threshold of the fp32 reference")
+    parser.add_argument("--tolerance", type=int, default=2, help="Frames a boundary may be off by and still match")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--report", default=None, help="Write the JSON report to this path")
+    args = parser.parse_args(argv)
+
+    reference_model = AutoShot(args.weights, device="cpu", batch_size=args.batch_size)
+    quantized_model = AutoShot(args.weights, device="cpu", batch_size=args.batch_size, precision=args.precision)
+
+    threshold = args.threshold
+    if args.calibration_videos:
+        calibration = [get_frames(path) for path in _video_paths(args.calibration_videos)]
+        reference, _ = _predict(reference_model, calibration)
+        candidate, _ = _predict(quantized_model, calibration)
+        threshold = calibrate_threshold(reference, candidate, args.threshold, tolerance=args.tolerance)
+        print(f"Calibrated threshold for {args.precision}: {threshold}")
+
+    video_paths = _video_paths(args.videos)
+    frames = [get_frames(path) for path in video_paths]
+    reference, reference_seconds = _predict(reference_model, frames)
+    candidate, candidate_seconds = _predict(quantized_model, frames)
+
+    videos = []
+    for path, reference_predictions, predictions in zip(video_paths, reference, candidate):
+        scores = boundaries_f1(AutoShot.predictions_to_scenes(reference_predictions, args.threshold),
+                               AutoShot.predictions_to_scenes(predictions, threshold), args.tolerance)
+        scores["max_abs_diff"] = float(np.abs(reference_predictions - predictions).max())
+        videos.append({"video": path, **scores})
+
+    num_frames = sum(len(video_frames) for video_frames in frames)
+    report = {
+        "precision": args.precision,
+        "threshold": threshold,
+        "reference_threshold": args.threshold,
+        "tolerance": args.tolerance,
+        "num_frames": num_frames,
+        "fp32_frames_per_sec": num_frames / reference_seconds,
+        "frames_per_sec": num_frames / candidate_seconds,
+        "speedup": reference_seconds / candidate_seconds,
+        "mean_f1": float(np.mean([video["f1"] for video in videos])),
+        "videos": videos,
+    }
+    print(f"{args.precision}: {report['speedup']:.2f}x fp32 throughput, mean boundary F1 vs fp32 {report['mean_f1']:.4f} "
+          f"at threshold {threshold}")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+class SceneIndexWriter:
+    """
+        Buffered index of the detected scenes, one record per scene:
+
+            video, scene, start_frame, end_frame, start_time, end_time, keyframes, peak_probability
+
+        Records are buffered and written in bulk, every `batch_size` records or `flush_seconds` seconds, so
+        indexing millions of keyframes costs a few thousand writes instead of millions of small files.
+
+        'jsonl' appends to a single file. 'parquet' (needs pyarrow) treats `index_path` as a dataset directory:
+        every writer session adds one part file, with one row group per flush, and `close` must be called to
+        finalize it. Both read back with pandas (`read_json(path, lines=True)` / `read_parquet(path)`).
+    """
+
+    FORMATS = ('jsonl', 'parquet')
+
+    def __init__(
+        self,
+        index_path: str,
+        index_format: Optional[str] = None,
+        batch_size: int = 10000,
+        flush_seconds: Optional[float] = 30.0
+    ):
+        """Initialize the writer
+
+        Args:
+            index_path (str): JSONL file, or directory of the Parquet dataset
+            index_format (Optional[str], optional): 'jsonl' or 'parquet', from the extension of index_path when
+            None: '.jsonl' files, '.parquet' or extensionless directories. Defaults to None.
+            batch_size (int, optional): Buffered records that trigger a flush. Defaults to 10000.
+            flush_seconds (Optional[float], optional): Age of the oldest buffered record that triggers a flush,
+            checked on every append, None to flush on size only. Defaults to 30.
+        """
+        if index_format is None:
+            index_format = 'jsonl' if index_path.lower().endswith(('.jsonl', '.json')) else 'parquet'
+        if index_format not in self.FORMATS:
+            raise ValueError(f"Unsupported index format: {index_format}, expected one of {list(self.FORMATS)}")
+        if index_format == 'parquet':
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise ImportError("The parquet scene index needs pyarrow: pip install pyarrow, or use a .jsonl index")
+
+        self.index_path = index_path
+        self.index_format = index_format
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.records_written = 0
+        self._buffer: List[Dict[str, Any]] = []
+        self._oldest: Optional[float] = None
+        self._parquet_writer = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def scene_records(
+        video_path: str,
+        scenes: Sequence[Sequence[int]],
+        fps: float,
+        keyframes: Sequence[Sequence[str]],
+        predictions: Optional[np.ndarray] = None
+    ) -> List[Dict[str, Any]]:
+        """Records of the scenes of a video
+
+        Args:
+            video_path (str): Path of the video
+            scenes (Sequence[Sequence[int]]): Scene start and end frame indices, as returned by `AutoShot.process_video`
+            fps (float): Frame rate the timestamps are computed with, no timestamps when not positive
+            keyframes (Sequence[Sequence[str]]): Keyframe paths of every scene
+            predictions (Optional[np.ndarray], optional): Per-frame boundary predictions of the video. The peak
+            probability of a scene is the highest prediction from its last frame to the start of the next scene,
+            the transition that ends it. Defaults to None.
+        """
+        predictions = np.asarray(predictions).reshape(-1) if predictions is not None else None
+        records = []
+        for i, (start, end) in enumerate(scenes):
+            start, end = int(start), int(end)
+            peak = None
+            if predictions is not None and end < len(predictions):
+                transition_end = int(scenes[i + 1][0]) if i + 1 < len(scenes) else end + 1
+                peak = float(predictions[end:max(end + 1, transition_end)].max())
+            records.append({
+                "video": video_path,
+                "scene": i,
+                "start_frame": start,
+                "end_frame": end,
+                "start_time": start / fps if fps > 0 else None,
+                "end_time": (end + 1) / fps if fps > 0 else None,
+                "keyframes": list(keyframes[i]),
+                "peak_probability": peak,
+            })
+        return records
+
+    def append(self, records: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            if not self._buffer:
+                self._oldest = time.monotonic()
+            self._buffer.extend(records)
+            if len(self._buffer) >= self.batch_size or (
+                    self.flush_seconds is not None and time.monotonic() - self._oldest >= self.flush_seconds):
+                self._flush()
+
+    def flush(self) -> None:
+        """Write the buffered records"""
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+        records, self._buffer = self._buffer, []
+        if self.index_format == 'jsonl':
+            index_dir = os.path.dirname(self.index_path)
+            if index_dir:
+                os.makedirs(index_dir, exist_ok=True)
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(record) + '\n' for record in records))
+        else:
+            self._write_parquet(records)
+        self.records_written += len(records)
+
+    def _write_parquet(self, records: List[Dict[str, Any]]) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pylist(records, schema=self._parquet_schema())
+        if self._parquet_writer is None:
+            os.makedirs(self.index_path, exist_ok=True)
+            part = os.path.join(self.index_path, f"part-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet")
+            self._parquet_writer = pq.ParquetWriter(part, table.schema)
+        self._parquet_writer.write_table(table)
+
+    @staticmethod
+    def _parquet_schema():
+        import pyarrow as pa
+
+        return pa.schema([
+            ("video", pa.string()),
+            ("scene", pa.int32()),
+            ("start_frame", pa.int64()),
+            ("end_frame", pa.int64()),
+            ("start_time", pa.float64()),
+            ("end_time", pa.float64()),
+            ("keyframes", pa.list_(pa.string())),
+            ("peak_probability", pa.float32()),
+        ])
+
+    def close(self) -> None:
+        """Write the buffered records and finalize the Parquet part; appending afterwards starts a new part"""
+        with self._lock:
+            self._flush()
+            if self._parquet_writer is not None:
+                self._parquet_writer.close()
+                self._parquet_writer = None
+
+    def __enter__(self) -> "SceneIndexWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
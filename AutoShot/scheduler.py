@@ -0,0 +1,107 @@
+import numpy as np
+from collections import deque
+from typing import Deque, Dict, Hashable, List, Optional, Tuple
+from .model import AutoShot
+from .utils import compute_color_histograms, get_batches
+
+
+class CrossVideoBatchScheduler:
+    """
+        Pools the inference windows of several videos into shared inference batches, so that short
+        clips still fill a full model batch, and scatters the predictions back to their videos
+    """
+
+    def __init__(self, shot_detector: AutoShot, batch_size: Optional[int] = None):
+        """Initialize the scheduler
+
+        Args:
+            shot_detector (AutoShot): Loaded shot detector used to run the batches
+            batch_size (Optional[int], optional): Number of windows per forward pass. Defaults to the detector's batch_size.
+        """
+        self.shot_detector = shot_detector
+        self.batch_size = batch_size or shot_detector.batch_size
+        # every queued window is tagged with (video id, frame offset of its first kept prediction), and followed
+        # by its precomputed color histograms when the detector precomputes them
+        self._queue: Deque[Tuple[Hashable, int, np.ndarray, Optional[np.ndarray]]] = deque()
+        self._predictions: Dict[Hashable, np.ndarray] = {}
+        self._num_frames: Dict[Hashable, int] = {}
+        self._remaining: Dict[Hashable, int] = {}
+
+    @property
+    def pending_windows(self) -> int:
+        return len(self._queue)
+
+    def add_video(self, video_id: Hashable, frames: np.ndarray) -> List[Tuple[Hashable, np.ndarray]]:
+        """Queue every window of a video and run the batches that are full
+
+        Args:
+            video_id (Hashable): Identifier of the video, returned with its predictions
+            frames (np.ndarray): Array of video frames, (num_frames, height, width, channels)
+
+        Raises:
+            ValueError: The video has no frames or its id is already queued
+
+        Returns:
+            List[Tuple[Hashable, np.ndarray]]: (video id, per-frame predictions) of every video completed by this call
+        """
+        if len(frames) == 0:
+            raise ValueError(f"No frames in video: {video_id}")
+        if video_id in self._remaining:
+            raise ValueError(f"Video is already scheduled: {video_id}")
+
+        stride = self.shot_detector.window_stride
+        window_size = self.shot_detector.window_size
+        windows = list(get_batches(frames=frames, window_size=window_size))
+        histogram_windows = [None] * len(windows)
+        if self.shot_detector.precompute_histograms:
+            with self.shot_detector.profiler.stage("histograms"):
+                histogram_windows = list(get_batches(frames=compute_color_histograms(frames), window_size=window_size))
+        predictions = np.empty((len(windows) * stride, 1), dtype=np.float32)
+        remaining = 0
+        for i, (window, histogram_window) in enumerate(zip(windows, histogram_windows)):
+            # windows skipped by the detector's cascade pre-filter predict 0 without being queued
+            if self.shot_detector.skips_window(window, histogram_window):
+                predictions[i * stride:(i + 1) * stride] = 0
+            else:
+                self._queue.append((video_id, i * stride, window, histogram_window))
+                remaining += 1
+
+        completed = []
+        if remaining == 0:
+            completed.append((video_id, predictions[:len(frames)]))
+        else:
+            self._predictions[video_id] = predictions
+            self._num_frames[video_id] = len(frames)
+            self._remaining[video_id] = remaining
+        while len(self._queue) >= self.batch_size:
+            completed.extend(self._run_batch())
+        return completed
+
+    def flush(self) -> List[Tuple[Hashable, np.ndarray]]:
+        """Run the remaining, possibly partial, batches
+
+        Returns:
+            List[Tuple[Hashable, np.ndarray]]: (video id, per-frame predictions) of every video completed by this call
+        """
+        completed = []
+        while self._queue:
+            completed.extend(self._run_batch())
+        return completed
+
+    def _run_batch(self) -> List[Tuple[Hashable, np.ndarray]]:
+        tagged = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+        histograms = [histogram_window for _, _, _, histogram_window in tagged]
+        predictions = self.shot_detector.predict_batch(
+            batches=np.stack([window for _, _, window, _ in tagged]),
+            histograms=np.stack(histograms) if histograms[0] is not None else None
+        )
+
+        stride = self.shot_detector.window_stride
+        completed = []
+        for (video_id, offset, _, _), prediction in zip(tagged, predictions):
+            self._predictions[video_id][offset:offset + stride] = prediction[25:25 + stride]
+            self._remaining[video_id] -= 1
+            if self._remaining[video_id] == 0:
+                completed.append((video_id, self._predictions.pop(video_id)[:self._num_frames.pop(video_id)]))
+                del self._remaining[video_id]
+        return completed
@@ -1,4 +1,5 @@
 import math
+from functools import lru_cache
 
 import numpy as np
 import torch
@@ -20,7 +21,8 @@ class TransNetV2Supernet(nn.Module):
                  use_resnet_like_top=False,
                  frame_similarity_on_last_layer=False,
                  use_color_histograms=True,
-                 chromosome=None):
+                 chromosome=None,
+                 similarity_kernel="gather"):
         super(TransNetV2Supernet, self).__init__()
 
         self.reprocess_layer = (lambda x: x / 255.)
@@ -58,8 +60,10 @@ class TransNetV2Supernet(nn.Module):
         self.cls_layer1 = Linear_(in_features=1024, out_features=1, bias=True, act="Identity")
         self.cls_layer2 = Linear_(in_features=1024, out_features=1, bias=True, act="Identity") \
             if use_many_hot_targets else None
-        self.frame_sim_layer = FrameSimilarity(in_channels=448, inner_channels=101) if use_frame_similarity else None
-        self.color_hist_layer = ColorHistograms(lookup_window=101, output_dim=128) if use_color_histograms else None
+        self.frame_sim_layer = FrameSimilarity(in_channels=448, inner_channels=101,
+                                               similarity_kernel=similarity_kernel) if use_frame_similarity else None
+        self.color_hist_layer = ColorHistograms(lookup_window=101, output_dim=128,
+                                                similarity_kernel=similarity_kernel) if use_color_histograms else None
         self.use_mean_pooling = use_mean_pooling
         self.dropout = torch.nn.Dropout(p=1.0 - dropout_rate) if dropout_rate is not None else None
         self.frame_similarity_on_last_layer = frame_similarity_on_last_layer
@@ -86,7 +90,8 @@ class TransNetV2Supernet(nn.Module):
             elif isinstance(m, nn.Conv3d):
                 init.kaiming_normal_(m.weight, mode="fan_in", nonlinearity="relu")
 
-    def forward(self, inputs, **kwargs):
+    def forward(self, inputs, color_histograms=None, **kwargs):
+        # color_histograms: optional precomputed [BS, N, 512] normalized histograms of the input frames
         x = self.reprocess_layer(inputs)
 
         if self.resnet_like_top:
@@ -131,7 +136,7 @@ class TransNetV2Supernet(nn.Module):
             x = torch.cat([self.frame_sim_layer(block_features), x], dim=2)
 
         if self.color_hist_layer is not None:
-            x = torch.cat([self.color_hist_layer(inputs), x], dim=2)
+            x = torch.cat([self.color_hist_layer(inputs, histograms=color_histograms), x], dim=2)
         
         if transf_x is not None:
             x = torch.cat([transf_x, x], dim=2)
@@ -184,11 +189,57 @@ def gather_nd(params, indices):
         raise ValueError(f'the last dimension of indices must less or equal to the rank of params. '
                          f'Got indices:{indices.shape}, params:{params.shape}. {m} > {n}')
 
-    indices = indices.reshape((num_samples, m)).transpose(0, 1).tolist()
+    # one index tensor per indexed dimension: no conversion to Python lists, so cached indices stay cheap to reuse
+    indices = tuple(indices.reshape((num_samples, m)).unbind(dim=1))
     output = params[indices]  # (num_samples, ...)
     return output.reshape(out_shape).contiguous()
 
 
+@lru_cache(maxsize=64)
+def band_gather_indices(batch_size, time_window, lookup_window, device):
+    """ [batch_size, time_window, lookup_window, 3] gather_nd indices of the similarity band, built once per shape. """
+    batch_indices = torch.arange(0, batch_size, device=device). \
+        reshape(shape=[batch_size, 1, 1]). \
+        repeat([1, time_window, lookup_window])
+    time_indices = torch.arange(0, time_window, device=device). \
+        reshape(shape=[1, time_window, 1]). \
+        repeat([batch_size, 1, lookup_window])
+    lookup_indices = torch.arange(0, lookup_window, device=device). \
+                         reshape(shape=[1, 1, lookup_window]). \
+                         repeat([batch_size, time_window, 1]) + time_indices
+
+    return torch.stack([batch_indices, time_indices, lookup_indices], dim=-1)
+
+
+def band_similarities(x, lookup_window, kernel="gather", device="cpu"):
+    """ Dot products of every frame with its lookup_window neighbours, zero outside the sequence.
+
+    Args:
+        x (Tensor): [batch_size, time_window, channels] frame features.
+        lookup_window (int): odd width of the band, centred on each frame.
+        kernel (str): "gather" builds the full [batch_size, time_window, time_window] similarity matrix and
+            gathers the band out of it; "banded" only computes the band, from an unfold view of the
+            zero-padded features, which scales linearly with time_window.
+        device (str): device of the gather indices.
+
+    Returns: [batch_size, time_window, lookup_window] similarities.
+    """
+    batch_size, time_window = x.shape[0], x.shape[1]
+    half = (lookup_window - 1) // 2
+    if kernel == "banded":
+        neighbours = F.pad(x, pad=[0, 0, half, half]).unfold(1, lookup_window, 1)  # [BS, N, C, lookup_window]
+        return torch.einsum("btc,btcw->btw", x, neighbours)
+    if kernel != "gather":
+        raise ValueError(f"Unknown similarity kernel: {kernel}")
+
+    y = x.permute(dims=[0, 2, 1])
+    similarities = torch.matmul(x, y)  # [batch_size, time_window, time_window]
+    # note that it operates on dimensions of the input tensor in a backward fashion (from last dimension to the first dimension)
+    similarities_padded = F.pad(similarities, pad=[half, half, 0, 0, 0, 0])
+    indices = band_gather_indices(batch_size, time_window, lookup_window, device)
+    return gather_nd(similarities_padded, indices)
+
+
 class FrameSimilarity(nn.Module):
 
     def __init__(self,
@@ -198,7 +249,8 @@ class FrameSimilarity(nn.Module):
                  lookup_window=101,
                  output_dim=128,
                  stop_gradient=False,
-                 use_bias=True):
+                 use_bias=True,
+                 similarity_kernel="gather"):
         super(FrameSimilarity, self).__init__()
 
         self.projection = Linear_(in_features=in_channels, out_features=similarity_dim,
@@ -207,6 +259,7 @@ class FrameSimilarity(nn.Module):
 
         self.lookup_window = lookup_window
         self.stop_gradient = stop_gradient
+        self.similarity_kernel = similarity_kernel
         assert lookup_window % 2 == 1, "`lookup_window` must be odd integer"
         if torch.cuda.is_available() is True:
             self.device = "cuda"
@@ -228,35 +281,18 @@ class FrameSimilarity(nn.Module):
 
         _, new_channels = x.shape
         x = x.reshape(shape=[batch_size, time_window, new_channels])
-        y = x.permute(dims=[0, 2, 1])
-        similarities = torch.matmul(x, y)  # [batch_size, time_window, time_window]
-        # note that it operates on dimensions of the input tensor in a backward fashion (from last dimension to the first dimension)
-        similarities_padded = F.pad(similarities,
-                                    pad=[(self.lookup_window - 1) // 2, (self.lookup_window - 1) // 2, 0, 0, 0, 0])
-
-        batch_indices = torch.arange(0, batch_size, device=self.device). \
-            reshape(shape=[batch_size, 1, 1]). \
-            repeat([1, time_window, self.lookup_window])
-        time_indices = torch.arange(0, time_window, device=self.device). \
-            reshape(shape=[1, time_window, 1]). \
-            repeat([batch_size, 1, self.lookup_window])
-        lookup_indices = torch.arange(0, self.lookup_window, device=self.device). \
-                             reshape(shape=[1, 1, self.lookup_window]). \
-                             repeat([batch_size, time_window, 1]) + time_indices
-
-        indices = torch.stack([batch_indices, time_indices, lookup_indices], dim=-1)
-
-        similarities = gather_nd(similarities_padded, indices)
+        similarities = band_similarities(x, self.lookup_window, kernel=self.similarity_kernel, device=self.device)
         return self.fc(similarities)
 
 
 class ColorHistograms(nn.Module):
 
-    def __init__(self, lookup_window=101, output_dim=128):
+    def __init__(self, lookup_window=101, output_dim=128, similarity_kernel="gather"):
         super(ColorHistograms, self).__init__()
         self.fc = Linear_(in_features=101, out_features=output_dim, bias=True, act="ReLU") \
             if output_dim is not None else None
         self.lookup_window = lookup_window
+        self.similarity_kernel = similarity_kernel
         assert lookup_window % 2 == 1, "`lookup_window` must be odd integer"
         if torch.cuda.is_available() is True:
             self.device = "cuda"
@@ -314,29 +350,9 @@ class ColorHistograms(nn.Module):
         histograms_normalized = histograms_normalized / torch.norm(histograms_normalized, dim=2, keepdim=True)
         return histograms_normalized
 
-    def forward(self, inputs):
-        x = self.compute_color_histograms(inputs)
-
-        batch_size, time_window = x.shape[0], x.shape[1]
-        y = x.permute(dims=[0, 2, 1])
-        similarities = torch.matmul(x, y)  # [batch_size, time_window, time_window]
-        # note that it operates on dimensions of the input tensor in a backward fashion (from last dimension to the first dimension)
-        similarities_padded = F.pad(similarities,
-                                    pad=[(self.lookup_window - 1) // 2, (self.lookup_window - 1) // 2, 0, 0, 0, 0])
-
-        batch_indices = torch.arange(0, batch_size, device=self.device). \
-            reshape(shape=[batch_size, 1, 1]). \
-            repeat([1, time_window, self.lookup_window])
-        time_indices = torch.arange(0, time_window, device=self.device). \
-            reshape(shape=[1, time_window, 1]). \
-            repeat([batch_size, 1, self.lookup_window])
-        lookup_indices = torch.arange(0, self.lookup_window, device=self.device). \
-                             reshape(shape=[1, 1, self.lookup_window]). \
-                             repeat([batch_size, time_window, 1]) + time_indices
-
-        indices = torch.stack([batch_indices, time_indices, lookup_indices], dim=-1)
-
-        similarities = gather_nd(similarities_padded, indices)
+    def forward(self, inputs, histograms=None):
+        x = self.compute_color_histograms(inputs) if histograms is None else histograms
+        similarities = band_similarities(x, self.lookup_window, kernel=self.similarity_kernel, device=self.device)
 
         if self.fc is not None:
             return self.fc(similarities)
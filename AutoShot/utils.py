@@ -1,7 +1,59 @@
+import cv2
 import numpy as np
 import ffmpeg
+import threading
+from numpy.lib.stride_tricks import sliding_window_view
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, Optional, Tuple
 
-def get_frames(video_file_path: str, width: int = 48, height: int = 27) -> np.ndarray:
+
+@dataclass(frozen=True)
+class DecodeOptions:
+    """
+    ffmpeg decoding options of `get_frames` and `stream_frames`. The defaults reproduce plain ffmpeg decoding.
+
+    Attributes:
+        threads (Optional[int]): Decoder threads, None lets ffmpeg pick (usually one per core).
+        hwaccel (Optional[str]): Hardware decoding API, e.g. 'auto', 'cuda', 'vaapi'. Frames are copied back
+            to system memory before scaling.
+        skip_frame (Optional[str]): Frames the decoder drops, 'noref', 'bidir', 'nointra' or 'nokey'. Skipped
+            frames are missing from the output, so frame indices no longer match the video: for previews only.
+        lowres (int): Decode at 1/2**lowres resolution, only honoured by some decoders (MJPEG, MPEG-4 part 2),
+            and ignored by H.264/HEVC.
+        sws_flags (Optional[str]): Scaler of the downscale to width x height, e.g. 'fast_bilinear', 'area',
+            'bilinear'. None keeps ffmpeg's default (bicubic), the scaler the model was run with.
+        start_time (Optional[float]): Seek to this time, in seconds, before decoding. Frame indices are then
+            relative to the first decoded frame.
+        duration (Optional[float]): Decode only this many seconds.
+        max_frames (Optional[int]): Decode at most this many frames.
+    """
+    threads: Optional[int] = None
+    hwaccel: Optional[str] = None
+    skip_frame: Optional[str] = None
+    lowres: int = 0
+    sws_flags: Optional[str] = None
+    start_time: Optional[float] = None
+    duration: Optional[float] = None
+    max_frames: Optional[int] = None
+
+    def input_kwargs(self) -> Dict[str, Any]:
+        kwargs = {"threads": self.threads, "hwaccel": self.hwaccel, "skip_frame": self.skip_frame,
+                  "lowres": self.lowres or None, "ss": self.start_time, "t": self.duration}
+        return {key: value for key, value in kwargs.items() if value is not None}
+
+    def output_kwargs(self) -> Dict[str, Any]:
+        kwargs = {"sws_flags": self.sws_flags, "vframes": self.max_frames}
+        return {key: value for key, value in kwargs.items() if value is not None}
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+def get_frames(
+    video_file_path: str,
+    width: int = 48,
+    height: int = 27,
+    decode_options: Optional[DecodeOptions] = None
+) -> np.ndarray:
     """
     Extract frames from video like you're performing a magic trick, but with more swearing.
     
@@ -9,15 +61,17 @@ def get_frames(video_file_path: str, width: int = 48, height: int = 27) -> np.nd
         video_file_path (str): Path to the video file. Don't fuck this up.
         width (int): Width of the extracted frame. Default is 48, because we're not made of pixels.
         height (int): Height of the extracted frames. Default is 27, because odd numbers are cool.
+        decode_options (Optional[DecodeOptions]): Threads, hardware decoding, scaler and time range. Default is None.
     
     Returns:
         np.ndarray: Array of video frames. If this fails, you're proper fucked.
     """
+    decode_options = decode_options or DecodeOptions()
     try:
         out, _ = (
             ffmpeg
-            .input(video_file_path)
-            .output('pipe:', format='rawvideo', pix_fmt='rgb24', s=f'{width}x{height}')
+            .input(video_file_path, **decode_options.input_kwargs())
+            .output('pipe:', format='rawvideo', pix_fmt='rgb24', s=f'{width}x{height}', **decode_options.output_kwargs())
             .run(capture_stdout=True, capture_stderr=True)
         )
         
@@ -30,21 +84,196 @@ def get_frames(video_file_path: str, width: int = 48, height: int = 27) -> np.nd
         print(f"Error in get_frames: {str(e)}")
         raise
 
-def get_batches(frames: np.ndarray):
+def get_batches(frames: np.ndarray, window_size: int = 100):
     """
     Prepare batches of frames for processing. It's like making a video sandwich.
     
     Args:
         frames (np.ndarray): Array of video frames. Try not to feed it pictures of your ex.
+        window_size (int): Frames per window. Consecutive windows overlap by 50 frames, and only the
+            central `window_size - 50` predictions of each are kept. Default is 100.
     
     Yields:
         np.ndarray: Batches of frames, because processing all at once would make your computer cry.
     """
-    reminder = 50 - len(frames) % 50
-    if reminder == 50:
-        reminder = 0
-    frames = np.concatenate([frames[:1]] * 25 + [frames] + [frames[-1:]] * (reminder + 25), 0)
+    return get_segment_batches(frames, window_size=window_size, pad_start=True, pad_end=True)
 
-    
-    for i in range(0, len(frames) - 50, 50):
-        yield frames[i:i + 100]
\ No newline at end of file
+
+def get_segment_batches(frames: np.ndarray, window_size: int = 100, pad_start: bool = True, pad_end: bool = True):
+    """
+    Windows of a segment of a video, laid out exactly as `get_batches` lays out the windows of the whole video.
+
+    Only the sides of the segment that are real video ends get padded; on the other sides the segment must
+    carry the 25 frames of context the windows overlap by. Stitching the kept predictions of consecutive
+    segments, split at multiples of `window_size - 50` frames, then gives the predictions of the whole video.
+
+    Args:
+        frames (np.ndarray): Frames of the segment, or any per-frame features like the color histograms.
+        window_size (int): Frames per window. Default is 100.
+        pad_start (bool): The segment starts at the first frame of the video. Default is True.
+        pad_end (bool): The segment ends at the last frame of the video. Default is True.
+
+    Yields:
+        np.ndarray: Windows of the segment.
+    """
+    stride = window_size - 50
+    front = 25 if pad_start else 0
+    back = 0
+    if pad_end:
+        reminder = stride - (len(frames) - 25 + front) % stride
+        if reminder == stride:
+            reminder = 0
+        back = reminder + 25
+    num_windows = len(range(0, front + len(frames) + back - 50, stride))
+
+    # windows are views of the frames, only the few windows reaching into the padding are copied, by indexing
+    # with clamped frame indices: the padding repeats the first and last frames
+    views = np.moveaxis(sliding_window_view(frames, window_size, axis=0), -1, 1) if len(frames) >= window_size else None
+    for i in range(num_windows):
+        start = i * stride - front
+        if start >= 0 and start + window_size <= len(frames):
+            yield views[start]
+        else:
+            yield frames[np.clip(np.arange(start, start + window_size), 0, len(frames) - 1)]
+
+
+def video_frame_info(video_file_path: str) -> Tuple[float, int]:
+    """
+    Frame rate and frame count of a video from its container metadata. The count is an estimate for some
+    containers, 0 when unknown.
+
+    Args:
+        video_file_path (str): Path to the video file.
+
+    Returns:
+        Tuple[float, int]: (frames per second, number of frames)
+    """
+    cap = cv2.VideoCapture(video_file_path)
+    try:
+        return cap.get(cv2.CAP_PROP_FPS), int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        cap.release()
+
+
+def compute_color_histograms(frames: np.ndarray) -> np.ndarray:
+    """
+    Per-frame normalized 512-bin RGB histograms (3 bits per channel), the same features
+    `ColorHistograms.compute_color_histograms` builds inside the model, computed once per video with bincount.
+
+    Args:
+        frames (np.ndarray): Array of RGB video frames, (num_frames, height, width, 3).
+
+    Returns:
+        np.ndarray: L2-normalized histograms, (num_frames, 512) float32.
+    """
+    frames = frames.reshape(len(frames), -1, 3) >> 5
+    bins = (frames[..., 0].astype(np.int64) << 6) + (frames[..., 1] << 3) + frames[..., 2]
+    bins += np.arange(len(frames), dtype=np.int64)[:, np.newaxis] << 9
+    histograms = np.bincount(bins.reshape(-1), minlength=len(frames) * 512).reshape(len(frames), 512)
+    histograms = histograms.astype(np.float32)
+    return histograms / np.linalg.norm(histograms, axis=1, keepdims=True)
+
+
+def stream_frames(
+    video_file_path: str,
+    width: int = 48,
+    height: int = 27,
+    chunk_size: int = 500,
+    pix_fmt: str = 'rgb24',
+    decode_options: Optional[DecodeOptions] = None
+) -> Iterator[np.ndarray]:
+    """
+    Decode frames through a persistent ffmpeg pipe, chunk by chunk, instead of buffering the whole video.
+
+    Args:
+        video_file_path (str): Path to the video file.
+        width (int): Width of the extracted frames. Default is 48.
+        height (int): Height of the extracted frames. Default is 27.
+        chunk_size (int): Number of frames read from the pipe at a time. Default is 500.
+        pix_fmt (str): 3-channel ffmpeg pixel format, 'rgb24' or 'bgr24'. Default is 'rgb24'.
+        decode_options (Optional[DecodeOptions]): Threads, hardware decoding, scaler and time range. Default is None.
+
+    Yields:
+        np.ndarray: Chunks of video frames, (<= chunk_size, height, width, 3).
+    """
+    frame_bytes = width * height * 3
+    decode_options = decode_options or DecodeOptions()
+    process = (
+        ffmpeg
+        .input(video_file_path, **decode_options.input_kwargs())
+        .output('pipe:', format='rawvideo', pix_fmt=pix_fmt, s=f'{width}x{height}', **decode_options.output_kwargs())
+        .global_args('-loglevel', 'error')
+        .run_async(pipe_stdout=True, pipe_stderr=True)
+    )
+    # drained in the background: a corrupt input can log more than a pipe buffer of errors, and ffmpeg would
+    # block writing them while we block reading frames
+    stderr_chunks = []
+    stderr_reader = threading.Thread(target=lambda: stderr_chunks.extend(iter(lambda: process.stderr.read(65536), b'')),
+                                     daemon=True)
+    stderr_reader.start()
+    try:
+        while True:
+            buffer = process.stdout.read(frame_bytes * chunk_size)
+            if not buffer:
+                break
+            usable = len(buffer) - len(buffer) % frame_bytes
+            yield np.frombuffer(buffer[:usable], np.uint8).reshape([-1, height, width, 3])
+    finally:
+        process.stdout.close()
+        return_code = process.wait()
+        stderr_reader.join()
+        process.stderr.close()
+        stderr = b''.join(stderr_chunks)
+
+    if return_code != 0:
+        print(f"ffmpeg error: {stderr.decode()}")
+        raise ffmpeg.Error('ffmpeg', b'', stderr)
+
+
+class FrameStream:
+    """
+    Iterable over the same overlapping windows as `get_batches`, built from `stream_frames`
+    so only about one window of frames is held in memory at a time.
+
+    `num_frames` holds the number of decoded frames once the iteration is over.
+    """
+
+    def __init__(self, video_file_path: str, width: int = 48, height: int = 27, chunk_size: int = 500,
+                 window_size: int = 100, decode_options: Optional[DecodeOptions] = None):
+        self.video_file_path = video_file_path
+        self.decode_options = decode_options
+        self.width = width
+        self.height = height
+        self.chunk_size = chunk_size
+        self.window_size = window_size
+        self.num_frames = 0
+
+    def _chunks(self) -> Iterator[np.ndarray]:
+        """Chunks of (n, height, width, 3) RGB frames the windows are built from"""
+        return stream_frames(self.video_file_path, self.width, self.height, self.chunk_size,
+                             decode_options=self.decode_options)
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        window_size, stride = self.window_size, self.window_size - 50
+        self.num_frames = 0
+        pending = None
+        for chunk in self._chunks():
+            if len(chunk) == 0:
+                continue
+            if pending is None:
+                pending = np.repeat(chunk[:1], 25, axis=0)
+            self.num_frames += len(chunk)
+            pending = np.concatenate([pending, chunk], 0)
+            while len(pending) >= window_size:
+                yield pending[:window_size]
+                pending = pending[stride:]
+
+        if pending is None:
+            return
+
+        reminder = stride - self.num_frames % stride
+        if reminder == stride:
+            reminder = 0
+        pending = np.concatenate([pending, np.repeat(pending[-1:], reminder + 25, axis=0)], 0)
+        for i in range(0, len(pending) - 50, stride):
+            yield pending[i:i + window_size]
@@ -0,0 +1,115 @@
+"""
+Fast loading of the TransNetV2Supernet weights.
+
+The model is built on the meta device, so none of its random initialization runs, and the loaded tensors are
+assigned to it as they are. A training checkpoint still has to be unpickled and filtered on every start; the
+inference weights file written by `save_inference_weights` holds only the tensors the model uses, in the zip
+format, and is memory-mapped: loading it reads almost nothing, and worker processes on the same machine share
+its pages through the page cache.
+
+    python -m AutoShot.weights --weights ./AutoShot/model_weight/ckpt_0_200_0.pth \\
+        --output ./AutoShot/model_weight/autoshot_inference.pt
+"""
+import argparse
+import contextlib
+import os
+import zipfile
+from typing import Dict, List, Optional
+
+import torch
+from torch.overrides import TorchFunctionMode
+
+from .supernet import TransNetV2Supernet
+
+
+def load_state_dict(weights_path: str, device: str = "cpu") -> Dict[str, torch.Tensor]:
+    """Load the weights of a training checkpoint or of an inference weights file
+
+    Zip-format files are memory-mapped when loaded on CPU. Training checkpoints keep their weights under 'net'.
+    """
+    mmap = device == "cpu" and zipfile.is_zipfile(weights_path)
+    state_dict = torch.load(weights_path, map_location=device, weights_only=True, mmap=mmap)
+    return state_dict.get("net", state_dict)
+
+
+class _SkipMetaNormalInit(TorchFunctionMode):
+    """Skip the normal initializers on meta tensors: they have no native normal_ kernel and its Python fallback
+    imports torch._dynamo, which costs seconds per process. Function modes are thread-local, so modules built
+    by other threads meanwhile are initialized as usual"""
+
+    SKIPPED = (torch.Tensor.normal_, torch.nn.init.normal_, torch.nn.init.kaiming_normal_, torch.nn.init.xavier_normal_)
+
+    def __torch_function__(self, func, types, args=(), kwargs=None):
+        if func in self.SKIPPED and args and isinstance(args[0], torch.Tensor) and args[0].is_meta:
+            return args[0]
+        return func(*args, **(kwargs or {}))
+
+
+@contextlib.contextmanager
+def _meta_init():
+    """Build modules on the meta device, without running their random initialization"""
+    with torch.device("meta"), _SkipMetaNormalInit():
+        yield
+
+
+def build_model(weights_path: str, device: str = "cpu", **model_kwargs) -> TransNetV2Supernet:
+    """Build an eval-mode TransNetV2Supernet holding the weights of `weights_path`, without initializing it first
+
+    Args:
+        weights_path (str): Training checkpoint or inference weights file
+        device (str, optional): Device to load the weights on. Defaults to "cpu".
+        **model_kwargs: Passed to TransNetV2Supernet
+
+    Returns:
+        TransNetV2Supernet: loaded model, on `device`
+    """
+    with _meta_init():
+        model = TransNetV2Supernet(**model_kwargs).eval()
+    model_keys = model.state_dict().keys()
+    state_dict = {k: v for k, v in load_state_dict(weights_path, device).items() if k in model_keys}
+    print(f"Current model has {len(model_keys)} params, Updating {len(state_dict)} params")
+
+    missing = [k for k in model_keys if k not in state_dict]
+    if missing:
+        # the checkpoint does not cover the whole model: fall back to the initialized model for the rest
+        model = TransNetV2Supernet(**model_kwargs).eval()
+        model_dict = model.state_dict()
+        model_dict.update(state_dict)
+        model.load_state_dict(model_dict)
+        return model.to(device)
+
+    model.load_state_dict(state_dict, assign=True)
+    return model
+
+
+def save_inference_weights(pretrained_path: str, output_path: str) -> int:
+    """Write the tensors of a training checkpoint that TransNetV2Supernet uses, in the mmap-able zip format
+
+    Returns:
+        int: Number of tensors written
+    """
+    with _meta_init():
+        model_keys = TransNetV2Supernet().state_dict().keys()
+    state_dict = load_state_dict(pretrained_path)
+    state_dict = {k: v.contiguous() for k, v in state_dict.items() if k in model_keys}
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    torch.save(state_dict, tmp_path)
+    os.replace(tmp_path, output_path)
+    return len(state_dict)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default="./AutoShot/model_weight/ckpt_0_200_0.pth")
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args(argv)
+
+    count = save_inference_weights(args.weights, args.output)
+    print(f"Saved {count} tensors to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
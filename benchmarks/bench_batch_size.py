@@ -0,0 +1,57 @@
+"""
+Compare AutoShot inference throughput (frames/sec) across window batch sizes.
+
+Run from the repository root:
+    python -m benchmarks.bench_batch_size --weights ./AutoShot/model_weight/ckpt_0_200_0.pth --batch-sizes 1 2 4 8
+"""
+import argparse
+import time
+
+import numpy as np
+
+from AutoShot.model import AutoShot
+
+
+def bench_batch_sizes(shot_detector: AutoShot, frames: np.ndarray, batch_sizes, repeats: int = 1) -> dict:
+    reference = None
+    results = {}
+    for batch_size in batch_sizes:
+        shot_detector.batch_size = batch_size
+        shot_detector.detect_shots(frames=frames[:100])  # warm up
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            predictions = shot_detector.detect_shots(frames=frames)
+        elapsed = (time.perf_counter() - start) / repeats
+
+        if reference is None:
+            reference = predictions
+        results[batch_size] = {
+            "seconds": elapsed,
+            "frames_per_sec": len(frames) / elapsed,
+            "max_abs_diff": float(np.abs(predictions - reference).max()),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default="./AutoShot/model_weight/ckpt_0_200_0.pth")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--num-frames", type=int, default=1000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeats", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frames = rng.integers(0, 256, size=(args.num_frames, 27, 48, 3), dtype=np.uint8)
+    shot_detector = AutoShot(args.weights, device=args.device)
+
+    results = bench_batch_sizes(shot_detector, frames, args.batch_sizes, repeats=args.repeats)
+    print(f"{'batch_size':>10} {'seconds':>10} {'frames/sec':>12} {'max_abs_diff':>14}")
+    for batch_size, result in results.items():
+        print(f"{batch_size:>10} {result['seconds']:>10.2f} {result['frames_per_sec']:>12.1f} {result['max_abs_diff']:>14.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Compare the ffmpeg decoding options of `get_frames` on a synthetic clip generated locally with ffmpeg's testsrc2
+source: decoded frames/sec, number of frames, and mean absolute pixel difference from the default decode
+(when the frame counts match). Use it to pick `DecodeOptions` for `AutoShot(decode_options=...)`: options
+that change the pixels also change the predictions, so check those with bench_window_size-style drift first.
+
+Run from the repository root:
+    python -m benchmarks.bench_decode --duration 60 --size 1920x1080 --codec libx264
+    python -m benchmarks.bench_decode --codec mpeg4   # a codec lowres decoding applies to
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import ffmpeg
+import numpy as np
+
+from AutoShot.utils import DecodeOptions, get_frames
+
+
+def make_clip(path: str, duration: float, size: str, rate: int, codec: str) -> None:
+    (
+        ffmpeg
+        .input(f"testsrc2=size={size}:rate={rate}", f="lavfi", t=duration)
+        .output(path, vcodec=codec, pix_fmt="yuv420p", g=rate * 10)
+        .overwrite_output()
+        .run(quiet=True)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", default=None, help="Video to decode, a synthetic clip if omitted")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--size", default="1280x720")
+    parser.add_argument("--rate", type=int, default=25)
+    parser.add_argument("--codec", default="libx264")
+    parser.add_argument("--hwaccel", default=None, help="Also time this hardware decoding API, e.g. cuda")
+    args = parser.parse_args()
+
+    configs = [
+        ("default", DecodeOptions()),
+        ("threads=1", DecodeOptions(threads=1)),
+        (f"threads={os.cpu_count()}", DecodeOptions(threads=os.cpu_count())),
+        ("sws=fast_bilinear", DecodeOptions(sws_flags="fast_bilinear")),
+        ("sws=area", DecodeOptions(sws_flags="area")),
+        ("skip=noref", DecodeOptions(skip_frame="noref")),
+        ("skip=nokey", DecodeOptions(skip_frame="nokey")),
+        ("lowres=1", DecodeOptions(lowres=1)),
+        ("lowres=2", DecodeOptions(lowres=2)),
+        ("segment", DecodeOptions(start_time=args.duration / 2, duration=min(5.0, args.duration / 4))),
+    ]
+    if args.hwaccel:
+        configs.append((f"hwaccel={args.hwaccel}", DecodeOptions(hwaccel=args.hwaccel)))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        video = args.video
+        if video is None:
+            video = os.path.join(tmp_dir, "testsrc2.mp4")
+            make_clip(video, args.duration, args.size, args.rate, args.codec)
+
+        reference = None
+        print(f"{'options':>20} {'frames':>7} {'seconds':>8} {'frames/sec':>11} {'mean_abs_diff':>14}")
+        for name, options in configs:
+            start = time.perf_counter()
+            try:
+                frames = get_frames(video, decode_options=options)
+            except ffmpeg.Error:
+                print(f"{name:>20} {'failed':>7}")
+                continue
+            elapsed = time.perf_counter() - start
+            if reference is None:
+                reference = frames
+            diff = f"{np.abs(frames.astype(np.int16) - reference).mean():.3f}" if frames.shape == reference.shape else "-"
+            print(f"{name:>20} {len(frames):>7} {elapsed:>8.2f} {len(frames) / elapsed:>11.1f} {diff:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Check that the 'banded' similarity kernel matches the 'gather' one, and time both on the frame similarity
+and color histogram layers, for growing window lengths. The gather kernel builds the full
+[time, time] similarity matrix before picking the 101-frame band out of it, so its cost grows
+quadratically with the window; the banded kernel only computes the band.
+
+Run from the repository root:
+    python -m benchmarks.bench_similarity --window-sizes 100 200 500 1000
+"""
+import argparse
+import time
+
+import torch
+
+from AutoShot.supernet import band_similarities
+
+
+def _time(fn, repeats):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--window-sizes", type=int, nargs="+", default=[100, 200, 500, 1000])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--lookup-window", type=int, default=101)
+    args = parser.parse_args()
+
+    generator = torch.Generator().manual_seed(0)
+    print(f"{'layer':>10} {'window':>7} {'gather_ms':>10} {'banded_ms':>10} {'speedup':>8} {'max_abs_diff':>13}")
+    # FrameSimilarity projects to 128 channels, ColorHistograms has 512 bins, both L2-normalized
+    for layer, channels in (("frame_sim", 128), ("color_hist", 512)):
+        for window_size in args.window_sizes:
+            x = torch.rand(args.batch_size, window_size, channels, generator=generator).to(args.device)
+            x = torch.nn.functional.normalize(x, p=2, dim=2)
+            with torch.no_grad():
+                gathered = band_similarities(x, args.lookup_window, kernel="gather", device=args.device)
+                banded = band_similarities(x, args.lookup_window, kernel="banded", device=args.device)
+                diff = (gathered - banded).abs().max().item()
+                if diff > 1e-5:
+                    raise AssertionError(f"banded kernel differs from gather by {diff} for {layer}, window {window_size}")
+                gather_time = _time(lambda: band_similarities(x, args.lookup_window, "gather", args.device), args.repeats)
+                banded_time = _time(lambda: band_similarities(x, args.lookup_window, "banded", args.device), args.repeats)
+            print(f"{layer:>10} {window_size:>7} {gather_time * 1e3:>10.2f} {banded_time * 1e3:>10.2f} "
+                  f"{gather_time / banded_time:>8.2f} {diff:>13.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+End-to-end benchmark of `VideoProcessor.process_videos` on synthetic videos generated locally with ffmpeg, with
+a comparison against a stored baseline that fails on regressions.
+
+Every video is a concatenation of lavfi test sources (testsrc2, smptebars, solid colors, mandelbrot, ...) cut at
+known frame indices, so the run also checks the detected cuts (boundary precision/recall/F1 within
+`--cut-tolerance` frames). Stage timings come from the profiler of `VideoProcessor`, the cuts from its scene
+index, and the peak RSS from a separate process per run. Reported metrics:
+
+    decode_fps                 frames decoded per second of ffmpeg decoding
+    inference_windows_per_sec  inference windows per second of forward passes
+    keyframes_per_sec          keyframes extracted per second of keyframe seeking, encoding and writing
+    end_to_end_fps             frames per second of the whole process_videos call
+    peak_rss_mb                peak resident memory of the benchmark process
+    cut_precision, cut_recall, cut_f1
+
+Run from the repository root:
+    python -m benchmarks.bench_suite run --weights ./AutoShot/model_weight/ckpt_0_200_0.pth --output baseline.json
+    # after a change
+    python -m benchmarks.bench_suite run --weights ./AutoShot/model_weight/ckpt_0_200_0.pth --output current.json
+    python -m benchmarks.bench_suite compare baseline.json current.json --tolerance 0.1
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import queue
+import resource
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import ffmpeg
+import numpy as np
+
+# (name, width, height, frames), every video at 25 fps
+VIDEOS = [
+    ("short_180p", 320, 180, 250),
+    ("medium_360p", 640, 360, 1500),
+    ("long_720p", 1280, 720, 3000),
+]
+QUICK_VIDEOS = [
+    ("short_180p", 320, 180, 250),
+    ("medium_360p", 640, 360, 600),
+]
+# consecutive scenes use different sources, so every cut is a hard cut
+SOURCES = [
+    "testsrc2", "smptebars", "color=c=0x2060a0", "mandelbrot", "rgbtestsrc", "color=c=0xc04020",
+    "smptehdbars", "testsrc", "color=c=0x30a040", "yuvtestsrc",
+]
+HIGHER_IS_BETTER = ("decode_fps", "inference_windows_per_sec", "keyframes_per_sec", "end_to_end_fps")
+LOWER_IS_BETTER = ("peak_rss_mb",)
+ACCURACY = ("cut_precision", "cut_recall", "cut_f1")
+
+
+def scene_lengths(num_frames: int, rng: np.random.Generator, min_length: int = 40, max_length: int = 200) -> List[int]:
+    lengths = []
+    while sum(lengths) < num_frames:
+        lengths.append(int(rng.integers(min_length, max_length)))
+    lengths[-1] -= sum(lengths) - num_frames
+    if lengths[-1] < min_length and len(lengths) > 1:
+        lengths[-2] += lengths.pop()
+    return lengths
+
+
+def make_video(path: str, width: int, height: int, lengths: List[int], rate: int = 25) -> List[int]:
+    """Write a video of consecutive test-source scenes of the given frame counts
+
+    Returns:
+        List[int]: First frame of every scene but the first, the cuts
+    """
+    segments = []
+    for i, length in enumerate(lengths):
+        source = SOURCES[i % len(SOURCES)]
+        separator = ":" if "=" in source else "="
+        segments.append(
+            ffmpeg.input(f"{source}{separator}size={width}x{height}:rate={rate}", f="lavfi")
+            .trim(end_frame=length)
+            .setpts("PTS-STARTPTS")
+        )
+    (
+        ffmpeg
+        .concat(*segments, v=1, a=0)
+        .output(path, vcodec="libx264", pix_fmt="yuv420p", g=rate * 10, r=rate)
+        .overwrite_output()
+        .run(quiet=True)
+    )
+    return np.cumsum(lengths)[:-1].tolist()
+
+
+def make_videos(video_dir: str, videos, seed: int = 0) -> Dict[str, List[int]]:
+    """Generate the benchmark videos, returns the cuts of every video path"""
+    rng = np.random.default_rng(seed)
+    cuts = {}
+    for name, width, height, num_frames in videos:
+        path = os.path.join(video_dir, f"{name}.mp4")
+        cuts[path] = make_video(path, width, height, scene_lengths(num_frames, rng))
+    return cuts
+
+
+def _scenes_from_cuts(cuts: List[int], num_frames: int) -> np.ndarray:
+    starts = [0] + list(cuts)
+    ends = [cut - 1 for cut in cuts] + [num_frames - 1]
+    return np.array(list(zip(starts, ends)))
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_once(weights: str, video_dir: str, work_dir: str, threads: int, batch_size: int, results) -> None:
+    import torch
+    from process_video import VideoProcessor
+
+    torch.set_num_threads(threads)
+    index_path = os.path.join(work_dir, "scenes.jsonl")
+    processor = VideoProcessor(weights, os.path.join(work_dir, "keyframes"), batch_size=batch_size,
+                               scene_index_path=index_path, profile_dir=os.path.join(work_dir, "profile"))
+    shot_detector = processor.shot_detector
+    # warm up, so the first forward pass of the run is not timed
+    shot_detector.predict_batch(np.zeros((batch_size, shot_detector.window_size, 27, 48, 3), dtype=np.uint8))
+
+    start = time.perf_counter()
+    processor.process_videos(video_dir)
+    seconds = time.perf_counter() - start
+
+    scenes: Dict[str, List[List[int]]] = {}
+    with open(index_path, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            scenes.setdefault(record["video"], []).append([record["start_frame"], record["end_frame"]])
+    results.put((processor.profiler.summary(), scenes, seconds, _peak_rss_mb(), shot_detector.window_stride))
+
+
+def _wait_result(process, results, repeat: int):
+    # a run that raises or gets killed never puts its result, don't wait for it forever
+    while True:
+        try:
+            return results.get(timeout=5)
+        except queue.Empty:
+            if not process.is_alive():
+                break
+    try:
+        # the result may have been put right before the process exited
+        return results.get(timeout=1)
+    except queue.Empty:
+        process.join()
+        raise RuntimeError(f"Benchmark run {repeat} exited with code {process.exitcode} without a result")
+
+
+def run_suite(
+    weights: str,
+    quick: bool = False,
+    repeats: int = 1,
+    threads: int = 1,
+    batch_size: int = 1,
+    cut_tolerance: int = 2,
+    seed: int = 0
+) -> Dict[str, Any]:
+    """Generate the videos and benchmark `VideoProcessor.process_videos` on them, each repeat in a fresh process
+
+    Returns:
+        Dict[str, Any]: Environment, configuration, median metrics over the repeats and per-video cut scores
+    """
+    videos = QUICK_VIDEOS if quick else VIDEOS
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        video_dir = os.path.join(tmp_dir, "videos")
+        os.makedirs(video_dir)
+        cuts = make_videos(video_dir, videos, seed=seed)
+        num_frames = {os.path.join(video_dir, f"{name}.mp4"): frames for name, _, _, frames in videos}
+
+        context = mp.get_context("spawn")
+        for repeat in range(repeats):
+            results = context.Queue()
+            work_dir = os.path.join(tmp_dir, f"run_{repeat}")
+            process = context.Process(target=_run_once,
+                                      args=(weights, video_dir, work_dir, threads, batch_size, results))
+            process.start()
+            runs.append(_wait_result(process, results, repeat))
+            process.join()
+            if process.exitcode != 0:
+                raise RuntimeError(f"Benchmark run {repeat} failed with exit code {process.exitcode}")
+
+    from AutoShot.quantization import boundaries_f1
+
+    metrics: Dict[str, List[float]] = {}
+    per_video: Dict[str, Dict[str, Any]] = {}
+    for summary, scenes, seconds, peak_rss_mb, stride in runs:
+        stages = summary["stages"]
+        frames = sum(num_frames.values())
+        windows = sum(-(-n // stride) for n in num_frames.values())
+        keyframe_seconds = sum(stages.get(stage, {}).get("total_seconds", 0.0)
+                               for stage in ("keyframes.seek", "keyframes.decode", "keyframes.write", "keyframes.flush"))
+        keyframes = stages.get("keyframes.write", {}).get("calls", 0)
+        scores = []
+        for path, video_cuts in cuts.items():
+            reference = _scenes_from_cuts(video_cuts, num_frames[path])
+            detected = np.array(scenes.get(path, [[0, num_frames[path] - 1]]))
+            score = boundaries_f1(reference, detected, tolerance=cut_tolerance)
+            scores.append(score)
+            per_video[os.path.basename(path)] = {"frames": num_frames[path], "cuts": video_cuts,
+                                                 "detected_cuts": detected[1:, 0].tolist(), **score}
+        run_metrics = {
+            "decode_fps": frames / stages["decode"]["total_seconds"],
+            "inference_windows_per_sec": windows / stages["inference"]["total_seconds"],
+            "keyframes_per_sec": keyframes / keyframe_seconds if keyframe_seconds > 0 else 0.0,
+            "end_to_end_fps": frames / seconds,
+            "peak_rss_mb": peak_rss_mb,
+            # micro-averaged over the videos would favor the long ones
+            "cut_precision": float(np.mean([score["precision"] for score in scores])),
+            "cut_recall": float(np.mean([score["recall"] for score in scores])),
+            "cut_f1": float(np.mean([score["f1"] for score in scores])),
+        }
+        for name, value in run_metrics.items():
+            metrics.setdefault(name, []).append(value)
+
+    import torch
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {"weights": weights, "quick": quick, "repeats": repeats, "threads": threads,
+                   "batch_size": batch_size, "cut_tolerance": cut_tolerance, "seed": seed,
+                   "videos": [dict(zip(("name", "width", "height", "frames"), video)) for video in videos]},
+        "metrics": {name: float(np.median(values)) for name, values in metrics.items()},
+        "videos": per_video,
+    }
+
+
+def compare(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    tolerance: float = 0.1,
+    accuracy_tolerance: float = 0.0
+) -> List[Tuple[str, float, float, float, bool]]:
+    """Compare the metrics of two runs
+
+    Args:
+        baseline (Dict[str, Any]): Result of `run_suite` to compare against
+        current (Dict[str, Any]): Result of `run_suite` to check
+        tolerance (float, optional): Relative slowdown or memory growth allowed. Defaults to 0.1.
+        accuracy_tolerance (float, optional): Absolute drop of the cut scores allowed. Defaults to 0.
+
+    Returns:
+        List[Tuple[str, float, float, float, bool]]: (metric, baseline, current, relative change, regressed)
+    """
+    rows = []
+    for name in HIGHER_IS_BETTER + LOWER_IS_BETTER + ACCURACY:
+        if name not in baseline["metrics"] or name not in current["metrics"]:
+            continue
+        before, after = baseline["metrics"][name], current["metrics"][name]
+        change = (after - before) / before if before else 0.0
+        if name in HIGHER_IS_BETTER:
+            regressed = change < -tolerance
+        elif name in LOWER_IS_BETTER:
+            regressed = change > tolerance
+        else:
+            regressed = before - after > accuracy_tolerance + 1e-9
+        rows.append((name, before, after, change, regressed))
+    return rows
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Benchmark and write the results to JSON")
+    run.add_argument("--weights", default="./AutoShot/model_weight/ckpt_0_200_0.pth")
+    run.add_argument("--output", required=True)
+    run.add_argument("--quick", action="store_true", help="Two short videos instead of the full set")
+    run.add_argument("--repeats", type=int, default=1, help="Runs in fresh processes, the median is reported")
+    run.add_argument("--threads", type=int, default=1, help="torch threads, fixed for reproducible numbers")
+    run.add_argument("--batch-size", type=int, default=1)
+    run.add_argument("--cut-tolerance", type=int, default=2, help="Frames a detected cut may be off by")
+    run.add_argument("--seed", type=int, default=0)
+
+    check = commands.add_parser("compare", help="Compare results with a baseline, exit 1 on regressions")
+    check.add_argument("baseline")
+    check.add_argument("current")
+    check.add_argument("--tolerance", type=float, default=0.1, help="Relative slowdown or memory growth allowed")
+    check.add_argument("--accuracy-tolerance", type=float, default=0.0, help="Absolute drop of the cut scores allowed")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        result = run_suite(args.weights, quick=args.quick, repeats=args.repeats, threads=args.threads,
+                           batch_size=args.batch_size, cut_tolerance=args.cut_tolerance, seed=args.seed)
+        output_dir = os.path.dirname(args.output)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"{'metric':>26} {'value':>10}")
+        for name, value in result["metrics"].items():
+            print(f"{name:>26} {value:>10.3f}")
+        print(f"Saved results to {args.output}")
+        return
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, "r", encoding="utf-8") as f:
+        current = json.load(f)
+    if baseline.get("config", {}).get("videos") != current.get("config", {}).get("videos"):
+        print("Warning: the two runs used different videos")
+    if baseline.get("environment") != current.get("environment"):
+        print("Warning: the two runs come from different environments")
+
+    rows = compare(baseline, current, tolerance=args.tolerance, accuracy_tolerance=args.accuracy_tolerance)
+    print(f"{'metric':>26} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, before, after, change, regressed in rows:
+        print(f"{name:>26} {before:>10.3f} {after:>10.3f} {change:>+8.1%}{'  REGRESSION' if regressed else ''}")
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        sys.exit(f"Regressions: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Peak RSS of the windowing and tensor conversion that feed the model, with the previous copying implementation
+(the whole video concatenated with its padding, and a float copy of every batch) and the current view-based one
+(windows are views of the decoded frames, and uint8 batches go to torch as they are).
+
+Each variant runs in its own process; the reported peak is above the process's RSS once the frames are loaded.
+The model is left out: its activations cost the same in both variants.
+
+Run from the repository root:
+    python -m benchmarks.bench_window_memory --num-frames 200000
+    python -m benchmarks.bench_window_memory --video ./input_sample/x.mp4
+"""
+import argparse
+import multiprocessing as mp
+import resource
+import time
+
+import numpy as np
+import torch
+
+from AutoShot.utils import get_batches, get_frames
+
+
+def _copy_batches(frames: np.ndarray, window_size: int):
+    # get_batches before windows became views
+    stride = window_size - 50
+    reminder = stride - len(frames) % stride
+    if reminder == stride:
+        reminder = 0
+    frames = np.concatenate([frames[:1]] * 25 + [frames] + [frames[-1:]] * (reminder + 25), 0)
+    for i in range(0, len(frames) - 50, stride):
+        yield frames[i:i + window_size]
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run(variant: str, video: str, num_frames: int, window_size: int, batch_size: int, results) -> None:
+    if video:
+        frames = get_frames(video)
+    else:
+        frames = np.random.default_rng(0).integers(0, 256, size=(num_frames, 27, 48, 3), dtype=np.uint8)
+    baseline = _peak_rss_mb()
+
+    start = time.perf_counter()
+    windows = _copy_batches(frames, window_size) if variant == "copy" else get_batches(frames, window_size)
+    pending = []
+    for window in windows:
+        pending.append(window)
+        if len(pending) == batch_size:
+            batches, pending = np.stack(pending), []
+            if variant == "copy":
+                batch = torch.from_numpy(batches.transpose((0, 4, 1, 2, 3))) * 1.0
+            else:
+                batch = torch.from_numpy(batches).permute(0, 4, 1, 2, 3).contiguous()
+            # the first layer of the model
+            batch / 255.
+    results.put((variant, len(frames), baseline, _peak_rss_mb() - baseline, time.perf_counter() - start))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", default=None, help="Video to decode, random frames if omitted")
+    parser.add_argument("--num-frames", type=int, default=100000)
+    parser.add_argument("--window-size", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    context = mp.get_context("spawn")
+    results = context.Queue()
+    print(f"{'variant':>8} {'frames':>8} {'frames_mb':>10} {'baseline_mb':>12} {'peak_extra_mb':>14} {'seconds':>8}")
+    for variant in ("copy", "view"):
+        process = context.Process(target=_run, args=(variant, args.video, args.num_frames, args.window_size,
+                                                     args.batch_size, results))
+        process.start()
+        variant, num_frames, baseline, extra, seconds = results.get()
+        process.join()
+        frames_mb = num_frames * 27 * 48 * 3 / 2 ** 20
+        print(f"{variant:>8} {num_frames:>8} {frames_mb:>10.1f} {baseline:>12.1f} {extra:>14.1f} {seconds:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
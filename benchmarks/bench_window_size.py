@@ -0,0 +1,69 @@
+"""
+Compare inference window sizes: throughput (frames/sec) and drift of the predictions and scenes from the
+default 100-frame windows. Larger windows recompute fewer overlapping frames, but the convolutions and the
+similarity band see more context, so the predictions change. This is the equivalence check of a window size
+for a checkpoint: it exits with status 1 when a size drifts by more than --tolerance (AutoShot's
+WINDOW_DRIFT_TOLERANCE by default) or changes the scenes, on the given videos. `AutoShot(window_size=...,
+window_check_video=...)` runs the same check when a detector is built with a size other than 100.
+
+The drift is not limited to the padded ends of the video: on a random-weight checkpoint with randomized batch
+norm statistics, the largest per-frame difference from the 100-frame windows was 0.80 at 150, 0.76 at 200 and
+0.80 at 500 on one test clip, 0.23 at 150 on another, mostly on interior frames.
+
+Run from the repository root:
+    python -m benchmarks.bench_window_size --weights ./AutoShot/model_weight/ckpt_0_200_0.pth --video ./input_sample/x.mp4
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from AutoShot.model import AutoShot
+from AutoShot.utils import get_frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default="./AutoShot/model_weight/ckpt_0_200_0.pth")
+    parser.add_argument("--video", default=None, help="Video to run on, random frames if omitted")
+    parser.add_argument("--tolerance", type=float, default=AutoShot.WINDOW_DRIFT_TOLERANCE,
+                        help="Largest per-frame prediction difference from the 100-frame windows")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--num-frames", type=int, default=1000)
+    parser.add_argument("--window-sizes", type=int, nargs="+", default=[100, 200, 500])
+    parser.add_argument("--threshold", type=float, default=0.5)
+    args = parser.parse_args()
+
+    if args.video:
+        frames = get_frames(args.video)
+    else:
+        frames = np.random.default_rng(0).integers(0, 256, size=(args.num_frames, 27, 48, 3), dtype=np.uint8)
+    shot_detector = AutoShot(args.weights, device=args.device)
+
+    reference = None
+    failed = []
+    print(f"{'window':>7} {'seconds':>9} {'frames/sec':>11} {'max_abs_diff':>13} {'mean_abs_diff':>14} {'same_scenes':>12}")
+    # the 100-frame windows are the reference, always measured first
+    for window_size in [100] + [size for size in args.window_sizes if size != 100]:
+        shot_detector.window_size, shot_detector.window_stride = window_size, window_size - 50
+        start = time.perf_counter()
+        predictions = shot_detector.detect_shots(frames=frames)
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference = predictions
+        scenes = AutoShot.predictions_to_scenes(predictions, args.threshold)
+        reference_scenes = AutoShot.predictions_to_scenes(reference, args.threshold)
+        same_scenes = scenes.shape == reference_scenes.shape and bool((scenes == reference_scenes).all())
+        diff = np.abs(predictions - reference)
+        print(f"{window_size:>7} {elapsed:>9.2f} {len(frames) / elapsed:>11.1f} {diff.max():>13.2e} {diff.mean():>14.2e} {str(same_scenes):>12}")
+        if diff.max() > args.tolerance or not same_scenes:
+            failed.append(window_size)
+
+    if failed:
+        print(f"Window sizes beyond the tolerance of {args.tolerance} or changing the scenes: {failed}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
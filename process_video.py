@@ -1,40 +1,206 @@
 import os
-from typing import Dict, Any, Iterator, Deque
-from collections import deque
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
 from AutoShot.model import AutoShot
 from AutoShot.keyframe_extractor import KeyFrameExtractor
+from AutoShot.keyframe_store import ArrayStoreSink, TarShardSink
+from AutoShot.discovery import VideoMetadata, discover_videos, scan_videos
+from AutoShot.fused_decode import FusedDecoder
+from AutoShot.profiling import NULL_PROFILER, Profiler
+from AutoShot.scheduler import CrossVideoBatchScheduler
+from AutoShot.scene_index import SceneIndexWriter
+from AutoShot.utils import video_frame_info
 from tqdm import tqdm
 
+@dataclass
+class StageStats:
+    """Counters of one pipeline stage, used to size its worker count and queue"""
+    name: str
+    workers: int
+    items: int = 0
+    busy_seconds: float = 0.0
+    input_stall_seconds: float = 0.0
+    output_stall_seconds: float = 0.0
+    max_queue_depth: int = 0
+    total_queue_depth: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self, *, busy: float = 0.0, input_stall: float = 0.0, output_stall: float = 0.0, queue_depth: Optional[int] = None) -> None:
+        with self.lock:
+            self.busy_seconds += busy
+            self.input_stall_seconds += input_stall
+            self.output_stall_seconds += output_stall
+            if queue_depth is not None:
+                self.items += 1
+                self.total_queue_depth += queue_depth
+                self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+
+    @property
+    def mean_queue_depth(self) -> float:
+        return self.total_queue_depth / self.items if self.items else 0.0
+
+    def summary(self) -> str:
+        return (f"{self.name:<10} workers={self.workers} items={self.items} busy={self.busy_seconds:.1f}s "
+                f"input_stall={self.input_stall_seconds:.1f}s output_stall={self.output_stall_seconds:.1f}s "
+                f"queue_depth(mean/max)={self.mean_queue_depth:.2f}/{self.max_queue_depth}")
+
+
 class VideoProcessor:
-    def __init__(self, pretrained_model_path: str, keyframe_dir: str):
-        self.shot_detector = AutoShot(pretrained_model_path)
-        self.keyframe_extractor = KeyFrameExtractor(keyframe_dir)
+    def __init__(
+        self,
+        pretrained_model_path: str,
+        keyframe_dir: str,
+        streaming: bool = False,
+        batch_size: int = 1,
+        sequential_keyframes: bool = False,
+        fused_decode: bool = False,
+        fused_buffer_mb: int = 512,
+        keyframe_format: str = 'jpg',
+        keyframe_quality: int = 95,
+        keyframe_writer_workers: int = 0,
+        prediction_cache_dir: Optional[str] = None,
+        precompute_histograms: bool = False,
+        chunk_workers: int = 1,
+        scene_index_path: Optional[str] = None,
+        profile_dir: Optional[str] = None,
+        profile_format: str = 'json',
+        profile_layers: bool = False,
+        metadata_index_path: Optional[str] = None,
+        discovery_workers: int = 8,
+        keyframe_store: Optional[str] = None,
+        keyframe_shard_size: int = 10000,
+        keyframe_array_size: Tuple[int, int] = (224, 224),
+        cascade_threshold: Optional[float] = None,
+        precision: str = 'fp32',
+        threshold: float = 0.5
+    ):
+        # per-video stage timings under profile_dir/videos, and their p50/p95 in profile_dir/summary
+        self.profiler = Profiler(profile_dir, profile_format, layer_hooks=profile_layers) if profile_dir else NULL_PROFILER
+        self.shot_detector = AutoShot(
+            pretrained_model_path,
+            streaming=streaming,
+            batch_size=batch_size,
+            precompute_histograms=precompute_histograms,
+            cache_dir=prediction_cache_dir,
+            chunk_workers=chunk_workers,
+            profiler=self.profiler,
+            # applied by every mode, including the pooled batches and the fused decode
+            cascade_threshold=cascade_threshold,
+            precision=precision
+        )
+        # scene threshold on the predictions, calibrate it for reduced precisions with `python -m AutoShot.quantization`
+        self.threshold = threshold
+        self.keyframe_extractor = KeyFrameExtractor(
+            keyframe_dir,
+            sequential=sequential_keyframes,
+            image_format=keyframe_format,
+            quality=keyframe_quality,
+            writer_workers=keyframe_writer_workers,
+            profiler=self.profiler,
+            sink=self._keyframe_sink(keyframe_store, keyframe_dir, keyframe_format, keyframe_quality,
+                                     keyframe_shard_size, keyframe_array_size)
+        )
+        self.fused_decoder = FusedDecoder(
+            self.shot_detector, self.keyframe_extractor, buffer_mb=fused_buffer_mb, threshold=threshold
+        ) if fused_decode else None
+        # one record per scene, with its timestamps, keyframe paths and boundary probability
+        self.scene_index = SceneIndexWriter(scene_index_path) if scene_index_path else None
+        # with a metadata index, the videos are probed (and the probes cached in it) to process them longest first
+        # with a frame-based ETA; without one, they are processed in path order and not opened before their turn
+        self.metadata_index_path = metadata_index_path
+        self.discovery_workers = discovery_workers
+
+    @staticmethod
+    def _keyframe_sink(store: Optional[str], keyframe_dir: str, image_format: str, quality: int, shard_size: int,
+                       array_size: Tuple[int, int]):
+        # 'tar' packs the encoded keyframes into tar shards, 'array' into .npy shards of resized frames
+        if store is None or store == 'files':
+            return None
+        if store == 'tar':
+            return TarShardSink(keyframe_dir, image_format=image_format, quality=quality, shard_max_count=shard_size)
+        if store == 'array':
+            return ArrayStoreSink(keyframe_dir, size=array_size, shard_max_count=shard_size)
+        raise ValueError(f"Unsupported keyframe store: {store}, expected one of ['files', 'tar', 'array']")
+
+    def _discover_videos(self, input_dir: str) -> List[VideoMetadata]:
+        if self.metadata_index_path is None:
+            return [VideoMetadata(path, 0, 0) for path in scan_videos(input_dir, self.discovery_workers)]
+        videos = discover_videos(input_dir, self.metadata_index_path, self.discovery_workers)
+        unknown = sum(1 for video in videos if video.frame_count == 0)
+        if unknown:
+            print(f"{unknown} videos have an unknown frame count, they are processed last")
+        return videos
+
+    @property
+    def _video_order(self) -> str:
+        return "in path order" if self.metadata_index_path is None else "longest first"
+
+    def _frame_progress(self, videos: List[VideoMetadata]) -> tqdm:
+        if self.metadata_index_path is None:
+            return tqdm(total=len(videos), desc="Overall Progress", unit="video")
+        return tqdm(total=sum(video.frame_count for video in videos), desc="Overall Progress", unit="frame",
+                    unit_scale=True)
+
+    def _progress_step(self, video: VideoMetadata) -> int:
+        # the progress counts frames when the videos were probed, videos otherwise
+        return 1 if self.metadata_index_path is None else video.frame_count
+
+    def _predictions_to_scenes(self, predictions) -> List[List[int]]:
+        return self.shot_detector.predictions_to_scenes(predictions=predictions, threshold=self.threshold).tolist()
+
+    def _save_scene_keyframes(self, *, video_path: str, relative_path: str, scenes) -> None:
+        if scenes:
+            print(f"Detected {len(scenes)} scenes in {relative_path}")
+            video_keyframe_dir = os.path.join(self.keyframe_extractor.keyframe_dir, os.path.dirname(relative_path))
+            self.keyframe_extractor.extract_keyframes(video_path, scenes, relative_path)
+            print(f"Finished extracting keyframes for {relative_path}")
+            print(f"Keyframes saved in: {video_keyframe_dir}")
+        else:
+            print(f"No scenes detected in video: {relative_path}")
+
+    def _index_scenes(self, *, video_path: str, relative_path: str, scenes, predictions=None) -> None:
+        if self.scene_index is None or not scenes:
+            return
+        with self.profiler.stage("scene_index"):
+            fps, _ = video_frame_info(video_path)
+            keyframes = self.keyframe_extractor.scene_keyframe_paths(scenes, relative_path)
+            self.scene_index.append(SceneIndexWriter.scene_records(video_path, scenes, fps, keyframes, predictions))
+
+    def _close_keyframes(self) -> None:
+        # run in a finally block by every mode, so the writer threads and the open shard are released on errors too
+        self.keyframe_extractor.close()
+        sink = self.keyframe_extractor.sink
+        if sink is not None:
+            sink.close()
+            print(f"Keyframe store: {sink.keyframes_written} keyframes in {sink.output_dir}")
+
+    def _close_scene_index(self) -> None:
+        if self.scene_index is not None:
+            self.scene_index.close()
+            print(f"Scene index: {self.scene_index.records_written} scenes in {self.scene_index.index_path}")
+
+    def _report_profile(self) -> None:
+        if self.profiler.enabled:
+            print(Profiler.format_summary(self.profiler.write_summary()))
 
-    def _bfs_get_video_paths(self, input_dir: str) -> Iterator[str]:
-        
-        video_extensions = ('.mp4', '.avi', '.mov', '.mkv')
-        queue: Deque[str] = deque([input_dir])
-
-        while queue:
-            current_dir = queue.popleft()
-            with os.scandir(current_dir) as entries:
-                for entry in entries:
-                    if entry.is_dir():
-                        queue.append(entry.path)
-                    elif entry.is_file() and entry.name.lower().endswith(video_extensions):
-                        yield entry.path
-    
     def _process_single_video(self, *, video_path: str, relative_path: str) -> None:
         try:
-            scenes = self.shot_detector.process_video(video_path=video_path)
-            if scenes:
+            if self.fused_decoder is not None:
+                scenes, predictions = self.fused_decoder.process_video(
+                    video_path=video_path, output_prefix=relative_path, return_predictions=True)
                 print(f"Detected {len(scenes)} scenes in {relative_path}")
-                video_keyframe_dir = os.path.join(self.keyframe_extractor.keyframe_dir, os.path.dirname(relative_path))
-                self.keyframe_extractor.extract_keyframes(video_path, scenes, relative_path)
-                print(f"Finished extracting keyframes for {relative_path}")
-                print(f"Keyframes saved in: {video_keyframe_dir}")
-            else:
-                print(f"No scenes detected in video: {relative_path}")
+                print(f"Keyframes saved in: {os.path.join(self.keyframe_extractor.keyframe_dir, relative_path)}")
+                self._index_scenes(video_path=video_path, relative_path=relative_path, scenes=scenes,
+                                   predictions=predictions)
+                return
+            scenes, predictions = self.shot_detector.process_video(video_path=video_path, threshold=self.threshold,
+                                                                   return_predictions=True)
+            self._save_scene_keyframes(video_path=video_path, relative_path=relative_path, scenes=scenes)
+            self._index_scenes(video_path=video_path, relative_path=relative_path, scenes=scenes,
+                               predictions=predictions)
         except FileNotFoundError as e:
             print(f"File not found: {str(e)}")
         except ValueError as e:
@@ -45,25 +211,241 @@ class VideoProcessor:
     
     def process_videos(self, input_dir: str)-> None:
         
-        video_paths = list(self._bfs_get_video_paths(input_dir))
-        total_videos = len(video_paths)
+        videos = self._discover_videos(input_dir)
+        total_videos = len(videos)
 
 
         print("\n----------------")
-        print(f"Starting to process {total_videos} videos")
+        print(f"Starting to process {total_videos} videos, {self._video_order}")
         print("----------------\n")
 
-        for video_path in tqdm(video_paths, desc="Overall Progress", unit="video"):
-            relative_path = os.path.relpath(video_path, input_dir)
-            print(f"\nProcessing: {relative_path}")
-            print("---------------- ")
+        try:
+            progress = self._frame_progress(videos)
+            for video in videos:
+                video_path = video.path
+                relative_path = os.path.relpath(video_path, input_dir)
+                print(f"\nProcessing: {relative_path}")
+                print("---------------- ")
+
+                try:
+                    with self.profiler.video(video_path):
+                        self._process_single_video(video_path= video_path, relative_path= relative_path)
 
-            try:
-                self._process_single_video(video_path= video_path, relative_path= relative_path)
+                except Exception as e:
+                     print(f"Error processing video {relative_path}: {str(e)}")
+                self.profiler.finish_video(video_path, relative_path)
+                progress.update(self._progress_step(video))
+                print("----------------\n")
+            progress.close()
+        finally:
+            self._close_keyframes()
+        self._close_scene_index()
+        self._report_profile()
 
-            except Exception as e:
-                 print(f"Error processing video {relative_path}: {str(e)}")
-            print("----------------\n")
+    def process_videos_batched(self, input_dir: str, batch_size: Optional[int] = None) -> None:
+        """Process every video under input_dir, pooling the windows of consecutive videos into shared
+        inference batches so that short clips still fill the model batch
 
+        Args:
+            input_dir (str): Directory scanned for videos
+            batch_size (Optional[int], optional): Windows per forward pass. Defaults to the detector's batch_size.
+        """
+        videos = self._discover_videos(input_dir)
+        scheduler = CrossVideoBatchScheduler(self.shot_detector, batch_size=batch_size)
 
-    
\ No newline at end of file
+        print("\n----------------")
+        print(f"Starting to process {len(videos)} videos, {scheduler.batch_size} windows per batch")
+        print("----------------\n")
+
+        # videos whose predictions come from the pooled batches, to store in the prediction cache
+        pooled = set()
+
+        def finish(completed) -> None:
+            for video_path, predictions in completed:
+                relative_path = os.path.relpath(video_path, input_dir)
+                try:
+                    if video_path in pooled:
+                        pooled.discard(video_path)
+                        self.shot_detector.cache_predictions(video_path, predictions)
+                    with self.profiler.video(video_path):
+                        scenes = self._predictions_to_scenes(predictions)
+                        self._save_scene_keyframes(video_path=video_path, relative_path=relative_path, scenes=scenes)
+                        self._index_scenes(video_path=video_path, relative_path=relative_path, scenes=scenes,
+                                           predictions=predictions)
+                except Exception as e:
+                    print(f"Error processing video {relative_path}: {str(e)}")
+                self.profiler.finish_video(video_path, relative_path)
+
+        try:
+            progress = self._frame_progress(videos)
+            for video in videos:
+                video_path = video.path
+                relative_path = os.path.relpath(video_path, input_dir)
+                try:
+                    with self.profiler.video(video_path):
+                        predictions = self.shot_detector.cached_predictions(video_path)
+                        if predictions is not None:
+                            self.profiler.count("frames", len(predictions))
+                            completed = [(video_path, predictions)]
+                        elif not self.shot_detector.decodes_whole_videos:
+                            # streamed or chunked decoding can't be pooled, the detector runs these videos on its own
+                            completed = [(video_path, self.shot_detector.video_predictions(video_path))]
+                        else:
+                            frames = self.shot_detector.decode_frames(video_path)
+                            self.profiler.count("frames", len(frames))
+                            pooled.add(video_path)
+                            # pooled batches are timed for the video that filled them
+                            completed = scheduler.add_video(video_path, frames)
+                    finish(completed)
+                except Exception as e:
+                    print(f"Error processing video {relative_path}: {str(e)}")
+                    self.profiler.finish_video(video_path, relative_path)
+                progress.update(self._progress_step(video))
+
+            progress.close()
+            finish(scheduler.flush())
+        finally:
+            self._close_keyframes()
+        self._close_scene_index()
+        self._report_profile()
+
+    def process_videos_pipelined(
+        self,
+        input_dir: str,
+        decode_workers: int = 1,
+        keyframe_workers: int = 1,
+        queue_size: int = 2
+    ) -> Dict[str, StageStats]:
+        """Process every video under input_dir as a three-stage pipeline: ffmpeg decoding, shot detection and
+        keyframe writing run in their own threads, connected by bounded queues, so video N+1 decodes while
+        video N is in inference and video N-1 is writing keyframes
+
+        Args:
+            input_dir (str): Directory scanned for videos
+            decode_workers (int, optional): Number of decoding threads. Defaults to 1.
+            keyframe_workers (int, optional): Number of keyframe writing threads. Defaults to 1.
+            queue_size (int, optional): Capacity of the queues between the stages. Defaults to 2.
+
+        Returns:
+            Dict[str, StageStats]: Per-stage counters. The queue depth of a stage is sampled on its input queue
+            every time it takes an item; input stall is time spent waiting for upstream, output stall is time
+            blocked on a full downstream queue.
+        """
+        videos = self._discover_videos(input_dir)
+        progress_steps = {video.path: self._progress_step(video) for video in videos}
+        stats = {
+            "decode": StageStats("decode", decode_workers),
+            "inference": StageStats("inference", 1),
+            "keyframes": StageStats("keyframes", keyframe_workers),
+        }
+        path_queue: "queue.Queue" = queue.Queue()
+        decoded_queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        scene_queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        # longest first when probed, so the decode workers don't pick a huge video up last
+        for video in videos:
+            path_queue.put(video.path)
+        for _ in range(decode_workers):
+            path_queue.put(None)
+
+        print("\n----------------")
+        print(f"Starting to process {len(videos)} videos in pipeline mode, {self._video_order}")
+        print("----------------\n")
+        progress = self._frame_progress(videos)
+
+        def timed_get(stage: StageStats, source: "queue.Queue"):
+            depth = source.qsize()
+            start = time.perf_counter()
+            item = source.get()
+            stage.record(input_stall=time.perf_counter() - start, queue_depth=None if item is None else depth)
+            return item
+
+        def timed_put(stage: StageStats, target: "queue.Queue", item) -> None:
+            start = time.perf_counter()
+            target.put(item)
+            stage.record(output_stall=time.perf_counter() - start)
+
+        def decode_worker() -> None:
+            stage = stats["decode"]
+            while (video_path := timed_get(stage, path_queue)) is not None:
+                relative_path = os.path.relpath(video_path, input_dir)
+                try:
+                    start = time.perf_counter()
+                    frames = None
+                    with self.profiler.video(video_path):
+                        predictions = self.shot_detector.cached_predictions(video_path)
+                        if predictions is not None:
+                            self.profiler.count("frames", len(predictions))
+                        elif self.shot_detector.decodes_whole_videos:
+                            frames = self.shot_detector.decode_frames(video_path)
+                            self.profiler.count("frames", len(frames))
+                    stage.record(busy=time.perf_counter() - start)
+                    # neither frames nor predictions: streamed or chunked decoding, run by the inference stage
+                    timed_put(stage, decoded_queue, (video_path, relative_path, frames, predictions))
+                except Exception as e:
+                    print(f"Error processing video {relative_path}: {str(e)}")
+                    self.profiler.finish_video(video_path, relative_path)
+                    progress.update(progress_steps[video_path])
+            decoded_queue.put(None)
+
+        def inference_worker() -> None:
+            stage = stats["inference"]
+            finished_decoders = 0
+            while finished_decoders < decode_workers:
+                item = timed_get(stage, decoded_queue)
+                if item is None:
+                    finished_decoders += 1
+                    continue
+                video_path, relative_path, frames, predictions = item
+                try:
+                    start = time.perf_counter()
+                    with self.profiler.video(video_path):
+                        if frames is not None:
+                            predictions = self.shot_detector.detect_shots(frames=frames)
+                            self.shot_detector.cache_predictions(video_path, predictions)
+                        elif predictions is None:
+                            predictions = self.shot_detector.video_predictions(video_path)
+                    scenes = self._predictions_to_scenes(predictions)
+                    stage.record(busy=time.perf_counter() - start)
+                    timed_put(stage, scene_queue, (video_path, relative_path, scenes, predictions))
+                except Exception as e:
+                    print(f"Error processing video {relative_path}: {str(e)}")
+                    self.profiler.finish_video(video_path, relative_path)
+                    progress.update(progress_steps[video_path])
+            for _ in range(keyframe_workers):
+                scene_queue.put(None)
+
+        def keyframe_worker() -> None:
+            stage = stats["keyframes"]
+            while (item := timed_get(stage, scene_queue)) is not None:
+                video_path, relative_path, scenes, predictions = item
+                try:
+                    start = time.perf_counter()
+                    with self.profiler.video(video_path):
+                        self._save_scene_keyframes(video_path=video_path, relative_path=relative_path, scenes=scenes)
+                        self._index_scenes(video_path=video_path, relative_path=relative_path, scenes=scenes,
+                                           predictions=predictions)
+                    stage.record(busy=time.perf_counter() - start)
+                except Exception as e:
+                    print(f"Error processing video {relative_path}: {str(e)}")
+                self.profiler.finish_video(video_path, relative_path)
+                progress.update(progress_steps[video_path])
+
+        try:
+            threads = [threading.Thread(target=decode_worker, name=f"decode-{i}") for i in range(decode_workers)]
+            threads.append(threading.Thread(target=inference_worker, name="inference"))
+            threads += [threading.Thread(target=keyframe_worker, name=f"keyframes-{i}") for i in range(keyframe_workers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            progress.close()
+        finally:
+            self._close_keyframes()
+        self._close_scene_index()
+        self._report_profile()
+
+        print("\n----------------")
+        for stage in stats.values():
+            print(stage.summary())
+        print("----------------\n")
+        return stats
@@ -0,0 +1,293 @@
+"""
+Process a whole video corpus with a pool of worker processes, one AutoShot model per worker.
+
+Every finished video is appended to a JSONL manifest (status, scene count, timing), and videos already
+marked done in it are skipped, so an interrupted run can simply be started again. When a worker process dies
+(OOM kill, crash in ffmpeg or OpenCV), the videos in flight are recorded as failed and a fresh pool goes on. `--shard i/N` keeps only
+every N-th video of the sorted corpus, starting at i, to split one corpus across several machines.
+`--scene-index` also writes one record per scene (timestamps, keyframe paths, boundary probability) to a
+JSONL file or a Parquet dataset, from the parent process only.
+
+The directories are scanned and the videos probed (frame count, fps, codec) by a thread pool, with the probes
+cached in a metadata index next to the manifest. Videos are handed to the workers longest first, so no worker
+is left alone with a huge video at the end, and the ETA is computed on frames rather than videos.
+
+`--keyframe-store tar|array` packs the keyframes into shards instead of one file each (see
+AutoShot/keyframe_store.py). Every worker writes its own shards and offset index into the keyframe directory,
+flushes them after every video, so the keyframes of the videos marked done survive an interrupted run, and
+closes them when it exits.
+
+    python run_corpus.py ./input_sample --weights ./AutoShot/model_weight/ckpt_0_200_0.pth \\
+        --keyframe-dir ./output_sample --workers 4 --threads-per-worker 2 --shard 0/2
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.util import Finalize
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+
+from AutoShot.discovery import MetadataIndex, longest_first, probe_videos, scan_videos
+
+if TYPE_CHECKING:
+    from process_video import VideoProcessor
+
+# torch is only imported by the workers: the parent process just lists the videos and writes the manifest
+_processor: Optional["VideoProcessor"] = None
+_index_scenes = False
+
+
+class Manifest:
+    """Append-only JSONL record of the processed videos of a corpus"""
+
+    def __init__(self, manifest_path: str):
+        self.manifest_path = manifest_path
+        manifest_dir = os.path.dirname(manifest_path)
+        if manifest_dir:
+            os.makedirs(manifest_dir, exist_ok=True)
+
+    def done_videos(self) -> Set[str]:
+        """Relative paths whose latest record is marked done"""
+        status: Dict[str, str] = {}
+        if not os.path.exists(self.manifest_path):
+            return set()
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # a line cut short by an interrupted run
+                    continue
+                status[record["video"]] = record["status"]
+        return {video for video, state in status.items() if state == "done"}
+
+    def append(self, record: Dict[str, Any]) -> None:
+        with open(self.manifest_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+
+
+def parse_shard(shard: str) -> Tuple[int, int]:
+    """Parse an `i/N` shard specification"""
+    try:
+        index, count = (int(part) for part in shard.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Shard must look like i/N, got {shard}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Shard index must be in [0, {count}), got {shard}")
+    return index, count
+
+
+def select_shard(video_paths: List[str], shard_index: int, shard_count: int) -> List[str]:
+    return sorted(video_paths)[shard_index::shard_count]
+
+
+def _init_worker(
+    pretrained_model_path: str,
+    keyframe_dir: str,
+    threads_per_worker: int,
+    batch_size: int,
+    index_scenes: bool = False,
+    keyframe_store: Optional[str] = None,
+    keyframe_shard_size: int = 10000,
+    precision: str = "fp32",
+    threshold: float = 0.5
+) -> None:
+    global _processor, _index_scenes
+    import torch
+    from process_video import VideoProcessor
+
+    torch.set_num_threads(threads_per_worker)
+    _processor = VideoProcessor(pretrained_model_path, keyframe_dir, batch_size=batch_size,
+                                keyframe_store=keyframe_store, keyframe_shard_size=keyframe_shard_size,
+                                precision=precision, threshold=threshold)
+    sink = _processor.keyframe_extractor.sink
+    if sink is not None:
+        # run when the worker exits at the executor shutdown, so the last tar shard gets its end-of-archive blocks
+        Finalize(sink, sink.close, exitpriority=10)
+    _index_scenes = index_scenes
+
+
+def _process_video(task: Tuple[str, str]) -> Dict[str, Any]:
+    video_path, relative_path = task
+    start = time.perf_counter()
+    record: Dict[str, Any] = {"video": relative_path, "worker": os.getpid()}
+    try:
+        scenes, predictions = _processor.shot_detector.process_video(video_path=video_path, threshold=_processor.threshold,
+                                                                     return_predictions=True)
+        _processor._save_scene_keyframes(video_path=video_path, relative_path=relative_path, scenes=scenes)
+        record.update(status="done", num_scenes=len(scenes))
+        if _index_scenes:
+            from AutoShot.scene_index import SceneIndexWriter
+            from AutoShot.utils import video_frame_info
+
+            keyframes = _processor.keyframe_extractor.scene_keyframe_paths(scenes, relative_path)
+            # popped by the parent, which is the only writer of the index
+            record["scene_records"] = SceneIndexWriter.scene_records(
+                video_path, scenes, video_frame_info(video_path)[0], keyframes, predictions)
+    except Exception as e:
+        record.update(status="failed", error=str(e))
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    record["finished_at"] = time.time()
+    return record
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds != seconds:
+        return "unknown"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def run_corpus(
+    input_dir: str,
+    pretrained_model_path: str,
+    keyframe_dir: str,
+    manifest_path: Optional[str] = None,
+    workers: int = 1,
+    threads_per_worker: int = 1,
+    batch_size: int = 1,
+    shard: Tuple[int, int] = (0, 1),
+    scene_index_path: Optional[str] = None,
+    metadata_index_path: Optional[str] = None,
+    discovery_workers: int = 8,
+    keyframe_store: Optional[str] = None,
+    keyframe_shard_size: int = 10000,
+    precision: str = "fp32",
+    threshold: float = 0.5
+) -> None:
+    manifest = Manifest(manifest_path or os.path.join(keyframe_dir, "manifest.jsonl"))
+    # the shard is taken on the sorted paths, so every machine agrees on it whatever the probing says
+    video_paths = select_shard(scan_videos(input_dir, discovery_workers), *shard)
+    done = manifest.done_videos()
+    pending = [path for path in video_paths if os.path.relpath(path, input_dir) not in done]
+    index = MetadataIndex(metadata_index_path or os.path.join(keyframe_dir, "video_metadata.json"))
+    videos = longest_first(probe_videos(pending, index, discovery_workers))
+    tasks = [(video.path, os.path.relpath(video.path, input_dir)) for video in videos]
+    frame_counts = {relative_path: video.frame_count for video, (_, relative_path) in zip(videos, tasks)}
+    total_frames = sum(frame_counts.values())
+
+    print("\n----------------")
+    print(f"Shard {shard[0]}/{shard[1]}: {len(video_paths)} videos, {len(video_paths) - len(tasks)} already done, "
+          f"{len(tasks)} to process ({total_frames} frames) with {workers} workers, longest first")
+    print("----------------\n")
+    if not tasks:
+        return
+
+    scene_index = None
+    if scene_index_path:
+        from AutoShot.scene_index import SceneIndexWriter
+        scene_index = SceneIndexWriter(scene_index_path)
+
+    context = mp.get_context("spawn")
+    start = time.perf_counter()
+    frames_done = 0
+    finished = 0
+
+    def report(record: Dict[str, Any]) -> None:
+        nonlocal frames_done, finished
+        scene_records = record.pop("scene_records", None)
+        if scene_index is not None and scene_records:
+            scene_index.append(scene_records)
+        record["frames"] = frame_counts[record["video"]]
+        manifest.append(record)
+        frames_done += record["frames"]
+        finished += 1
+        elapsed = time.perf_counter() - start
+        eta = (total_frames - frames_done) * elapsed / frames_done if frames_done else float("nan")
+        detail = f"{record['num_scenes']} scenes" if record["status"] == "done" else record["error"]
+        print(f"[{finished}/{len(tasks)}] {record['video']}: {record['status']} in {record['seconds']:.1f}s ({detail}), "
+              f"{frames_done}/{total_frames} frames, ETA {_format_seconds(eta)}")
+
+    def collect(future: Future, task: Tuple[str, str], submitted: float) -> Dict[str, Any]:
+        try:
+            return future.result()
+        except BrokenProcessPool as e:
+            return {"video": task[1], "status": "failed", "error": f"worker process died: {e}",
+                    "seconds": round(time.perf_counter() - submitted, 3), "finished_at": time.time()}
+
+    remaining = deque(tasks)
+    try:
+        while remaining:
+            # a worker killed by the OOM killer or a crash in ffmpeg/cv2 breaks the whole pool: the videos in flight
+            # are recorded as failed, since the one that killed it can't be told apart, and a fresh pool goes on
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(pretrained_model_path, keyframe_dir, threads_per_worker, batch_size,
+                          scene_index is not None, keyframe_store, keyframe_shard_size, precision, threshold)
+            ) as executor:
+                # no more videos in flight than workers, so a broken pool only fails the videos being processed
+                in_flight: Dict[Future, Tuple[Tuple[str, str], float]] = {}
+                broken = False
+                while (remaining or in_flight) and not broken:
+                    while remaining and len(in_flight) < workers:
+                        task = remaining.popleft()
+                        in_flight[executor.submit(_process_video, task)] = (task, time.perf_counter())
+                    done_futures, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done_futures:
+                        broken |= isinstance(future.exception(), BrokenProcessPool)
+                        report(collect(future, *in_flight.pop(future)))
+                if broken:
+                    print("A worker process died, restarting the pool")
+                    for future in wait(in_flight).done:
+                        report(collect(future, *in_flight.pop(future)))
+            # leaving the executor lets the workers exit on their own, so their finalizers close the shards
+    finally:
+        if scene_index is not None:
+            scene_index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input_dir")
+    parser.add_argument("--weights", default="./AutoShot/model_weight/ckpt_0_200_0.pth")
+    parser.add_argument("--keyframe-dir", required=True)
+    parser.add_argument("--manifest", default=None, help="Defaults to <keyframe-dir>/manifest.jsonl")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    parser.add_argument("--threads-per-worker", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--shard", type=parse_shard, default=(0, 1), help="i/N, process only shard i of N")
+    parser.add_argument("--scene-index", default=None, help="Scene index to write: a .jsonl file, or a Parquet "
+                        "dataset directory (needs pyarrow)")
+    parser.add_argument("--metadata-index", default=None, help="Defaults to <keyframe-dir>/video_metadata.json")
+    parser.add_argument("--discovery-workers", type=int, default=8, help="Threads scanning and probing the corpus")
+    parser.add_argument("--keyframe-store", choices=["files", "tar", "array"], default="files",
+                        help="One image file per keyframe, tar shards of images, or .npy shards of 224x224 frames")
+    parser.add_argument("--keyframe-shard-size", type=int, default=10000, help="Keyframes per tar/array shard")
+    # AutoShot.quantization.PRECISIONS, spelled out so the parent process doesn't import torch
+    parser.add_argument("--precision", choices=["fp32", "int8", "bf16", "int8_bf16"], default="fp32")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Scene threshold, calibrated for the precision "
+                        "by python -m AutoShot.quantization")
+    args = parser.parse_args()
+
+    run_corpus(
+        input_dir=args.input_dir,
+        pretrained_model_path=args.weights,
+        keyframe_dir=args.keyframe_dir,
+        manifest_path=args.manifest,
+        workers=args.workers,
+        threads_per_worker=args.threads_per_worker,
+        batch_size=args.batch_size,
+        shard=args.shard,
+        scene_index_path=args.scene_index,
+        metadata_index_path=args.metadata_index,
+        discovery_workers=args.discovery_workers,
+        keyframe_store=args.keyframe_store,
+        keyframe_shard_size=args.keyframe_shard_size,
+        precision=args.precision,
+        threshold=args.threshold
+    )
+
+
+if __name__ == "__main__":
+    main()
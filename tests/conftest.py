@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+import torch
+
+from AutoShot.supernet import TransNetV2Supernet
+
+
+@pytest.fixture(scope="session")
+def weights(tmp_path_factory):
+    """Checkpoint of a random TransNetV2Supernet with randomized batch norm statistics"""
+    torch.manual_seed(0)
+    model = TransNetV2Supernet()
+    with torch.no_grad():
+        for module in model.modules():
+            if isinstance(module, torch.nn.BatchNorm3d):
+                module.running_mean.normal_(0, 0.5)
+                module.running_var.uniform_(0.5, 2.0)
+    path = tmp_path_factory.mktemp("weights") / "random.pt"
+    torch.save({"net": model.state_dict()}, path)
+    return str(path)
+
+
+@pytest.fixture(scope="session")
+def frames():
+    """220 frames of three noisy static scenes, cut at frames 70 and 160"""
+    rng = np.random.default_rng(0)
+    scenes = [np.clip(rng.integers(0, 256, (1, 27, 48, 3)) + rng.integers(-8, 9, (n, 27, 48, 3)), 0, 255)
+              for n in (70, 90, 60)]
+    return np.concatenate(scenes).astype(np.uint8)
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from AutoShot.cascade import window_change_scores
+from AutoShot.model import AutoShot
+from AutoShot.scheduler import CrossVideoBatchScheduler
+from AutoShot.utils import get_batches
+
+# between the scores of the static windows (about 0.13) and of the windows holding a cut (about 0.3)
+CASCADE_THRESHOLD = 0.2
+
+
+@pytest.fixture(scope="module")
+def shot_detector(weights):
+    return AutoShot(weights, device="cpu", batch_size=2, cascade_threshold=CASCADE_THRESHOLD)
+
+
+def test_skipped_windows_predict_zero(shot_detector, frames):
+    skipped = window_change_scores(frames) < CASCADE_THRESHOLD
+    assert skipped.any() and not skipped.all()
+    predictions = shot_detector.detect_shots(frames)
+    stride = shot_detector.window_stride
+    for i in np.flatnonzero(skipped):
+        assert not predictions[i * stride:(i + 1) * stride].any()
+
+
+def test_iterated_predictions_match_detect_shots(shot_detector, frames):
+    expected = shot_detector.detect_shots(frames)
+    chunks = list(shot_detector.iter_predictions(get_batches(frames, shot_detector.window_size)))
+    # yielded batch by batch, in window order
+    assert len(chunks) > 1
+    np.testing.assert_array_equal(np.concatenate(chunks)[:len(frames)], expected)
+
+
+def test_pooled_batches_apply_the_cascade(shot_detector, frames):
+    scheduler = CrossVideoBatchScheduler(shot_detector, batch_size=3)
+    completed = scheduler.add_video("a", frames) + scheduler.add_video("b", frames[:120]) + scheduler.flush()
+    predictions = dict(completed)
+    np.testing.assert_allclose(predictions["a"], shot_detector.detect_shots(frames), atol=1e-5)
+    np.testing.assert_allclose(predictions["b"], shot_detector.detect_shots(frames[:120]), atol=1e-5)
+
+
+def test_fully_skipped_video_completes_without_a_batch(shot_detector, frames):
+    scheduler = CrossVideoBatchScheduler(shot_detector, batch_size=3)
+    static = np.repeat(frames[:1], 120, axis=0)
+    assert scheduler.add_video("static", static)[0][0] == "static"
+    assert scheduler.pending_windows == 0
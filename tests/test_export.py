@@ -0,0 +1,59 @@
+import copy
+
+import pytest
+import torch
+
+from AutoShot.export import TransNetV2Inference, check_parity, export_torchscript, sample_windows
+from AutoShot.supernet import TransNetV2Supernet
+
+# largest |sigmoid(eager) - sigmoid(exported)| allowed, up to about 3e-6 is measured with randomized weights and statistics
+TOLERANCE = 1e-5
+
+
+@pytest.fixture(scope="module")
+def eager_model():
+    torch.manual_seed(0)
+    model = TransNetV2Supernet()
+    # non-trivial running statistics and affine parameters, so folding them into the convolutions matters
+    with torch.no_grad():
+        for module in model.modules():
+            if isinstance(module, torch.nn.BatchNorm3d):
+                module.running_mean.normal_(0, 0.5)
+                module.running_var.uniform_(0.5, 2.0)
+                module.weight.uniform_(0.5, 1.5)
+                module.bias.normal_(0, 0.2)
+    return model.eval()
+
+
+@pytest.fixture(scope="module")
+def exported(eager_model):
+    return TransNetV2Inference(eager_model).eval()
+
+
+def test_folded_model_matches_eager(eager_model, exported):
+    assert check_parity(eager_model, exported, sample_windows(2, 100)) < TOLERANCE
+
+
+def test_folded_model_accepts_other_window_lengths(eager_model, exported):
+    assert check_parity(eager_model, exported, sample_windows(1, 150, seed=1)) < TOLERANCE
+
+
+def test_torchscript_matches_eager(eager_model, exported, tmp_path):
+    export_torchscript(exported, str(tmp_path / "autoshot_cpu.pt"), torch.from_numpy(sample_windows(1, 100)))
+    # the saved artifact, on another batch size than the traced one
+    loaded = torch.jit.load(str(tmp_path / "autoshot_cpu.pt"))
+    assert check_parity(eager_model, loaded, sample_windows(2, 100, seed=2)) < TOLERANCE
+
+
+def test_export_needs_eval_mode():
+    with pytest.raises(ValueError):
+        TransNetV2Inference(TransNetV2Supernet().train())
+
+
+def test_parity_detects_unfolded_statistics(eager_model, exported):
+    # with the default statistics the eager model must disagree, or the parity tests would not cover the folding
+    reset = copy.deepcopy(eager_model)
+    for module in reset.modules():
+        if isinstance(module, torch.nn.BatchNorm3d):
+            module.reset_parameters()
+    assert check_parity(reset.eval(), exported, sample_windows(2, 100)) > 100 * TOLERANCE
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from AutoShot.model import AutoShot
+from AutoShot.scheduler import CrossVideoBatchScheduler
+from AutoShot.utils import get_batches
+
+
+@pytest.fixture(scope="module")
+def shot_detector(weights):
+    return AutoShot(weights, device="cpu", batch_size=2, precompute_histograms=True)
+
+
+@pytest.fixture
+def fed_histograms(shot_detector, monkeypatch):
+    """Whether every forward pass was given precomputed histograms"""
+    fed = []
+    predict_batch = shot_detector._predict_batch
+
+    def spy(batches, histograms=None):
+        fed.append(histograms is not None and len(histograms) == len(batches))
+        return predict_batch(batches, histograms)
+
+    monkeypatch.setattr(shot_detector, "_predict_batch", spy)
+    return fed
+
+
+def test_streamed_windows_get_histograms(shot_detector, frames, fed_histograms):
+    expected = shot_detector.detect_shots(frames)
+    # windows without histograms, as FrameStream and the fused decode yield them
+    streamed = shot_detector._predict_windows(get_batches(frames, shot_detector.window_size))[:len(frames)]
+    assert fed_histograms and all(fed_histograms)
+    np.testing.assert_array_equal(streamed, expected)
+
+
+def test_pooled_batches_get_histograms(shot_detector, frames, fed_histograms):
+    scheduler = CrossVideoBatchScheduler(shot_detector, batch_size=3)
+    predictions = dict(scheduler.add_video("a", frames) + scheduler.add_video("b", frames[:120]) + scheduler.flush())
+    assert fed_histograms and all(fed_histograms)
+    np.testing.assert_allclose(predictions["a"], shot_detector.detect_shots(frames), atol=1e-5)
+    np.testing.assert_allclose(predictions["b"], shot_detector.detect_shots(frames[:120]), atol=1e-5)
@@ -0,0 +1,35 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from AutoShot.keyframe_extractor import KeyFrameExtractor
+from AutoShot.keyframe_store import TarShardSink
+from AutoShot.keyframe_writer import KeyframeWriter
+
+
+def _writer_threads():
+    return [thread for thread in threading.enumerate() if thread.name.startswith("keyframe-writer")]
+
+
+def test_close_stops_the_writer_threads(tmp_path):
+    frame = np.zeros((27, 48, 3), dtype=np.uint8)
+    with KeyframeWriter(num_workers=2) as writer:
+        for i in range(4):
+            writer.write(frame, str(tmp_path / f"a{i}.jpg"), group="a")
+        assert _writer_threads()
+    assert not _writer_threads()
+    assert sorted(os.listdir(tmp_path)) == [f"a{i}.jpg" for i in range(4)]
+
+    # a closed writer starts new threads on the next write
+    writer.write(frame, str(tmp_path / "b.jpg"))
+    assert writer.close() == []
+    assert os.path.exists(tmp_path / "b.jpg") and not _writer_threads()
+
+
+def test_writer_threads_are_rejected_with_a_sink(tmp_path):
+    sink = TarShardSink(str(tmp_path))
+    with pytest.raises(ValueError, match="writer_workers"):
+        KeyFrameExtractor(str(tmp_path), writer_workers=2, sink=sink)
+    sink.close()
@@ -0,0 +1,32 @@
+import pytest
+import torch
+
+from AutoShot.supernet import band_similarities
+
+
+@pytest.mark.parametrize("channels", [128, 512])
+@pytest.mark.parametrize("time_window", [1, 7, 50, 100, 101, 102, 250])
+@pytest.mark.parametrize("lookup_window", [101, 11])
+def test_banded_matches_gather(channels, time_window, lookup_window):
+    generator = torch.Generator().manual_seed(time_window * channels + lookup_window)
+    x = torch.nn.functional.normalize(torch.rand(2, time_window, channels, generator=generator), p=2, dim=2)
+
+    gathered = band_similarities(x, lookup_window, kernel="gather")
+    banded = band_similarities(x, lookup_window, kernel="banded")
+
+    assert banded.shape == gathered.shape == (2, time_window, lookup_window)
+    torch.testing.assert_close(banded, gathered, rtol=0, atol=1e-5)
+
+
+def test_band_is_zero_outside_the_sequence():
+    x = torch.nn.functional.normalize(torch.rand(1, 5, 16), p=2, dim=2)
+    banded = band_similarities(x, 101, kernel="banded")
+    # frame i only has neighbours i-2 .. i+2, at band positions 50 + (j - i)
+    for i in range(5):
+        outside = [w for w in range(101) if not 0 <= i + w - 50 < 5]
+        assert torch.count_nonzero(banded[0, i, outside]) == 0
+
+
+def test_unknown_kernel():
+    with pytest.raises(ValueError):
+        band_similarities(torch.rand(1, 10, 8), 101, kernel="dense")
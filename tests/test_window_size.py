@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from AutoShot.model import AutoShot
+from AutoShot.utils import get_batches, get_segment_batches
+
+
+@pytest.mark.parametrize("window_size", [100, 200])
+@pytest.mark.parametrize("num_frames", [180, 301, 640])
+def test_segments_stitch_to_the_whole_video_layout(window_size, num_frames):
+    stride = window_size - 50
+    frames = np.arange(num_frames)
+    split = stride if num_frames < 2 * stride + 25 else 2 * stride
+    # the second segment starts 25 frames before its first kept frame, for the context of its first window
+    segments = list(get_segment_batches(frames[:split + 25], window_size, pad_end=False)) + \
+        list(get_segment_batches(frames[split - 25:], window_size, pad_start=False))
+    whole = list(get_batches(frames, window_size))
+    assert len(segments) == len(whole)
+    for window, expected in zip(segments, whole):
+        np.testing.assert_array_equal(window, expected)
+
+
+def test_default_window_size_is_the_reference(weights, frames):
+    shot_detector = AutoShot(weights, device="cpu", batch_size=4)
+    assert shot_detector.check_window_size(frames) == 0.0
+
+
+def test_long_windows_are_rejected_beyond_the_tolerance(weights, frames):
+    # random weights drift far beyond the tolerance: the check must catch it rather than assume equivalence
+    shot_detector = AutoShot(weights, device="cpu", batch_size=4, window_size=200, unsafe_window_size=True)
+    with pytest.raises(ValueError):
+        shot_detector.check_window_size(frames)
+    drift = shot_detector.check_window_size(frames, tolerance=1.0, threshold=2.0)
+    assert 0.0 < drift <= 1.0
+    assert shot_detector.window_size == 200 and shot_detector.window_stride == 150
+
+
+def test_long_windows_need_a_check(weights):
+    with pytest.raises(ValueError, match="unsafe_window_size"):
+        AutoShot(weights, device="cpu", window_size=200)
+
+
+def test_long_windows_are_checked_on_the_sample_video(weights, frames, monkeypatch):
+    monkeypatch.setattr(AutoShot, "decode_frames", lambda self, video_path: frames)
+    with pytest.raises(ValueError, match="drifts"):
+        AutoShot(weights, device="cpu", batch_size=4, window_size=200, window_check_video="sample.mp4")